@@ -0,0 +1,173 @@
+import math
+import time
+import random
+
+from common import instrumentation
+from common.tsp import route_length
+
+
+# fraction of the items relaxed by the random and geographic neighbourhoods at first, then adapted
+RELAX_FRACTION = 0.15
+
+# bounds of the fraction of the items relaxed by a neighbourhood
+MIN_RELAX_FRACTION = 0.05
+MAX_RELAX_FRACTION = 0.6
+
+# factor by which the fraction relaxed by a neighbourhood grows when its search completes without improving, and
+# shrinks when it times out without a solution
+RELAX_GROWTH = 1.2
+
+# seconds of search of each iteration
+ITERATION_TIME = 5
+
+# weight given to the last score of a neighbourhood when updating its weight, see lns_search
+REACTION = 0.3
+
+# scores of an iteration: improving the incumbent, or proving the neighbourhood contains no better solution
+IMPROVEMENT_SCORE = 3
+EXHAUSTED_SCORE = 0.5
+
+# weights of the neighbourhoods never fall below this, so that each one keeps being tried
+MIN_WEIGHT = 0.1
+
+
+#------------------------------------------------------------------------------
+# Neighbourhoods
+#------------------------------------------------------------------------------
+
+def relax_longest(routes, lengths, D, size, rng):
+    """Relaxes all the items of the two longest routes, which determine the objective"""
+    longest = sorted(range(len(routes)), key=lambda i: -lengths[i])[:2]
+    return {j for i in longest for j in routes[i]}
+
+def relax_close(routes, lengths, D, size, rng):
+    """Relaxes the size items closest to a random item (itself included), so that they can be swapped between the
+    routes passing by them"""
+    n = len(D) - 1
+    center = rng.randrange(n)
+    closest = sorted(range(n), key=lambda j: D[center][j] + D[j][center])
+    return {j + 1 for j in closest[:size]}
+
+def relax_courier(routes, lengths, D, size, rng):
+    """Relaxes all the items of a random courier, chosen with probability proportional to the length of its route"""
+    couriers = [i for i in range(len(routes)) if routes[i]]
+    i = rng.choices(couriers, weights=[lengths[i] + 1 for i in couriers])[0]
+    return set(routes[i])
+
+def relax_random(routes, lengths, D, size, rng):
+    """Relaxes size random items, the neighbourhood of relax_and_reconstruct in the Gecode_LNS models"""
+    n = len(D) - 1
+    return {j + 1 for j in rng.sample(range(n), size)}
+
+
+NEIGHBOURHOODS = {"longest": relax_longest,
+                  "close": relax_close,
+                  "courier": relax_courier,
+                  "random": relax_random}
+
+
+#------------------------------------------------------------------------------
+# Search
+#------------------------------------------------------------------------------
+
+def kept_couriers(routes, relaxed, n):
+    """Returns the courier (1-based) of each item kept from the routes, 0 for the relaxed ones, the lns_courier array
+    of the LNS driver models (see templates/successors.mzn)"""
+    courier = [0] * n
+    for i, route in enumerate(routes):
+        for j in route:
+            if j not in relaxed:
+                courier[j - 1] = i + 1
+    return courier
+
+def lns_search(D, lower_bound, upper_bound, incumbent, solve_neighbourhood, timeout, neighbourhoods=None, seed=None):
+    """Large neighbourhood search of the optimal solution: at each iteration a neighbourhood is chosen with probability
+    proportional to its weight, the items it relaxes are reassigned and all the routes are searched again (the other
+    items staying with their courier) for a solution better than the incumbent, which becomes the new incumbent
+
+    The weight of each neighbourhood is updated after each of its iterations as (1 - REACTION) weight + REACTION score,
+    the score being IMPROVEMENT_SCORE when the incumbent improves, EXHAUSTED_SCORE when the neighbourhood is proven to
+    contain no better solution and 0 otherwise, and the fraction of the items it relaxes grows in the second case and
+    shrinks when the search finds nothing in time
+
+    Args:
+        D (list[list[int]]): (n+1)x(n+1) distance matrix, the origin being the last row/column
+        lower_bound (int): lower bound on the objective, the search stops when the incumbent meets it
+        upper_bound (int): upper bound on the objective, bounding the search of the first solution
+        incumbent (int, list[list[int]]): objective value and routes of the starting solution, None to start by
+                                          searching a first solution with all the items relaxed, for as long
+                                          as it takes
+        solve_neighbourhood (function): function of (courier of each item, 0 if relaxed, bound on the objective,
+                                        order of the couriers, None for any, seconds) returning the result entry of
+                                        the search of the best solution with objective value at most the bound
+        timeout (float): timestamp of the timeout
+        neighbourhoods (list[str], optional): names of the neighbourhoods among NEIGHBOURHOODS (default=None, i.e. all)
+        seed (int, optional): random seed of the choices of the neighbourhoods and of the items relaxed (default=None)
+
+    Returns:
+        (int, list[list[int]], bool): the best objective value found and its routes (None, None if none is found), and
+                                      wether it is optimal
+    """
+    n = len(D) - 1
+    rng = random.Random(seed)
+    names = neighbourhoods or list(NEIGHBOURHOODS)
+    weights = {name: 1.0 for name in names}
+    fractions = {name: RELAX_FRACTION for name in names}
+    improvements = {name: 0 for name in names}
+    iterations = 0
+    optimal = False
+
+    while not optimal and (incumbent is None or incumbent[0] > lower_bound):
+        left = timeout - time.time()
+        if left < 1:
+            break
+        seconds = math.floor(left) if incumbent is None else min(ITERATION_TIME, math.floor(left))
+
+        if incumbent is None:
+            name, relaxed = None, set(range(1, n + 1))
+            bound, order = upper_bound, None
+        else:
+            value, routes = incumbent[:2]
+            lengths = [route_length([j - 1 for j in route], D) for route in routes]
+            name = rng.choices(names, weights=[weights[name] for name in names])[0]
+            size = max(1, min(n, round(fractions[name] * n)))
+            relaxed = NEIGHBOURHOODS[name](routes, lengths, D, size, rng)
+            bound = value - 1
+            order = sorted(range(1, len(routes) + 1), key=lambda i: -lengths[i - 1])
+
+        courier = kept_couriers(incumbent[1], relaxed, n) if incumbent is not None else [0] * n
+        solution = solve_neighbourhood(courier, bound, order, seconds)
+        iterations += 1
+
+        if solution.get("status") == "error" or solution["obj"] == "Error":
+            break
+        complete = solution["optimal"] and "status" not in solution
+        improved = isinstance(solution["obj"], int) and (incumbent is None or solution["obj"] < incumbent[0])
+        if improved:
+            incumbent = (solution["obj"], solution["sol"])
+            instrumentation.incumbent(incumbent[0])
+        if complete and len(relaxed) == n:
+            # the whole problem was searched: the incumbent is optimal, or there is no solution at all
+            optimal = True
+        if name is None:
+            continue
+
+        if improved:
+            score = IMPROVEMENT_SCORE
+            improvements[name] += 1
+        elif complete:
+            score = EXHAUSTED_SCORE
+            fractions[name] = min(fractions[name] * RELAX_GROWTH, MAX_RELAX_FRACTION)
+        else:
+            score = 0
+            fractions[name] = max(fractions[name] / RELAX_GROWTH, MIN_RELAX_FRACTION)
+        weights[name] = max((1 - REACTION) * weights[name] + REACTION * score, MIN_WEIGHT)
+
+    instrumentation.count("lns_iterations", iterations)
+    for name in names:
+        instrumentation.count(f"lns_{name}_improvements", improvements[name])
+        instrumentation.count(f"lns_{name}_weight", round(weights[name], 3))
+
+    if incumbent is None:
+        return (None, None, optimal)
+    return (incumbent[0], incumbent[1], optimal or incumbent[0] <= lower_bound)
@@ -1,28 +1,121 @@
 import os
+import time
 import subprocess
+import tempfile
 import io
 import numpy as np
 import math
 import re
+import signal
 
+from common import instrumentation
+from common.sandbox import WALL_GRACE, run_model, failure_entry
+from common.instance import read_dzn
+from common.bounds import objective_bounds
+from common.preprocessing import infeasible_assignments, infeasible_arcs
+from common.routes import successors_from_minizinc, routes_from_successors
+from common.config import model_parameters
 
-no_lns_test = ("Gecode_no_LNS", "CP_model_no_LNS.mzn")
+from .lns import lns_search
+from .variants import model_file
 
-models_no_lns = [("Gecode_no_LNS_no_sym_break", "CP_model_no_LNS_no_sym_break.mzn"), 
-                 ("Gecode_no_LNS_no_implied", "CP_model_no_LNS_no_implied.mzn"), 
-                 ("Chuffed", "CP_model_chuffed.mzn")]
 
-models_lns = [("Gecode_LNS", "CP_model_LNS.mzn"), 
-              ("Gecode_LNS_no_sym_break", "CP_model_LNS_no_sym_break.mzn"), 
-              ("Gecode_LNS_no_implied", "CP_model_LNS_no_implied.mzn"), 
-              ("Chuffed", "CP_model_chuffed.mzn")]
+# the models are generated from the templates in templates/ with the features of each one (see variants.py)
 
-def extract_solution(text):
+no_lns_test = ("Gecode_no_LNS", {})
+
+models_no_lns = [("Gecode_no_LNS_no_sym_break", {"sym_break": False}),
+                 ("Gecode_no_LNS_no_implied", {"implied": False}),
+                 ("Gecode_no_LNS_giant_tour", {"template": "giant_tour"}),
+                 ("Chuffed", {"search": None, "restart": "luby"})]
+
+# relax_and_reconstruct keeping 85% of the variables at each restart
+lns_features = {"restart": "luby", "restart_scale": 100, "lns_rate": 85}
+
+models_lns = [("Gecode_LNS", lns_features),
+              ("Gecode_LNS_no_sym_break", {**lns_features, "sym_break": False}),
+              ("Gecode_LNS_no_implied", {**lns_features, "implied": False}),
+              ("Gecode_LNS_giant_tour", {**lns_features, "template": "giant_tour"}),
+              ("Chuffed", {"search": None, "restart": "luby"})]
+
+# models searched by the LNS driver of lns.py, without symmetry breaking since the fixed assignments could
+# contradict it
+lns_drivers = [("Gecode_LNS_driver", {"lns_driver": True, "sym_break": False}),
+               ("Gecode_LNS_driver_random", {"lns_driver": True, "sym_break": False})]
+
+# neighbourhoods the LNS drivers choose among, None for all
+lns_driver_neighbourhoods = {"Gecode_LNS_driver": None,
+                             "Gecode_LNS_driver_random": ["random"]}
+
+def write_pruning_data(instance_file, implied_constraint, outfile, timeout=None):
+    """Computes the bounds on the objective and the preprocessing data of CP_pruning.mzn for the given instance and writes
+    them in .dzn format
+
+    Args:
+        instance_file (str): path of the .dzn file representing the instance
+        implied_constraint (bool): wether the model uses the implied constraint, which determines the objective upper bound
+        outfile (file): the (text) file to write the data to
+        timeout (int, optional): timeout of the models, bounding the time of the heuristic solution (default=None, i.e. no limit)
+
+    Returns:
+        (int, int, (int, list[list[int]], str)): the lower and upper bounds, and the heuristic solution, see common/bounds.py
+    """
+    m, n, l, s, D = read_dzn(instance_file)
+    lower_bound, upper_bound, incumbent = objective_bounds(m, n, l, s, D, implied_constraint, timeout=timeout)
+
+    def dzn_matrix(matrix):
+        return "[|" + "|".join(", ".join("true" if e else "false" for e in row) for row in matrix) + "|]"
+
+    outfile.write(f"common_obj_lowerbound = {lower_bound};\n")
+    outfile.write(f"common_obj_upperbound = {upper_bound};\n")
+    outfile.write(f"forbidden_assignment = {dzn_matrix(infeasible_assignments(l, s))};\n")
+    outfile.write(f"forbidden_arc = {dzn_matrix(infeasible_arcs(D, upper_bound))};\n")
+    outfile.flush()
+    return (lower_bound, upper_bound, incumbent)
+
+
+def split_statistics(text):
+    """Separates the statistics printed by MiniZinc (lines %%%mzn-stat: name=value) from the rest of its output
+
+    Args:
+        text (str): the output of MiniZinc
+
+    Returns:
+        (str, dict[str, str]): the output without the statistics, and the statistics by name
+    """
+    statistics = {}
+    lines = []
+    for line in text.split('\n'):
+        if line.startswith("%%%mzn-stat"):
+            name, _, value = line.partition(':')[2].strip().partition('=')
+            if name:
+                statistics[name] = value
+        else:
+            lines.append(line)
+    return '\n'.join(lines), statistics
+
+
+def record_statistics(statistics):
+    """Records the MiniZinc statistics: flattening and solving times as the encode and solve phases, numbers as counts"""
+    for name, value in statistics.items():
+        try:
+            value = float(value)
+        except ValueError:
+            continue
+        if name == "flatTime":
+            instrumentation.add_time("encode", value)
+        elif name == "solveTime":
+            instrumentation.add_time("solve", value)
+        else:
+            instrumentation.count(name, int(value) if value.is_integer() else value)
+
+
+def extract_solution(text, timeout=300):
     if "=UNKNOWN=" in text:
-        return {"time": 300, "optimal": False, "obj": "N/A"}
+        return {"time": timeout, "optimal": False, "obj": "N/A"}
 
     if "=ERROR=" in text:
-        return {"time": 300, "optimal": False, "obj": "Error"}
+        return {"time": timeout, "optimal": False, "obj": "Error"}
 
     if "=UNSATISFIABLE=" in text:
         obj_value = "UNSAT"
@@ -35,22 +128,8 @@ def extract_solution(text):
 
         # solution
         rest = text.partition('\n')[2]
-        orders = np.genfromtxt(io.StringIO(rest.split('%')[0]), dtype=int).tolist()
-
-        n = len(orders[0])
-        sol = []
-
-        for row in orders:
-            route = []
-            if row[n-1] == n:    # courier doesn't leave origin
-                pass
-            else:
-                v = row[n-1]
-                while v != n:
-                    route.append(v)
-                    v = row[v-1]
-
-            sol.append(route)
+        orders = np.genfromtxt(io.StringIO(rest.split('%')[0]), dtype=int, ndmin=2)
+        sol = routes_from_successors(successors_from_minizinc(orders))
 
     # time
     time = float(re.findall("time elapsed: (\d+\.\d+)", text)[0])   # TODO: capire se voglio il primo o secondo time (prova su istanze grandi)
@@ -58,55 +137,195 @@ def extract_solution(text):
 
 
     # optimal
-    if time >= 300:
+    if time >= timeout:
         optimal = False
-        time = 300
+        time = timeout
     else:
         optimal = True
 
     return {"time": time, "optimal": optimal, "obj": obj_value, "sol": sol}
 
 
-def run_cp(instance_file):
+def run_minizinc(solver, model_path, pruning_path, instance_file, data_path, seed=None, timeout=300, extra_data=()):
+    """Runs a MiniZinc model on the instance and extracts its solution. MiniZinc runs in its own session, and is killed
+    together with the solver if it doesn't stop WALL_GRACE seconds after the timeout
+
+    Args:
+        solver (str): the MiniZinc solver to use (Gecode or Chuffed)
+        model_path (str): path of the .mzn model
+        pruning_path (str): path of the preprocessing of the model, CP_pruning.mzn or CP_pruning_giant_tour.mzn
+        instance_file (str): path of the .dzn file representing the instance
+        data_path (str): path of the .dzn file with the preprocessing data
+        seed (int, optional): random seed of the solver (default=None, i.e. the solver's default)
+        timeout (int, optional): timeout of the solver in seconds (default=300)
+        extra_data (list[str], optional): paths of further .dzn files, e.g. the neighbourhood of the LNS driver (default=())
+    """
+    command = ["minizinc", "--solver", solver, "--output-time", "--statistics", "--solver-time-limit", str(timeout * 1000)]
+    if seed is not None:
+        command += ["--random-seed", str(seed)]
+    start = time.perf_counter()
+    process = subprocess.Popen(command + [model_path, pruning_path, instance_file, data_path, *extra_data],
+                               stdout=subprocess.PIPE,
+                               text=True,
+                               start_new_session=True)
+    try:
+        stdout, _ = process.communicate(timeout=timeout + WALL_GRACE)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.communicate()
+        instrumentation.solver_call(time.perf_counter() - start)
+        return failure_entry("timeout", timeout)
+    instrumentation.solver_call(time.perf_counter() - start)
 
+    instrumentation.begin("readout")
+    text, statistics = split_statistics(stdout)
+    record_statistics(statistics)
+    return extract_solution(text, timeout)
+
+
+def write_lns_data(courier, bound, order, m, outfile):
+    """Writes (replacing its content) the neighbourhood of an iteration of the LNS driver in .dzn format, see
+    templates/successors.mzn
+
+    Args:
+        courier (list[int]): courier (1-based) of each item kept from the incumbent, 0 for the relaxed ones
+        bound (int): upper bound on the objective
+        order (list[int]): order of the couriers (1-based) in the search, None for their order
+        m (int): number of couriers
+        outfile (file): the (text) file to write the data to
+    """
+    outfile.seek(0)
+    outfile.truncate()
+    outfile.write(f"lns_courier = {list(courier)};\n")
+    outfile.write(f"lns_obj_upperbound = {bound};\n")
+    outfile.write(f"lns_order = {list(order or range(1, m + 1))};\n")
+    outfile.flush()
+
+
+def run_lns_driver(solver, model_path, pruning_path, instance_file, data_path, bounds, neighbourhoods=None, seed=None, timeout=300):
+    """Runs the LNS driver of lns.py, solving each neighbourhood with a call to MiniZinc whose data includes the
+    neighbourhood, and returns the result entry of the best solution found
+
+    Args:
+        solver (str): the MiniZinc solver to use
+        model_path (str): path of the model generated with the lns_driver feature
+        pruning_path (str): path of CP_pruning.mzn
+        instance_file (str): path of the .dzn file representing the instance
+        data_path (str): path of the .dzn file with the preprocessing data
+        bounds (int, int, (int, list[list[int]], str)): the bounds on the objective and the heuristic solution, the
+                                                        first incumbent of the search, as returned by write_pruning_data
+        neighbourhoods (list[str], optional): names of the neighbourhoods among lns.NEIGHBOURHOODS (default=None, i.e. all)
+        seed (int, optional): random seed of the driver and of the solver (default=None)
+        timeout (int, optional): timeout of the whole search in seconds (default=300)
+    """
+    start = time.time()
+    m, n, l, s, D = read_dzn(instance_file)
+    lower_bound, upper_bound, incumbent = bounds
+
+    with tempfile.NamedTemporaryFile("w", suffix=".dzn") as lns_data:
+        def solve_neighbourhood(courier, bound, order, seconds):
+            write_lns_data(courier, bound, order, m, lns_data)
+            return run_minizinc(solver, model_path, pruning_path, instance_file, data_path, seed, seconds, [lns_data.name])
+
+        value, routes, optimal = lns_search(D, lower_bound, upper_bound, incumbent, solve_neighbourhood,
+                                            start + timeout, neighbourhoods, seed)
+
+    elapsed = min(math.floor(time.time() - start), timeout)
+    if value is None:
+        return {"time": elapsed if optimal else timeout, "optimal": optimal, "obj": "UNSAT" if optimal else "N/A", "sol": []}
+    entry = {"time": elapsed if optimal else timeout, "optimal": optimal, "obj": value, "sol": routes}
+    if incumbent is not None and value == incumbent[0]:
+        # no neighbourhood improved the first incumbent, only better solutions being accepted
+        entry["source"] = incumbent[2]
+    return entry
+
+
+def run_cp(instance_file, model_names=None, seed=None, timeout=300, sandbox=True, on_result=None):
+    """Runs the models on the given instance: the LNS or non-LNS variants depending on how the test model performs,
+    unless the models to run are given explicitly
+
+    Args:
+        instance_file (str): path of the .dzn file representing the instance
+        model_names (list[str], optional): names of the models to run (default=None, i.e. decided by the test model)
+        seed (int, optional): random seed of the solvers (default=None, i.e. the solvers' default)
+        timeout (int, optional): timeout of each model in seconds (default=300)
+        sandbox (bool, optional): wether or not to run each model in a sandboxed child process (default=True)
+        on_result (function, optional): function of (model name, result entry) called as soon as each model finishes,
+                                        e.g. to store its result before the next one runs (default=None)
+    """
     dictionary = {}
 
-    test_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), no_lns_test[1])
-    
-    # test without LNS
-    output = subprocess.run(["minizinc", "--solver", "Gecode", "--output-time","--solver-time-limit", "300000",
-                            test_path, instance_file],
-                            stdout=subprocess.PIPE,
-                            text=True)
-    
-    test_solution = extract_solution(output.stdout)
-    
-    # save the answer
-    dictionary[no_lns_test[0]] = test_solution
-
-    # choose models based on test
-    if test_solution["time"] <= 30:    # if below 30sec
-        models = models_no_lns
+    # preprocessing data, depending on the objective upper bound of the model
+    pruning_data = {}
+    bounds = {}
+    for implied_constraint in [True, False]:
+        pruning_data[implied_constraint] = tempfile.NamedTemporaryFile("w", suffix=".dzn")
+        bounds[implied_constraint] = write_pruning_data(instance_file, implied_constraint, pruning_data[implied_constraint], timeout)
+    lower_bound, _, incumbent = bounds[True]
+
+    def solve(run):
+        if incumbent is not None and incumbent[0] <= lower_bound:
+            # the heuristic solution is optimal
+            with instrumentation.recording() as recorder:
+                instrumentation.incumbent(incumbent[0])
+            return {"time": 0, "optimal": True, "obj": incumbent[0], "sol": incumbent[1], "source": incumbent[2],
+                    "stats": recorder.to_dict()}
+        solution = run_model(run, timeout, sandbox)
+        if solution["obj"] == "N/A" and solution.get("status") != "error" and incumbent is not None:
+            # no solution found in time, fall back to the heuristic one
+            solution.update({"obj": incumbent[0], "sol": incumbent[1], "source": incumbent[2]})
+        return solution
+
+    if model_names is None:
+        test_path, pruning_path = model_file(**{**no_lns_test[1], **model_parameters("CP", no_lns_test[0])[0]})
+
+        # test without LNS
+        def run_test():
+            with instrumentation.recording() as recorder:
+                test_solution = run_minizinc("Gecode", test_path, pruning_path, instance_file, pruning_data[True].name, seed, timeout)
+            test_solution["stats"] = recorder.to_dict()
+            return test_solution
+
+        test_solution = solve(run_test)
+
+        # save the answer
+        dictionary[no_lns_test[0]] = test_solution
+        if on_result is not None:
+            on_result(no_lns_test[0], test_solution)
+
+        # choose models based on test
+        if test_solution["time"] <= 30:    # if below 30sec
+            models = models_no_lns
+        else:
+            models = models_lns
     else:
-        models = models_lns
-
-    for model_name, model_file in models:
-
-        model_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), model_file)
-        if "Gecode" in model_name:
-            output = subprocess.run(["minizinc", "--solver", "Gecode", "--output-time","--solver-time-limit", "300000",
-                                    model_path, instance_file],
-                                    stdout=subprocess.PIPE,
-                                    text=True)
-        elif "Chuffed" in model_name:
-            output = subprocess.run(["minizinc", "--solver", "Chuffed", "--output-time","--solver-time-limit", "300000",
-                                    model_path, instance_file],
-                                    stdout=subprocess.PIPE,
-                                    text=True)
-
-        solution = extract_solution(output.stdout)
-        dictionary[model_name] = solution
+        all_models = dict([no_lns_test] + models_no_lns + models_lns + lns_drivers)
+        models = [(model_name, all_models[model_name]) for model_name in model_names if model_name in all_models]
+
+    for model_name, features in models:
+
+        # features of the configuration profile (see tune.py), overriding the ones of the model
+        features = {**features, **model_parameters("CP", model_name)[0]}
+        model_path, pruning_path = model_file(**features)
+        data_path = pruning_data[features.get("implied", True)].name
+        solver = "Gecode" if "Gecode" in model_name else "Chuffed"
+
+        def run():
+            with instrumentation.recording() as recorder:
+                if model_name in lns_driver_neighbourhoods:
+                    solution = run_lns_driver(solver, model_path, pruning_path, instance_file, data_path, bounds[True],
+                                              lns_driver_neighbourhoods[model_name], seed, timeout)
+                else:
+                    solution = run_minizinc(solver, model_path, pruning_path, instance_file, data_path, seed, timeout)
+            solution["stats"] = recorder.to_dict()
+            return solution
+
+        dictionary[model_name] = solve(run)
+        if on_result is not None:
+            on_result(model_name, dictionary[model_name])
         print(f"Finished running model {model_name}")
 
+    for data_file in pruning_data.values():
+        data_file.close()
 
     return dictionary
\ No newline at end of file
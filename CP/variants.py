@@ -0,0 +1,86 @@
+import os
+
+from common.templates import render, cached_file
+
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "templates")
+
+# preprocessing of the models of each template, see CP_pruning.mzn
+PRUNING_MODELS = {"successors": "CP_pruning.mzn",
+                  "giant_tour": "CP_pruning_giant_tour.mzn"}
+
+# decision variables of each template, searched and relaxed by LNS
+SEARCH_VARIABLES = {"successors": "array1d(T)",
+                    "giant_tour": "succ"}
+
+# features of a model variant, which the variants override
+DEFAULT_FEATURES = {"template": "successors",
+                    "implied": True,            # every courier delivers at least one item
+                    "sym_break": True,          # symmetry breaking between couriers which can swap their loads
+                    "search": ("dom_w_deg", "indomain_min"),  # variable and value selection, None for the solver's
+                    "restart": None,            # None, "luby", "geometric" or "constant"
+                    "restart_scale": 100,
+                    "restart_base": 1.5,        # growth factor of the geometric restarts
+                    "lns_rate": None,           # percentage of the variables kept by relax_and_reconstruct, None for no LNS
+                    "lns_driver": False}        # variant searched by the LNS driver of lns.py, successors only
+
+
+def solve_annotations(features):
+    """Returns the annotations of the solve item of a variant
+
+    Args:
+        features (dict): the features of the variant, see DEFAULT_FEATURES
+
+    Returns:
+        str: the annotations, each one preceded by "::"
+    """
+    variables = SEARCH_VARIABLES[features["template"]]
+    annotations = []
+    if features["lns_driver"]:
+        # the successors nearest first, the longest couriers of the incumbent first (see templates/successors.mzn)
+        annotations.append("int_search([rank[lns_order[k], j] | k in COURIERS, j in D_SIZE], first_fail, indomain_min)")
+    elif features["search"] is not None:
+        annotations.append(f"int_search({variables}, {features['search'][0]}, {features['search'][1]})")
+    if features["restart"] == "luby" or features["restart"] == "constant":
+        annotations.append(f"restart_{features['restart']}({features['restart_scale']})")
+    elif features["restart"] == "geometric":
+        annotations.append(f"restart_geometric({features['restart_base']}, {features['restart_scale']})")
+    elif features["restart"] is not None:
+        raise ValueError(f"Feature [restart] must be among luby, geometric, constant or None, was given '{features['restart']}'")
+    if features["lns_rate"] is not None:
+        if features["restart"] is None:
+            raise ValueError("LNS (feature [lns_rate]) requires restarts (feature [restart])")
+        annotations.append(f"relax_and_reconstruct({variables}, {features['lns_rate']})")
+    return "".join(f"\n      :: {annotation}" for annotation in annotations)
+
+
+def model_text(**features):
+    """Generates the MiniZinc model of a variant from its template
+
+    Args:
+        features: the features of the variant overriding DEFAULT_FEATURES
+
+    Returns:
+        str: the model
+    """
+    unknown = set(features) - set(DEFAULT_FEATURES)
+    if unknown:
+        raise ValueError(f"Unknown model features {sorted(unknown)}, the features are {sorted(DEFAULT_FEATURES)}")
+    features = {**DEFAULT_FEATURES, **features}
+    with open(os.path.join(TEMPLATES_DIR, f"{features['template']}.mzn")) as f:
+        template = f.read()
+    return render(template, features, {"annotations": solve_annotations(features)})
+
+
+def model_file(**features):
+    """Generates the MiniZinc model of a variant, cached by the hash of its text
+
+    Args:
+        features: the features of the variant overriding DEFAULT_FEATURES
+
+    Returns:
+        (str, str): the paths of the model and of its preprocessing model
+    """
+    template = features.get("template", DEFAULT_FEATURES["template"])
+    pruning_path = os.path.join(os.path.dirname(TEMPLATES_DIR), PRUNING_MODELS[template])
+    return (cached_file(model_text(**features), f"CP_{template}", "mzn"), pruning_path)
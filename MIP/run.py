@@ -5,32 +5,46 @@ import os
 
 from amplpy import AMPL, modules
 
+from common import instrumentation
+from common.bounds import objective_bounds, max_items_per_courier
+from common.sandbox import run_model
+from common.preprocessing import infeasible_assignments, infeasible_arcs
+from common.routes import unpermute, successors_from_arcs, routes_from_successors
+from common.config import model_parameters
+
 from .models import *
 
 
 solvers = ["highs", "cbc", "gurobi", "cplex"]
 
-models = [ ("highs", model_complete),
-           ("highs_no_sym_break", model_no_sym_break),
-           ("highs_no_implied", model_no_implied), 
-           ("cbc", model_complete),
-           ("gurobi", model_complete),
-           ("gurobi_no_sym_break", model_no_sym_break),
-           ("gurobi_no_implied", model_no_implied),
-           ("cplex", model_complete)
-          ]
+# the solver of each model is the first part of its name, and its AMPL model is generated by mip_model without
+# the constraints named after "no_"
+models = ["highs",
+          "highs_no_sym_break",
+          "highs_no_implied",
+          "cbc",
+          "gurobi",
+          "gurobi_no_sym_break",
+          "gurobi_no_implied",
+          "cplex"]
 
 
-def run_model_on_instance(MCP_model, file, solver, symmetry_breaking=True, implied_constraint=True):
+def run_model_on_instance(MCP_model, file, solver, symmetry_breaking=True, implied_constraint=True, timeout=300, heuristic=True, solver_options=None):
     """Read the instance from .dat file and run the given MCP model on it
 
     Args:
-        MCP_model (str): function representing the MIP model to use
+        MCP_model (str): the AMPL model to use, as generated by mip_model
         file (str): path of the .dat file representing the instance
         solver (str): which solver to use
         symmetry_breaking (bool, optional): wether or not to use symmetry breaking constraint (Default=True)
         implied_constraint (bool, optional): wether or not to use implied constraint (Default=True)
+        timeout (int, optional): timeout of the solver in seconds (Default=300)
+        heuristic (bool, optional): wether or not to bound the objective with a heuristic solution, returned if the solver
+                                    finds no solution in time (Default=True)
+        solver_options (dict, optional): options of the solver besides the time limit, e.g. {"mipfocus": 1} for gurobi
+                                         (Default=None)
     """
+    instrumentation.begin("parse")
     # extract data from .dat file
     with open(file) as f:
         m = int(next(f))
@@ -39,6 +53,13 @@ def run_model_on_instance(MCP_model, file, solver, symmetry_breaking=True, impli
         s = [int(e) for e in next(f).split()]
         D_matrix = np.genfromtxt(f, dtype=int)
 
+    # bounds on the objective, computed before sorting the couriers so that the heuristic routes are in their original order
+    instrumentation.begin("bounds")
+    lower_bound, upper_bound, incumbent = objective_bounds(m, n, l, s, D_matrix, implied_constraint, heuristic, timeout=timeout)
+    if incumbent is not None and incumbent[0] <= lower_bound:
+        # the heuristic solution is optimal
+        return {"time": 0, "optimal": True, "obj": incumbent[0], "sol": incumbent[1], "source": incumbent[2]}
+
     if symmetry_breaking:
         # sort the list of loads, keeping the permutation used for later
         L = [(l[i], i) for i in range(m)]
@@ -50,6 +71,7 @@ def run_model_on_instance(MCP_model, file, solver, symmetry_breaking=True, impli
     # flatten the adjacency matrix to a list in order to feed it to the model
     D = np.ravel(D_matrix).tolist()
 
+    instrumentation.begin("encode")
     ampl = AMPL()
 
     # load model
@@ -63,22 +85,33 @@ def run_model_on_instance(MCP_model, file, solver, symmetry_breaking=True, impli
     ampl.param["size"] = s
     ampl.param["D"] = D
 
-    if implied_constraint:
-        # compute the objective value upper bound respectively
-        max_distances = [max(D_matrix[i][:-1]) for i in range(n)]
-        max_distances.sort()
-        upper_bound = sum(max_distances[m:]) + max(D_matrix[n]) + max([D_matrix[j][n] for j in range(n)])
-        ampl.param["obj_upper_bound"] = upper_bound
+    # bounds of the objective, and maximum number of items of a route as big-M of the visit sequence
+    ampl.param["obj_upper_bound"] = upper_bound
+    ampl.param["obj_lower_bound"] = lower_bound
+    ampl.param["max_items"] = max_items_per_courier(m, n, l, s, implied_constraint)
+
+    # preprocessing: fix to 0 the variables that can't be part of any solution
+    impossible_assignments = infeasible_assignments(l, s)
+    impossible_arcs = infeasible_arcs(D_matrix, upper_bound)
+    forbidden_assignments = [(i+1, k+1) for i in range(m) for k in range(n) if impossible_assignments[i][k]]
+    forbidden_arcs = [(j+1, k+1) for j in range(n+1) for k in range(n+1) if impossible_arcs[j][k]]
+    if forbidden_assignments:
+        ampl.set["FORBIDDEN_ASSIGNMENTS"] = forbidden_assignments
+    if forbidden_arcs:
+        ampl.set["FORBIDDEN_ARCS"] = forbidden_arcs
 
     # specify the solver to use and set timeout
     ampl.option["solver"] = solver
-    if solver != "cplex":
-        ampl.option[f"{solver}_options"] = "timelim=300"
-    else:
-        ampl.option[f"{solver}_options"] = "time=300"
+    options = {"time" if solver == "cplex" else "timelim": timeout, **(solver_options or {})}
+    ampl.option[f"{solver}_options"] = " ".join(f"{name}={value}" for name, value in options.items())
 
     # solve
+    instrumentation.begin("solve")
     ampl.solve()
+    instrumentation.begin("readout")
+    instrumentation.solver_call(ampl.get_value("_total_solve_time"))
+    instrumentation.count("variables", ampl.get_value("_nvars"))
+    instrumentation.count("constraints", ampl.get_value("_ncons"))
 
     # Stop if the model was not solved
     solve_result = ampl.get_value("solve_result")
@@ -87,9 +120,9 @@ def run_model_on_instance(MCP_model, file, solver, symmetry_breaking=True, impli
     time = math.floor(ampl.getValue('_total_solve_time'))
 
     # optimal
-    if time >= 300:
+    if time >= timeout:
         optimal = False
-        time = 300
+        time = timeout
     else:
         optimal = True
 
@@ -100,37 +133,38 @@ def run_model_on_instance(MCP_model, file, solver, symmetry_breaking=True, impli
         return {"time": time, "optimal": optimal, "obj": "UNSAT", "sol": []}
 
     elif obj_value == 0:    # No solution found, timeout
-        return {"time": 300, "optimal": False, "obj": "N/A"}
+        if incumbent is not None:
+            return {"time": timeout, "optimal": False, "obj": incumbent[0], "sol": incumbent[1], "source": incumbent[2]}
+        return {"time": timeout, "optimal": False, "obj": "N/A"}
 
     # solution
     df = ampl.get_variable("X").get_values().to_list()
     # reconstruct X
-    X = [[[-1 for j in range(n+1)] for k in range(n+1)] for i in range(m)]
+    X = np.zeros((m, n+1, n+1), dtype=int)
     for i, j, k, value in df:
-        i, j, k, value = int(i), int(j), int(k), int(round(value, 0))
-        if symmetry_breaking:
-            # also reorder couriers w.r.t permutation
-            X[permutation[i-1]][j-1][k-1] = value
-        else:
-            X[i-1][j-1][k-1] = value
+        X[int(i)-1, int(j)-1, int(k)-1] = int(round(value, 0))
+    if symmetry_breaking:
+        # also reorder couriers w.r.t permutation
+        X = unpermute(X, permutation)
 
     # retrieve solution
-    sol = []
-    for i in range(m):
-        route = []
-        if X[i][n][n] == 1:
-            pass
-        else:
-            v = X[i][n].index(1)
-            while v != n:
-                route.append(v+1)
-                v = X[i][v].index(1)
-        sol.append(route)
+    sol = routes_from_successors(successors_from_arcs(X))
 
     return {"time": time, "optimal": optimal, "obj":obj_value, "sol": sol}
 
 
-def run_mip(instance_file):
+def run_mip(instance_file, model_names=None, timeout=300, sandbox=True, on_result=None):
+    """Runs the models on the given instance
+
+    Args:
+        instance_file (str): path of the .dat file representing the instance
+        model_names (list[str], optional): names of the models to run (default=None, i.e. all of them)
+        timeout (int, optional): timeout of each model in seconds (default=300)
+        sandbox (bool, optional): wether or not to run each model in a sandboxed child process, killed together
+                                  with its solver if it overruns its timeout or runs out of memory (default=True)
+        on_result (function, optional): function of (model name, result entry) called as soon as each model finishes,
+                                        e.g. to store its result before the next one runs (default=None)
+    """
 
     # load solvers
     modules.install(solvers)
@@ -138,25 +172,40 @@ def run_mip(instance_file):
 
     dictionary = {}
 
-    for model_name, model in models:
+    for model_name in models:
+        if model_names is not None and model_name not in model_names:
+            continue
         sym_break = False if "no_sym_break" in model_name else True
         implied_constr = False if "no_implied" in model_name else True
         solver = model_name.split('_')[0]
-
-        # suppress solver output
-        old_stdout = sys.stdout
-        sys.stdout = open(os.devnull, 'w')
-        try:
-            model_dict = run_model_on_instance(model, instance_file, solver, symmetry_breaking=sym_break, implied_constraint=implied_constr)
-        except:
-            sys.stdout = old_stdout
-            print("There was an exception while running the model/retrieving solution")
-            exit(1)
-        finally:
-            sys.stdout = old_stdout
+        # parameters of the configuration profile (see tune.py)
+        parameters, solver_options = model_parameters("MIP", model_name)
+        sym_break = parameters.get("symmetry_breaking", sym_break)
+        implied_constr = parameters.get("implied_constraint", implied_constr)
+        model = mip_model(sym_break, implied_constr)
+
+        def run():
+            # suppress solver output
+            old_stdout = sys.stdout
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                with instrumentation.recording() as recorder:
+                    model_dict = run_model_on_instance(model, instance_file, solver, symmetry_breaking=sym_break, implied_constraint=implied_constr, timeout=timeout, solver_options=solver_options)
+                model_dict["stats"] = recorder.to_dict()
+            except:
+                sys.stdout = old_stdout
+                print("There was an exception while running the model/retrieving solution")
+                raise
+            finally:
+                sys.stdout = old_stdout
+            return model_dict
+
+        model_dict = run_model(run, timeout, sandbox)
 
         dictionary[model_name] = model_dict
+        if on_result is not None:
+            on_result(model_name, dictionary[model_name])
         print(f"Finished running model {model_name}")
 
 
-    return dictionary
\ No newline at end of file
+    return dictionary
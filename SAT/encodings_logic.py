@@ -1,5 +1,7 @@
 from z3 import *
 
+from .utils import aux_bools
+
 def at_least_one(bool_vars):
     """Z3 encoding of "At least one" over bool_vars
 
@@ -22,9 +24,9 @@ def at_most_one_seq(x, name):
         Z3-expression: the Z3 encoding of "At most one" over x
     """
     n = len(x)
-    if n == 1:
+    if n <= 1:
         return True
-    s = [Bool(f"s_{i}_{name}") for i in range(n-1)]     # s[i] modeled as: s[i] is true iff the sum up to index i is 1
+    s = aux_bools(f"s_{name}", n-1)     # s[i] modeled as: s[i] is true iff the sum up to index i is 1
 
     clauses = []
     clauses.append(Or(Not(x[0]), s[0]))                 # x[0] -> s[0]
@@ -71,6 +73,17 @@ def all_false(v):
     """
     return And([Not(v[k]) for k in range(len(v))])
 
+def allocated(v):
+    """Filters out of v the variables that were never allocated, i.e. fixed to False by the preprocessing
+
+    Args:
+        v (list[Bool]): the input list of Bools
+
+    Returns:
+        list[Bool]: the elements of v that are not the constant False
+    """
+    return [x for x in v if not is_false(x)]
+
 ## Orderings encoding
 
 def successive(v, u):
@@ -1,6 +1,7 @@
 from z3 import *
 
 from .encodings_logic import *
+from .utils import num_bits, bin_to_int, aux_bools
 
 
 def leq_same_digits(v, u, digits):
@@ -15,11 +16,13 @@ def leq_same_digits(v, u, digits):
         (Z3-expression): encoding of v <= u in binary considering their {digits} most significant bits
     """
     assert(len(v) == len(u) and len(u) == digits)
-    if digits == 1:
-        return Or(v[0]==u[0], And(Not(v[0]), u[0]))
-    else:
-        return Or(And(Not(v[0]), u[0]),
-                  And(v[0]==u[0], leq_same_digits(v[1:], u[1:], digits-1)))
+    # built iteratively from the least significant bit, i.e. v[k:] <= u[k:] iff
+    # v[k] < u[k] or (v[k] == u[k] and v[k+1:] <= u[k+1:])
+    formula = Or(v[digits-1]==u[digits-1], And(Not(v[digits-1]), u[digits-1]))
+    for k in range(digits - 2, -1, -1):
+        formula = Or(And(Not(v[k]), u[k]),
+                     And(v[k]==u[k], formula))
+    return formula
 
 
 def leq(v, u):
@@ -61,7 +64,7 @@ def sum_bin_same_digits(a_bin, b_bin, d_bin, digits, name):
         c[0] (Bool): last carry of binary encoding
     """
     # c_k represents carry at bit position k
-    c = [Bool(f"c_{k}_{name}") for k in range(digits + 1)]
+    c = aux_bools(f"c_{name}", digits + 1)
     c[-1] = False
 
     clauses = []
@@ -103,8 +106,7 @@ def sum_bin(a_bin, b_bin, d_bin, name):
                                                       b_bin[delta_digits:],
                                                       d_bin[delta_digits:],
                                                       digits_a, name)
-    c = [Bool(f"c_propagated_{k}_{name}")
-         for k in range(delta_digits)] + [last_carry]
+    c = aux_bools(f"c_propagated_{name}", delta_digits) + [last_carry]
     c[0] = False  # imposing no further overflow
 
     clauses = []
@@ -130,9 +132,11 @@ def conditional_sum_K_bin(x, alpha, delta, name):
     n = len(x)
     digits = len(delta)
 
+    if n == 0:
+        return all_false(delta)
+
     # matrix containing temporary results of sum_bin
-    d = [[Bool(f"d_{j}_{k}_{name}") for k in range(digits)]
-         for j in range(n - 1)]  # j = 1..n-1 because last row will be delta
+    d = aux_bools(f"d_{name}", n - 1, digits)  # j = 1..n-1 because last row will be delta
     d.append(delta)
 
     clauses = []
@@ -161,6 +165,94 @@ def conditional_sum_K_bin(x, alpha, delta, name):
 
     return And(clauses)
 
+def conditional_sum_K_bin_tree(x, alpha, delta, name):
+    """Encodes into a SAT formula the constraint {delta = sum_over_j(alpha[j] | x[j] == True)}, using a balanced tree
+       of adders instead of a chain: each leaf x[j]*alpha[j] needs no auxiliary variable since alpha[j] is known, and
+       each internal node has only the bits needed by the maximum sum of its subtree
+
+    Args:
+        x (list[Bool]): list of Z3 Variables, i.e. x_j tells wether or not to add alpha_j to the sum
+        alpha (list[list[bool]]): list of known coefficients, each one represented as list[bool] i.e. binary number, whose subset will be summed in the constraint
+        delta (list[Bool]): list of Z3 Variables, which will be constrained to represent the sum
+        name (string): to uniquely identify the created variables
+    Returns:
+        formula (Z3-expression): And of clauses representing SAT encoding of Linear Integer constraint
+
+    """
+    n = len(x)
+    digits = len(delta)
+
+    if n == 0:
+        return all_false(delta)
+
+    clauses = []
+
+    # leaves, with the maximum value they can take
+    terms = [([x[j] if bit else BoolVal(False) for bit in alpha[j]], bin_to_int(alpha[j])) for j in range(n)]
+
+    level = 0
+    while len(terms) > 1:
+        next_terms = []
+        for p in range(0, len(terms) - 1, 2):
+            (u, max_u), (v, max_v) = terms[p], terms[p + 1]
+            max_sum = max_u + max_v
+            node_digits = num_bits(max_sum) if max_sum > 0 else 1
+            d = aux_bools(f"tree_{level}_{p}_{name}", node_digits)
+            shorter, longer = (u, v) if len(u) <= len(v) else (v, u)
+            longer = [BoolVal(False)] * (node_digits - len(longer)) + longer    # pad with zeros
+            clauses.append(sum_bin(shorter, longer, d, f"{name}_{level}_{p}"))
+            next_terms.append((d, max_sum))
+        if len(terms) % 2 == 1:
+            next_terms.append(terms[-1])
+        terms = next_terms
+        level += 1
+
+    # delta == root of the tree (with eventual padding of zeros on either side)
+    root = terms[0][0]
+    if len(root) > digits:
+        clauses.append(all_false(root[:len(root) - digits]))
+        root = root[len(root) - digits:]
+    clauses.append(all_false(delta[:digits - len(root)]))
+    clauses.append(equal(delta[digits - len(root):], root))
+
+    return And(clauses)
+
+
+def pb_leq_swc(x, weights, K, name):
+    """Encodes into a SAT formula the pseudo-boolean constraint {sum_over_j(weights[j] | x[j] == True) <= K}, using
+       the sequential weight counter encoding: s[j][k] is implied by the sum of the first j+1 terms being at least k+1,
+       which gives O(n*K) auxiliary variables but full propagation by unit resolution
+
+    Args:
+        x (list[Bool]): list of Z3 Variables, i.e. x_j tells wether or not to add weights_j to the sum
+        weights (list[int]): list of positive known coefficients
+        K (int): the upper bound of the sum
+        name (string): to uniquely identify the created variables
+    Returns:
+        formula (Z3-expression): And of clauses representing SAT encoding of the pseudo-boolean constraint
+
+    """
+    n = len(x)
+    s = aux_bools(f"swc_{name}", n, K)
+
+    clauses = []
+    for j in range(n):
+        w = weights[j]
+        if w > K:
+            clauses.append(Not(x[j]))
+        for k in range(K):
+            if j > 0:
+                clauses.append(Or(Not(s[j-1][k]), s[j][k]))     # s[j-1][k] -> s[j][k]
+                if k + w < K:
+                    clauses.append(Or(Not(s[j-1][k]), Not(x[j]), s[j][k+w]))     # s[j-1][k] and x[j] -> s[j][k+w]
+            if k < w:
+                clauses.append(Or(Not(x[j]), s[j][k]))      # x[j] -> s[j][k]
+        if j > 0 and 1 <= w <= K:
+            clauses.append(Or(Not(s[j-1][K-w]), Not(x[j])))     # overflow: sum of the first j terms > K-w -> not x[j]
+
+    return And(clauses)
+
+
 ## Symmetry breaking constraint
 
 def sort_decreasing(matrix):
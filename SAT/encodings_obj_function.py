@@ -3,26 +3,20 @@ from z3 import *
 from .utils import *
 from .encodings_numbers import *
 
+from common.readout import binary_to_int
+
 
 def obj_function(model, distances):
     """Given a model, returns the objective function value that we are interested in (i.e. max of distances) as an integer
 
     Args:
         model (ModelRef): model of which to compute the objective function
-        distances (list[list[Bool]]): list containing the binary representation (using Z3 Bool variables) of each distance
+        distances (VariableArray): readout of the binary representation (using Z3 Bool variables) of each distance
 
     Returns:
         int: the maximum distance travelled
     """
-    m = len(distances)
-    maxdist = -1
-    for i in range(m):
-        dist = bin_to_int([
-            1 if model.evaluate(distances[i][j]) else 0
-            for j in range(len(distances[i]))
-        ])
-        maxdist = max(maxdist, dist)
-    return maxdist
+    return int(binary_to_int(distances.read(model)).max())
 
 
 def AllLessEq_bin(distances, upper_bound_bin):
@@ -1,16 +1,31 @@
+import os
 import time
-import copy
 
 from z3 import *
 
 from .utils import *
 from .encodings_numbers import *
 from .encodings_obj_function import *
-from .hamiltonian import *
 from .display import *
+from .portfolio import cooperative_search
 
+from common import instrumentation
+from common.bounds import objective_bounds
+from common.bound_search import parallel_bound_search
+from common.encoding_cache import encoding_key, load_encoding, store_encoding
+from common.preprocessing import infeasible_assignments, infeasible_routes
+from common.readout import VariableArray, binary_to_int
+from common.routes import unpermute, successors_from_arcs, successors_from_times, routes_from_successors, hamiltonian
 
-def multiple_couriers_planning(m, n, l, s, D, symmetry_breaking=True, implied_constraint=True, search='Binary', display_solution=True, timeout_duration=300):
+
+# source files defining the encoding, any change to them invalidates the cached encodings
+ENCODING_SOURCES = [os.path.join(os.path.dirname(os.path.realpath(__file__)), f)
+                    for f in ["model.py", "utils.py", "encodings_logic.py", "encodings_numbers.py", "../common/preprocessing.py"]]
+
+
+def multiple_couriers_planning(m, n, l, s, D, symmetry_breaking=True, implied_constraint=True, search='Binary', display_solution=True, timeout_duration=300, use_cache=True,
+                               sum_encoding='chain', capacity_encoding='binary', report_size=False, heuristic=True,
+                               probes=None):
     """Model 1 in Z3 for the Multiple Couriers Planning problem
 
     Args:
@@ -22,21 +37,64 @@ def multiple_couriers_planning(m, n, l, s, D, symmetry_breaking=True, implied_co
                              distribution point i to distribution point j
         symmetry_breaking (bool, optional): wether or not to use symmetry breaking constraints (default=True)
         implied_constraint (bool, optional): wether or not to use implied constraint (default=True)
-        search (str, optional) ['Linear', 'Binary']: the search strategy to use in the Optimization phase of solving (default='Binary')
+        search (str, optional) ['Linear', 'Binary', 'Parallel', 'Portfolio']: the search strategy to use in the Optimization phase of solving,
+                                                                      'Parallel' being a k-ary search with k forked copies of the solver and
+                                                                      'Portfolio' k forked copies of the solver exchanging bounds and learnt
+                                                                      clauses (default='Binary')
         display_solution (bool, optional): wether or not to print the final solution obtained, with the path travelled by each courier (default=True)
         timeout_duration (int, optional): timeout in seconds (default=300)
+        use_cache (bool, optional): wether or not to load/store the encoding from/to the on-disk encoding cache (default=True)
+        sum_encoding (str, optional) ['chain', 'tree']: encoding of the sums defining loads and distances, either a chain of
+                                     adders or a balanced tree of adders (default='chain')
+        capacity_encoding (str, optional) ['binary', 'swc']: encoding of the capacity constraints, either comparing the binary
+                                          loads with l or a sequential weight counter over the assignments (default='binary')
+        report_size (bool, optional): wether or not to record the number of variables and clauses of the encoding (default=False)
+        heuristic (bool, optional): wether or not to bound the objective with a heuristic solution, returned if no better one
+                                    is found in time (default=True)
+        probes (int, optional): number of concurrent solvers of the 'Parallel' and 'Portfolio' searches (default=None, i.e. the number of CPUs)
 
     """
     start_time = time.time()
 
+    # Bounds on objective function, computed before sorting the couriers so that the heuristic routes are in their original order
+    instrumentation.begin("bounds")
+    lower_bound, upper_bound, incumbent = objective_bounds(m, n, l, s, D, implied_constraint, heuristic, timeout=timeout_duration)
+    if incumbent is not None and incumbent[0] <= lower_bound:
+        # the heuristic solution is optimal
+        instrumentation.source(incumbent[2])
+        return (incumbent[0], 0, incumbent[1])
+    instrumentation.begin("encode")
+
+    if sum_encoding == 'chain':
+        sum_encoder = conditional_sum_K_bin
+    elif sum_encoding == 'tree':
+        sum_encoder = conditional_sum_K_bin_tree
+    else:
+        raise ValueError(f"Input parameter [sum_encoding] mush be either 'chain' or 'tree', was given '{sum_encoding}'")
+    if capacity_encoding not in ['binary', 'swc']:
+        raise ValueError(f"Input parameter [capacity_encoding] mush be either 'binary' or 'swc', was given '{capacity_encoding}'")
+
+    if symmetry_breaking:
+        # sort the list of loads, keeping the permutation used for later
+        L = [(l[i], i) for i in range(m)]
+        L.sort(reverse=True)
+        l, permutation = zip(*L)
+        l = list(l)
+        permutation = list(permutation)
+
+    # Preprocessing: item-courier pairs and arcs that can't be part of any solution are never allocated as variables,
+    # but fixed to False (and left out of the sums below)
+    impossible_a = infeasible_assignments(l, s)
+    impossible_r = infeasible_routes(l, s, D, upper_bound)
+
     ## VARIABLES
 
     # a for assignments
-    a = [[Bool(f"a_{i}_{j}") for j in range(n)] for i in range(m)]
+    a = [[BoolVal(False) if impossible_a[i][j] else Bool(f"a_{i}_{j}") for j in range(n)] for i in range(m)]
     # a_ij = 1 indicates that courier i delivers object j
 
     # r for routes
-    r = [[[Bool(f"r_{i}_{j}_{k}") for k in range(n+1)] for j in range(n+1)] for i in range(m)]
+    r = [[[BoolVal(False) if impossible_r[i][j][k] else Bool(f"r_{i}_{j}_{k}") for k in range(n+1)] for j in range(n+1)] for i in range(m)]
     # r_ijk = 1 indicates that courier i moves from delivery point j to delivery point k in his route
     # n+1 delivery points because considering Origin point as well, representes as n+1-th row and column
 
@@ -47,111 +105,122 @@ def multiple_couriers_planning(m, n, l, s, D, symmetry_breaking=True, implied_co
     courier_loads = [[Bool(f"cl_{i}_{k}") for k in range(num_bits(sum(s)))] for i in range(m)]
     # courier_loads_i = binary representation of actual load carried by each courier
 
-    solver = Solver()
-
-
-    ## CONSTRAINTS
-    if symmetry_breaking:
-        # sort the list of loads, keeping the permutation used for later
-        L = [(l[i], i) for i in range(m)]
-        L.sort(reverse=True)
-        l, permutation = zip(*L)
-        l = list(l)
-        permutation = list(permutation)
+    # distances[i] := binary representation of the distance travelled by courier i, at most upper_bound
+    distances = [[Bool(f"dist_bin_{i}_{k}") for k in range(num_bits(upper_bound))] for i in range(m)]
 
-        ## Symmetry breaking constraint -> after having sorted l above, impose the actually couriers_loads to be sorted decreasingly as well
-        solver.add(sort_decreasing(courier_loads))
-        # Break symmetry within same load amounts, i.e.:
-        # if two couriers carry the same load amount, impose a lexicografic ordering on the respective rows of a,
-        # i.e. the first courier will be the one assigned to the route containing the item with higher index j
-        for i in range(m - 1):
-            solver.add(
-                Implies(equal(courier_loads[i], courier_loads[i + 1]),
-                        leq(a[i], a[i + 1])))
+    solver = Solver()
 
     # Conversions:
     s_bin = [int_to_bin(s_j, num_bits(s_j)) for s_j in s]
     l_bin = [int_to_bin(l_i, num_bits(l_i)) for l_i in l]
 
 
-    # Constraint 1: every object is assigned to one and only one courier
-    for j in range(n):
-        solver.add(exactly_one_seq([a[i][j] for i in range(m)], f"assignment_{j}"))
-
+    def encode():
+        ## CONSTRAINTS
+        if symmetry_breaking:
+            ## Symmetry breaking constraint -> after having sorted l above, impose the actually couriers_loads to be sorted decreasingly as well
+            solver.add(sort_decreasing(courier_loads))
+            # Break symmetry within same load amounts, i.e.:
+            # if two couriers carry the same load amount, impose a lexicografic ordering on the respective rows of a,
+            # i.e. the first courier will be the one assigned to the route containing the item with higher index j
+            for i in range(m - 1):
+                solver.add(
+                    Implies(equal(courier_loads[i], courier_loads[i + 1]),
+                            leq(a[i], a[i + 1])))
+
+        # Constraint 1: every object is assigned to one and only one courier
+        for j in range(n):
+            solver.add(exactly_one_seq(allocated([a[i][j] for i in range(m)]), f"assignment_{j}"))
 
-    # Constraint 2: every courier can't exceed its load capacity
-    for i in range(m):
-        solver.add(conditional_sum_K_bin(a[i], s_bin, courier_loads[i], f"compute_courier_load_{i}"))
-        solver.add(leq(courier_loads[i], l_bin[i]))
 
-    # Constraint 3: every courier has at least 1 item to deliver (implied constraint, because n >= m and distance is quasimetric)
-    if implied_constraint:
+        # Constraint 2: every courier can't exceed its load capacity
         for i in range(m):
-            solver.add(at_least_one(a[i]))
-
-    # Constraint 4: every object is delivered at some time in its courier's route, and only once
-    for i in range(n):
-        solver.add(exactly_one_seq(t[i], f"time_of_{i}"))
-
-    # Constraint 5: routes
-    for i in range(m):
-        # Constraint 5.1: diagonal is full of zeros, i.e. can't leave from j to go to j
-        solver.add(And([Not(r[i][j][j]) for j in range(n)]))
+            items = [j for j in range(n) if not impossible_a[i][j]]
+            if capacity_encoding == 'swc':
+                solver.add(pb_leq_swc([a[i][j] for j in items], [s[j] for j in items], l[i], f"capacity_{i}"))
+            # the binary loads are still needed by the symmetry breaking constraints
+            if capacity_encoding == 'binary' or symmetry_breaking:
+                solver.add(sum_encoder([a[i][j] for j in items], [s_bin[j] for j in items], courier_loads[i], f"compute_courier_load_{i}"))
+            if capacity_encoding == 'binary':
+                solver.add(leq(courier_loads[i], l_bin[i]))
+
+        # Constraint 3: every courier has at least 1 item to deliver (implied constraint, because n >= m and distance is quasimetric)
         if implied_constraint:
-            solver.add(Not(r[i][n][n]))     # don't let courier i have a self loop
+            for i in range(m):
+                solver.add(at_least_one(a[i]))
 
-        # Constraint 5.2: row j has a 1 iff courier i delivers object j
-        # rows
-        for j in range(n):
-            solver.add(Implies(a[i][j], exactly_one_seq(r[i][j], f"courier_{i}_leaves_{j}")))  # If a_ij then exactly_one(r_ij)
-            solver.add(Implies(Not(a[i][j]), all_false(r[i][j])))   # else all_false(r_ij)
-        solver.add(exactly_one_seq(r[i][n], f"courier_{i}_leaves_origin"))    # exactly_one in origin point row === courier i leaves from origin
-
-        # Constraint 5.3: column j has a 1 iff courier i delivers object j
-        # columns
-        for k in range(n):
-            solver.add(Implies(a[i][k], exactly_one_seq([r[i][j][k] for j in range(n+1)], f"courier_{i}_reaches_{k}")))  # If a_ij then exactly_one(r_i,:,k)
-            solver.add(Implies(Not(a[i][k]), all_false([r[i][j][k] for j in range(n+1)])))   # else all_false(r_i,:,k)
-        solver.add(exactly_one_seq([r[i][j][n] for j in range(n+1)], f"courier_{i}_returns_to_origin"))         # exactly_one in origin point column === courier i returns to origin
-
-        # Constraint 5.4: use ordering between t_j and t_k in every edge travelled
-        # in order to avoid loops not containing the origin
-        for j in range(n):
-            for k in range(n):
-                solver.add(Implies(r[i][j][k], successive(t[j], t[k])))
-            solver.add(Implies(r[i][n][j], t[j][0]))
+        # Constraint 4: every object is delivered at some time in its courier's route, and only once
+        for i in range(n):
+            solver.add(exactly_one_seq(t[i], f"time_of_{i}"))
 
+        # Constraint 5: routes
+        for i in range(m):
+            # Constraint 5.1: diagonal is full of zeros, i.e. can't leave from j to go to j
+            solver.add(And([Not(r[i][j][j]) for j in range(n)]))
+            if implied_constraint:
+                solver.add(Not(r[i][n][n]))     # don't let courier i have a self loop
+
+            # Constraint 5.2: row j has a 1 iff courier i delivers object j
+            # rows
+            for j in range(n):
+                solver.add(Implies(a[i][j], exactly_one_seq(allocated(r[i][j]), f"courier_{i}_leaves_{j}")))  # If a_ij then exactly_one(r_ij)
+                solver.add(Implies(Not(a[i][j]), all_false(r[i][j])))   # else all_false(r_ij)
+            solver.add(exactly_one_seq(allocated(r[i][n]), f"courier_{i}_leaves_origin"))    # exactly_one in origin point row === courier i leaves from origin
+
+            # Constraint 5.3: column j has a 1 iff courier i delivers object j
+            # columns
+            for k in range(n):
+                solver.add(Implies(a[i][k], exactly_one_seq(allocated([r[i][j][k] for j in range(n+1)]), f"courier_{i}_reaches_{k}")))  # If a_ij then exactly_one(r_i,:,k)
+                solver.add(Implies(Not(a[i][k]), all_false([r[i][j][k] for j in range(n+1)])))   # else all_false(r_i,:,k)
+            solver.add(exactly_one_seq(allocated([r[i][j][n] for j in range(n+1)]), f"courier_{i}_returns_to_origin"))         # exactly_one in origin point column === courier i returns to origin
+
+            # Constraint 5.4: use ordering between t_j and t_k in every edge travelled
+            # in order to avoid loops not containing the origin
+            for j in range(n):
+                for k in range(n):
+                    solver.add(Implies(r[i][j][k], successive(t[j], t[k])))
+                solver.add(Implies(r[i][n][j], t[j][0]))
+
+        # flatten r and D
+        flat_r = [flatten(r[i]) for i in range(m)]
+        flat_D = flatten(D)
+        # convert flat_D to binary
+        flat_D_bin = [int_to_bin(e, num_bits(e) if e > 0 else 1) for e in flat_D]
+
+        # Constraint 6: distances travelled by each courier, defined using constraints over the allocated arcs only
+        for i in range(m):
+            arcs = [e for e in range(len(flat_r[i])) if not is_false(flat_r[i][e])]
+            solver.add(sum_encoder([flat_r[i][e] for e in arcs], [flat_D_bin[e] for e in arcs], distances[i], f"distances_def_{i}"))
 
 
-    ## OPTIMIZATION SEARCH
-
-    # flatten r and D
-    flat_r = [flatten(r[i]) for i in range(m)]
-    flat_D = flatten(D)
-    # convert flat_D to binary
-    flat_D_bin = [int_to_bin(e, num_bits(e) if e > 0 else 1) for e in flat_D]
-
+    # the encoding only depends on the instance and on the constraints used, so it is shared between search strategies and runs
+    cache_key = encoding_key("SAT.model", ENCODING_SOURCES, m, n, l, s, D, symmetry_breaking, implied_constraint,
+                             sum_encoding, capacity_encoding, upper_bound)
+    cached = use_cache and load_encoding(solver, cache_key)
+    if not cached:
+        encode()
+        if use_cache:
+            store_encoding(solver, cache_key)
+    instrumentation.count("cached_encoding", cached)
 
-    # Constraint 6: distances travelled by each courier
-    # distances[i] := binary representation of the distance travelled by courier i
-    # Take as upper bound the greater n-(m-1) maximum distances, since that's the maximum items a single courier can be assigned to
-    max_distances = [max(D[i][:-1]) for i in range(n)]
-    max_distances.sort()
-    if implied_constraint:
-        upper_bound = sum(max_distances[m:]) + max(D[n]) + max([D[j][n] for j in range(n)])
-    else:
-        upper_bound = sum(max_distances[1:]) + max(D[n]) + max([D[j][n] for j in range(n)])
-    lower_bound = max([D[n][j] + D[j][n] for j in range(n)])
+    if report_size:
+        num_vars, num_clauses = encoding_size(solver)
+        instrumentation.count("cnf_variables", num_vars)
+        instrumentation.count("cnf_clauses", num_clauses)
 
-    distances = [[Bool(f"dist_bin_{i}_{k}") for k in range(num_bits(upper_bound))] for i in range(m)]
 
-    # definition of distances using constraints
-    for i in range(m):
-        solver.add(conditional_sum_K_bin(flat_r[i], flat_D_bin, distances[i], f"distances_def_{i}"))
+    ## OPTIMIZATION SEARCH
 
     model = None
+    solution = None
     obj_value = None
+    # wether the search proved its result, the linear and binary searches only stop early at the timeout
+    complete = True
+    # the distances are read at every solution found, so their readout is prepared once
+    distances_readout = VariableArray(distances)
     encoding_time = time.time()
+    instrumentation.count("assertions", len(solver.assertions()))
+    instrumentation.begin("solve")
     # print(f"Encoding finished at time {round(encoding_time - start_time, 1)}s, now start solving/optimization search")
 
     timeout = encoding_time + timeout_duration
@@ -161,11 +230,15 @@ def multiple_couriers_planning(m, n, l, s, D, symmetry_breaking=True, implied_co
 
     if search == 'Linear':
 
+        upper_bound_bin = int_to_bin(upper_bound, num_bits(upper_bound))
+        solver.add(AllLessEq_bin(distances, upper_bound_bin))
+
         solver.set('timeout', millisecs_left(time.time(), timeout))
-        while solver.check() == z3.sat:
+        while instrumentation.check(solver) == z3.sat:
 
             model = solver.model()
-            obj_value = obj_function(model, distances)
+            obj_value = obj_function(model, distances_readout)
+            instrumentation.incumbent(obj_value)
             # print(f"This model obtained objective value: {obj_value} after {round(time.time() - encoding_time, 1)}s")
 
             if obj_value <= lower_bound:
@@ -204,9 +277,10 @@ def multiple_couriers_planning(m, n, l, s, D, symmetry_breaking=True, implied_co
             solver.set('timeout', millisecs_left(now, timeout))
             # print(f"Trying with bounds: [{lower_bound}, {upper_bound}] and posing obj_val <= {mid}")
 
-            if solver.check() == z3.sat:
+            if instrumentation.check(solver) == z3.sat:
                 model = solver.model()
-                obj_value = obj_function(model, distances)
+                obj_value = obj_function(model, distances_readout)
+                instrumentation.incumbent(obj_value)
                 # print(f"This model obtained objective value: {obj_value} after {round(time.time() - encoding_time, 1)}s")
 
                 if obj_value <= 1:
@@ -227,41 +301,70 @@ def multiple_couriers_planning(m, n, l, s, D, symmetry_breaking=True, implied_co
             solver.add(AllLessEq_bin(distances, upper_bound_bin))
             solver.add(AtLeastOneGreaterEq_bin(distances, lower_bound_bin))
 
+    elif search in ['Parallel', 'Portfolio']:
+
+        # the probes run in forked processes, so they send back the values of the variables instead of their model
+        readouts = [VariableArray(v) for v in [r, t, a, distances]]
+
+        def read(model):
+            values = [readout.read(model) for readout in readouts]
+            return (int(binary_to_int(values[3]).max()), values)
+
+        def bound_constraint(lower, bound):
+            return And(AtLeastOneGreaterEq_bin(distances, int_to_bin(lower, num_bits(lower))),
+                       AllLessEq_bin(distances, int_to_bin(bound, num_bits(bound))))
+
+        if search == 'Parallel':
+            obj_value, solution, complete = parallel_bound_search(solver, bound_constraint, read, lower_bound, upper_bound, timeout, probes)
+        else:
+            obj_value, solution, complete = cooperative_search(solver, distances, read, lower_bound, upper_bound, timeout, probes)
+        instrumentation.count("search_complete", complete)
+
     else:
-        raise ValueError(f"Input parameter [search] mush be either 'Linear' or 'Binary', was given '{search}'")
+        raise ValueError(f"Input parameter [search] mush be either 'Linear', 'Binary', 'Parallel' or 'Portfolio', was given '{search}'")
 
 
+    instrumentation.statistics(solver)
+    instrumentation.begin("readout")
+
     # compute time taken
     end_time = time.time()
-    if end_time >= timeout:
-        solving_time = timeout_duration    # solving_time has upper bound of timeout_duration if it timeouts
+    if end_time >= timeout or not complete:
+        solving_time = timeout_duration    # solving_time has upper bound of timeout_duration if it timeouts, or if a probe gave up
     else:
         solving_time = math.floor(end_time - encoding_time)
 
+    # the heuristic solution is returned if no better one is found
+    if incumbent is not None and (obj_value is None or incumbent[0] < obj_value):
+        instrumentation.source(incumbent[2])
+        return (incumbent[0], solving_time, incumbent[1])
+
     # if no model is found -> UNSAT if solved to optimality else UNKKNOWN
-    if model is None:
+    if model is None and solution is None:
         ans = "N/A" if solving_time == timeout_duration else "UNSAT"
         return (ans, solving_time, None)
 
+    if solution is not None:
+        R, T, A, Dists = solution
+    else:
+        R = VariableArray(r).read(model)
+        T = VariableArray(t).read(model)
+        A = VariableArray(a).read(model)
+        Dists = distances_readout.read(model)
+
     # reorder all variables w.r.t. the original permutation of load capacities, i.e. of couriers
     if symmetry_breaking:
-        a_copy = copy.deepcopy(a)
-        r_copy = copy.deepcopy(r)
-        for i in range(m):
-            a[permutation[i]] = a_copy[i]
-            r[permutation[i]] = r_copy[i]
+        R = unpermute(R, permutation)
+        A = unpermute(A, permutation)
 
     # check that all couriers travel hamiltonian cycles
-    R = evaluate(model, r)
-    assert(check_all_hamiltonian(R))
+    assert(hamiltonian(successors_from_arcs(R)).all())
 
-    T = evaluate(model, t)
-    A = evaluate(model, a)
-    
-    if display_solution:
-        Dists = evaluate(model, distances)
-        displayMCP(T, Dists, obj_value, A)
+    deliveries = routes_from_successors(successors_from_times(T, A))
 
-    deliveries = retrieve_routes(T, A)
+    if display_solution:
+        if symmetry_breaking:
+            Dists = unpermute(Dists, permutation)
+        displayMCP(deliveries, Dists.tolist(), obj_value)
 
     return (obj_value, solving_time, deliveries)
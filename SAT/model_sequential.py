@@ -2,16 +2,108 @@ import time
 
 from z3 import *
 
+from common import instrumentation
+from common.bounds import objective_bounds
+from common.tsp import solve_routes, make_pool
+from common.route_cache import RouteCache
+from common.readout import VariableArray, binary_to_int
+
 from .utils import *
 from .encodings_numbers import *
 from .encodings_obj_function import *
-from .hamiltonian import *
 from .display import *
 
 
-def multiple_couriers_planning_sequential(m, n, l, s, D, symmetry_breaking=True, implied_constraint=True, search='Binary', display_solution=True, timeout_duration=300):
-    """Model 2 in Z3 for the Multiple Couriers Planning problem, with the same constraints of Model 1 but using 2 solvers: one to find the
-       assignments and the other one to find the respective routes of each one, i.e. clearly separating the "cluster-first" and "order-second" phases
+def single_courier_tsp(items, D, timeout):
+    """SAT encoding and linear search of the route of a single courier, i.e. a TSP over {items} + Origin
+
+    Args:
+        items (list[int]): items (0-based) the courier must deliver
+        D (list[list[int]]): (n+1)x(n+1) matrix, with D[i][j] representing the distance from
+                             distribution point i to distribution point j
+        timeout (float): timestamp of the timeout
+
+    Returns:
+        (int, list[int], bool): the length of the best route found, the route (0-based items) and wether it is optimal,
+                                or None if no route was found before the timeout
+    """
+    k = len(items)
+    nodes = items + [len(D) - 1]     # local node k is the origin
+    D_local = [[D[u][v] for v in nodes] for u in nodes]
+
+    # r_jh = 1 indicates that the courier moves from local node j to local node h
+    r = [[Bool(f"r_{j}_{h}") for h in range(k+1)] for j in range(k+1)]
+    # t_jp = 1 indicates that local item j is delivered as p-th
+    t = [[Bool(f"deliver_{j}_as_{p}-th") for p in range(k)] for j in range(k)]
+
+    solver = Solver()
+
+    # every item is delivered exactly once
+    for j in range(k):
+        solver.add(exactly_one_seq(t[j], f"time_of_{j}"))
+
+    # diagonal is full of zeros, origin included since the courier delivers at least one item
+    solver.add(And([Not(r[j][j]) for j in range(k+1)]))
+    # every node is left and reached exactly once
+    for j in range(k+1):
+        solver.add(exactly_one_seq(r[j], f"leaves_{j}"))
+        solver.add(exactly_one_seq([r[h][j] for h in range(k+1)], f"reaches_{j}"))
+
+    # ordering between t_j and t_h in every edge travelled, to avoid loops not containing the origin
+    for j in range(k):
+        for h in range(k):
+            solver.add(Implies(r[j][h], successive(t[j], t[h])))
+        solver.add(Implies(r[k][j], t[j][0]))
+
+    # upper bound: leave every node with its longest edge
+    upper_bound = sum(max(row) for row in D_local)
+    flat_D_bin = [int_to_bin(e, num_bits(e) if e > 0 else 1) for e in flatten(D_local)]
+    distance = [Bool(f"dist_bin_{b}") for b in range(num_bits(upper_bound))]
+    solver.add(conditional_sum_K_bin(flatten(r), flat_D_bin, distance, "distance_def"))
+
+    model = None
+    optimal = False
+    distance_readout = VariableArray(distance)
+    solver.push()
+    now = time.time()
+    while now < timeout:
+        solver.set('timeout', millisecs_left(now, timeout))
+        result = instrumentation.check(solver)
+        if result != z3.sat:
+            optimal = (result == z3.unsat)
+            break
+
+        model = solver.model()
+        obj_value = int(binary_to_int(distance_readout.read(model)))
+
+        solver.pop()
+        solver.push()
+        upper_bound = obj_value - 1
+        if upper_bound < 0:
+            optimal = True
+            break
+        solver.add(AllLessEq_bin([distance], int_to_bin(upper_bound, num_bits(upper_bound) if upper_bound > 0 else 1)))
+        now = time.time()
+
+    if model is None:
+        return None
+
+    # follow the successors from the origin
+    successors = VariableArray(r).read(model).argmax(axis=1)
+    route = []
+    v = successors[k]
+    while v != k:
+        route.append(items[v])
+        v = successors[v]
+
+    return (obj_value, route, optimal)
+
+
+def multiple_couriers_planning_sequential(m, n, l, s, D, symmetry_breaking=True, implied_constraint=True, search='Linear', display_solution=True, timeout_duration=300, route_cache=None,
+                                          heuristic=True):
+    """Model 2 in Z3 for the Multiple Couriers Planning problem, with the same constraints of Model 1 but clearly separating the
+       "cluster-first" and "order-second" phases: one solver finds the assignments, then the routing of each courier is
+       solved as an independent TSP, concurrently on a process pool (exactly with Held-Karp for short routes)
 
     Args:
         m (int): number of couriers
@@ -25,25 +117,30 @@ def multiple_couriers_planning_sequential(m, n, l, s, D, symmetry_breaking=True,
         search (str, optional) ['Linear']: the search strategy to use in the Optimization phase of solving. This model supports only linear search (default='Linear')
         display_solution (bool, optional): wether or not to print the final solution obtained, with the path travelled by each courier (default=True)
         timeout_duration (int, optional): timeout in seconds (default=300)
+        route_cache (RouteCache, optional): cache of the routes of sets of items, possibly shared with other models and runs (default=None, i.e. a new one)
+        heuristic (bool, optional): wether or not to start from a heuristic solution as incumbent (default=True)
 
     """
     start_time = time.time()
 
+    # Bounds on objective function, computed before sorting the couriers so that the heuristic routes are in their original order
+    instrumentation.begin("bounds")
+    lower_bound, _, incumbent = objective_bounds(m, n, l, s, D, implied_constraint, heuristic, timeout=timeout_duration)
+    if incumbent is not None and incumbent[0] <= lower_bound:
+        # the heuristic solution is optimal
+        instrumentation.source(incumbent[2])
+        return (incumbent[0], 0, incumbent[1])
+    instrumentation.begin("encode")
+
+    if route_cache is None:
+        route_cache = RouteCache(D)
+
     ## VARIABLES
 
     # a for assignments
     a = [[Bool(f"a_{i}_{j}") for j in range(n)] for i in range(m)]
     # a_ij = 1 indicates that courier i delivers object j
 
-    # r for routes
-    r = [[[Bool(f"r_{i}_{j}_{k}") for k in range(n+1)] for j in range(n+1)] for i in range(m)]
-    # r_ijk = 1 indicates that courier i moves from delivery point j to delivery point k in his route
-    # n+1 delivery points because considering Origin point as well, representes as n+1-th row and column
-
-    # t for times
-    t = [[Bool(f"deliver_{j}_as_{k}-th") for k in range(n)] for j in range(n)]
-    # t_jk == 1 iff object j is delivered as k-th in its courier's route (intuition of time)
-
     courier_loads = [[Bool(f"cl_{i}_{k}") for k in range(num_bits(sum(s)))] for i in range(m)]
     # courier_loads_i = binary representation of actual load carried by each courier
 
@@ -59,28 +156,6 @@ def multiple_couriers_planning_sequential(m, n, l, s, D, symmetry_breaking=True,
     s_bin = [int_to_bin(s_j, num_bits(s_j)) for s_j in s]
     l_bin = [int_to_bin(l_i, num_bits(l_i)) for l_i in l]
 
-    # Bounds on objective function
-    # distances[i] := binary representation of the distance travelled by courier i
-    # Take as upper bound the greater n-(m-1) maximum distances, since that's the maximum items a single courier can be assigned to
-    max_distances = [max(D[i][:-1]) for i in range(n)]
-    max_distances.sort()
-    if implied_constraint:
-        upper_bound = sum(max_distances[m:]) + max(D[n]) + max(
-            [D[j][n] for j in range(n)])
-    else:
-        upper_bound = sum(max_distances[1:]) + max(D[n]) + max(
-            [D[j][n] for j in range(n)])
-    lower_bound = max([D[n][j] + D[j][n] for j in range(n)])
-
-
-    # flatten r and D
-    flat_r = [flatten(r[i]) for i in range(m)]
-    flat_D = flatten(D)
-    # convert flat_D to binary
-    flat_D_bin = [int_to_bin(e, num_bits(e) if e > 0 else 1) for e in flat_D]
-
-    distances = [[Bool(f"dist_bin_{i}_{k}") for k in range(num_bits(upper_bound))] for i in range(m)]
-
 
     def assignments_constraints():
         clauses = []
@@ -114,135 +189,71 @@ def multiple_couriers_planning_sequential(m, n, l, s, D, symmetry_breaking=True,
         return And(clauses)
 
 
-    def routes_constraints():
-        clauses = []
-
-        # Constraint 4: every object is delivered at some time in its courier's route, and only once
-        for i in range(n):
-            clauses.append(exactly_one_seq(t[i], f"time_of_{i}"))
-
-        # Constraint 5: routes
-        for i in range(m):
-            # Constraint 5.1: diagonal is full of zeros, i.e. can't leave from j to go to j
-            clauses.append(And([Not(r[i][j][j]) for j in range(n)]))
-            if implied_constraint:
-                clauses.append(Not(r[i][n][n]))     # don't let courier i have a self loop
-            # Constraint 5.2: row j has a 1 iff courier i delivers object j
-            # rows
-            for j in range(n):
-                clauses.append(Implies(a[i][j], exactly_one_seq(r[i][j], f"courier_{i}_leaves_{j}")))  # If a_ij then exactly_one(r_ij)
-                clauses.append(Implies(Not(a[i][j]), all_false(r[i][j])))   # else all_false(r_ij)
-            clauses.append(exactly_one_seq(r[i][n], f"courier_{i}_leaves_origin"))    # exactly_one in origin point row === courier i leaves from origin
-
-            # Constraint 5.3: column j has a 1 iff courier i delivers object j
-            # columns
-            for k in range(n):
-                clauses.append(Implies(a[i][k], exactly_one_seq([r[i][j][k] for j in range(n+1)], f"courier_{i}_reaches_{k}")))  # If a_ij then exactly_one(r_i,:,k)
-                clauses.append(Implies(Not(a[i][k]), all_false([r[i][j][k] for j in range(n+1)])))   # else all_false(r_i,:,k)
-            clauses.append(exactly_one_seq([r[i][j][n] for j in range(n+1)], f"courier_{i}_returns_to_origin"))         # exactly_one in origin point column === courier i returns to origin
-
-            # Constraint 5.4: use ordering between t_j and t_k in every edge travelled
-            # in order to avoid loops not containing the origin
-            for j in range(n):
-                for k in range(n):
-                    clauses.append(Implies(r[i][j][k], successive(t[j], t[k])))
-                clauses.append(Implies(r[i][n][j], t[j][0]))
-
-        # definition of distances using constraints
-        for i in range(m):
-            clauses.append(conditional_sum_K_bin(flat_r[i], flat_D_bin, distances[i], f"distances_def_{i}"))
-
-        return And(clauses)
-
-
 
     ## OPTIMIZATION SEARCH
 
-    model_assignments = None
-    model_routes = None
+    routes = None
     obj_value = None
-    exit_flag = False
-
-
+    if incumbent is not None:
+        # only the assignments improving the heuristic solution are routed
+        obj_value = incumbent[0]
+        routes = [[j-1 for j in incumbent[1][permutation[i] if symmetry_breaking else i]] for i in range(m)]
 
     solver_assignments = Solver()
-    solver_routes = Solver()
-
-    sub_constraints = assignments_constraints()
-    solver_assignments.add(sub_constraints)
-    solver_routes.add(sub_constraints)
-
-    master_constraints = routes_constraints()
-    solver_routes.add(master_constraints)
+    solver_assignments.add(assignments_constraints())
 
     encoding_time = time.time()
+    instrumentation.count("assertions", len(solver_assignments.assertions()))
+    instrumentation.begin("solve")
     timeout = encoding_time + timeout_duration
     # print(f"Encoding finished at time {round(encoding_time - start_time, 1)}s, now start solving/optimization search")
 
 
     if search == 'Linear':
 
-        solver_routes.push()
-
-        upper_bound_bin = int_to_bin(upper_bound, num_bits(upper_bound))
-        upper_bound_constraint = AllLessEq_bin(distances, upper_bound_bin)
+        pool = make_pool(m)
+        assignments_readout = VariableArray(a)
 
         solver_assignments.set('timeout', millisecs_left(time.time(), timeout))
-        while solver_assignments.check() == z3.sat and not exit_flag:
+        while instrumentation.check(solver_assignments) == z3.sat:
             # print(f"Found a valid A after {round(time.time() - encoding_time, 1)}s")
 
             model_assignments = solver_assignments.model()
-
-            solver_routes.push()
-            # impose the found assignments on the master problem
-            for i in range(m):
-                for j in range(n):
-                    solver_routes.add(a[i][j] == model_assignments.evaluate(a[i][j]))
-
-            solver_routes.push()
-            solver_routes.add(upper_bound_constraint)
-
-            now = time.time()
-            if now >= timeout:
-                break
-            solver_routes.set('timeout', millisecs_left(now, timeout))
-            while solver_routes.check() == z3.sat:
-
-                model_routes = solver_routes.model()
-
-                obj_value = obj_function(model_routes, distances)
-                # print(f"This model obtained objective value: {obj_value} after {round(time.time() - encoding_time, 1)}s")
-
-                if obj_value <= lower_bound:
-                    exit_flag = True
+            A = assignments_readout.read(model_assignments).tolist()
+            item_sets = [[j for j in range(n) if A[i][j]] for i in range(m)]
+
+            # solve the routing of each courier independently, unless the cached bounds already show that
+            # this assignment can't improve the incumbent
+            if obj_value is None or all(route_cache.lower_bound(items) < obj_value for items in item_sets):
+                courier_routes = solve_routes(item_sets, D, single_courier_tsp, timeout, route_cache, pool)
+                if courier_routes is None:
                     break
 
-                upper_bound = obj_value - 1
-                upper_bound_bin = int_to_bin(upper_bound, num_bits(upper_bound))
-                upper_bound_constraint = AllLessEq_bin(distances, upper_bound_bin)
-
-                solver_routes.pop()
-                solver_routes.push()
-
-                solver_routes.add(upper_bound_constraint)
+                assignment_value = max(length for length, _, _ in courier_routes)
+                if obj_value is None or assignment_value < obj_value:
+                    obj_value = assignment_value
+                    instrumentation.incumbent(obj_value)
+                    routes = [route for _, route, _ in courier_routes]
+                    # print(f"This model obtained objective value: {obj_value} after {round(time.time() - encoding_time, 1)}s")
 
-                now = time.time()
-                if now >= timeout:
-                    exit_flag = True
-                    break
-                solver_routes.set('timeout', millisecs_left(now, timeout))
+                    if obj_value <= lower_bound:
+                        break
 
-            solver_routes.pop()     # remove the latest found upper-bound constraint frame
-            solver_routes.pop()     # remove the assignments constraint frame
+            # no courier can carry a superset of a set of items whose route can't be shorter than the incumbent
+            for items in item_sets:
+                if items and route_cache.lower_bound(items) >= obj_value:
+                    solver_assignments.add(And([Or([Not(a[i][j]) for j in items]) for i in range(m)]))
 
             # force at least one difference in the assignments matrix 'a' w.r.t the last matrix of assignments found
-            solver_assignments.add(Or([Not(a[i][j]) if model_assignments.evaluate(a[i][j]) else a[i][j] for i in range(m) for j in range(n)]))
+            solver_assignments.add(Or([Not(a[i][j]) if A[i][j] else a[i][j] for i in range(m) for j in range(n)]))
 
             now = time.time()
             if now >= timeout:
                 break
             solver_assignments.set('timeout', millisecs_left(now, timeout))
 
+        pool.shutdown(wait=False, cancel_futures=True)
+
     elif search == 'Binary':
         raise ValueError(f'Binary search is not supported for sequential model, but parameter was set search={search}')
 
@@ -250,6 +261,9 @@ def multiple_couriers_planning_sequential(m, n, l, s, D, symmetry_breaking=True,
         raise ValueError(f"Input parameter [search] mush be either 'Linear' or 'Binary', was given '{search}'")
 
 
+    instrumentation.statistics(solver_assignments)
+    instrumentation.begin("readout")
+
     # compute time taken
     end_time = time.time()
     if end_time >= timeout:
@@ -258,29 +272,27 @@ def multiple_couriers_planning_sequential(m, n, l, s, D, symmetry_breaking=True,
         solving_time = math.floor(end_time - encoding_time)
 
     # if no model is found -> UNSAT if solved to optimality else UNKKNOWN
-    if model_routes is None:
+    if routes is None:
         ans = "N/A" if solving_time == timeout_duration else "UNSAT"
         return (ans, solving_time, None)
 
-    # reorder all variables w.r.t. the original permutation of load capacities, i.e. of couriers
+    if incumbent is not None and obj_value == incumbent[0]:
+        # no assignment improved the incumbent the routes were seeded with
+        instrumentation.source(incumbent[2])
+
+    # reorder the routes w.r.t. the original permutation of load capacities, i.e. of couriers
     if symmetry_breaking:
-        a_copy = copy.deepcopy(a)
-        r_copy = copy.deepcopy(r)
+        routes_copy = routes
+        routes = [None] * m
         for i in range(m):
-            a[permutation[i]] = a_copy[i]
-            r[permutation[i]] = r_copy[i]
-
-    # check that all couriers travel hamiltonian cycles
-    R = evaluate(model_routes, r)
-    assert(check_all_hamiltonian(R))
+            routes[permutation[i]] = routes_copy[i]
 
-    T = evaluate(model_routes, t)
-    A = evaluate(model_routes, a)
+    deliveries = [[j+1 for j in route] for route in routes]
 
     if display_solution:
-        Dists = evaluate(model_routes, distances)
-        displayMCP(T, Dists, obj_value, A)
-
-    deliveries = retrieve_routes(T, A)
+        print(f"-----------Objective value: {obj_value}-----------")
+        print(f"------------------Routes-----------------")
+        for route in deliveries:
+            print("Origin --> " + ' --> '.join([str(node) for node in route]) + ' --> Origin')
 
-    return (obj_value, solving_time, deliveries)
\ No newline at end of file
+    return (obj_value, solving_time, deliveries)
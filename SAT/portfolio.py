@@ -0,0 +1,203 @@
+import os
+import time
+import queue
+import multiprocessing
+
+from z3 import *
+
+from .utils import *
+from .encodings_obj_function import *
+
+from common import instrumentation
+
+
+# learnt clauses longer than this are not shared, 0 to share nothing but the bounds
+MAX_CLAUSE_LENGTH = int(os.environ.get("MCP_SHARE_MAX_LENGTH", 8))
+
+# most learnt clauses shared by a worker at each exchange, the shortest first
+MAX_SHARED_CLAUSES = 2000
+
+# seconds of search of a worker between two exchanges of clauses and bounds
+SHARE_INTERVAL = 1
+
+# search strategies of the workers, assigned round robin
+WORKER_STRATEGIES = ['Linear', 'Binary']
+
+
+def _symbol(variable):
+    """Returns the name of a z3 variable as given when creating it: an int for the auxiliary variables named by id"""
+    ctx = variable.ctx_ref()
+    symbol = Z3_get_decl_name(ctx, variable.decl().ast)
+    if Z3_get_symbol_kind(ctx, symbol) == Z3_INT_SYMBOL:
+        return Z3_get_symbol_int(ctx, symbol)
+    return Z3_get_symbol_string(ctx, symbol)
+
+def export_clause(clause):
+    """Returns a clause as a picklable list of (name, polarity), or None if it contains literals which are not variables,
+    e.g. the subformulas of the encoding the solver introduced as literals
+
+    Args:
+        clause (list[BoolRef]): the literals of the clause
+
+    Returns:
+        list[(int or str, bool)]: the variables and their polarity
+    """
+    literals = []
+    for literal in clause:
+        positive = not is_not(literal)
+        variable = literal if positive else literal.arg(0)
+        if not is_const(variable) or variable.decl().kind() != Z3_OP_UNINTERPRETED:
+            return None
+        literals.append((_symbol(variable), positive))
+    return literals
+
+def import_clause(literals):
+    """Returns the z3 clause of a clause exported by export_clause
+
+    Args:
+        literals (list[(int or str, bool)]): the variables and their polarity
+
+    Returns:
+        Z3-Expression: the clause
+    """
+    return Or([Bool(name) if positive else Not(Bool(name)) for name, positive in literals])
+
+
+def _worker(index, solver, distances, read, lower_bound, upper_bound, timeout, max_clause_length, inbox, outbox):
+    """Searches solutions with objective value in [lower_bound, upper_bound] in a forked copy of solver, sending to
+    the portfolio its solutions, bounds and short learnt clauses, and adding the ones of the other workers
+
+    The bounds on the objective are only ever assumed, through the literal obj_le_k implying objective <= k, so
+    every clause learnt is implied by the encoding alone (and by the definitions of obj_le_k, the same in all the
+    workers) and can be added to the solver of any other worker
+    """
+    strategy = WORKER_STRATEGIES[index % len(WORKER_STRATEGIES)]
+    solver.set('random_seed', index)
+    learnt = []
+
+    def on_clause(proof, clause):
+        # rup: clause learnt from a conflict
+        if is_app(proof) and proof.decl().name() == "rup" and len(clause) <= max_clause_length:
+            literals = export_clause(clause)
+            if literals is not None:
+                learnt.append(literals)
+
+    if max_clause_length > 0:
+        handler = OnClause(solver, on_clause)
+
+    at_most = {}
+    def objective_at_most(bound):
+        if bound not in at_most:
+            at_most[bound] = Bool(f"obj_le_{bound}")
+            solver.add(Implies(at_most[bound], AllLessEq_bin(distances, int_to_bin(bound, num_bits(bound)))))
+        return at_most[bound]
+
+    best = upper_bound + 1     # the solutions sought are better than best
+    while lower_bound < best:
+        now = time.time()
+        if now >= timeout:
+            break
+        bound = best - 1 if strategy == 'Linear' else (lower_bound + best - 1) // 2
+        solver.set('timeout', min(SHARE_INTERVAL * 1000, millisecs_left(now, timeout)))
+        result = solver.check(objective_at_most(bound))
+
+        if result == sat:
+            value, solution = read(solver.model())
+            best = value
+            outbox.put(("sat", index, value, solution))
+        elif result == unsat:
+            lower_bound = bound + 1
+            outbox.put(("unsat", index, bound))
+
+        if learnt:
+            learnt.sort(key=len)
+            outbox.put(("clauses", index, learnt[:MAX_SHARED_CLAUSES]))
+            learnt.clear()
+
+        while True:
+            try:
+                message = inbox.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "sat":
+                best = min(best, message[1])
+            elif message[0] == "unsat":
+                lower_bound = max(lower_bound, message[1] + 1)
+            else:
+                for literals in message[1]:
+                    solver.add(import_clause(literals))
+
+
+def cooperative_search(solver, distances, read, lower_bound, upper_bound, timeout, workers=None, max_clause_length=MAX_CLAUSE_LENGTH):
+    """Cooperative portfolio search of the optimal objective value: workers forked copies of solver search it with
+    different strategies (linear or binary search) and random seeds, exchanging their solutions, the bounds they prove
+    and the learnt clauses of at most max_clause_length literals every SHARE_INTERVAL seconds. The workers share the
+    variables of the encoding, since they are forked after it
+
+    Args:
+        solver (Solver): solver with the encoding of the problem
+        distances (list[list[Bool]]): binary representation of the distance travelled by each courier
+        read (function): function of a model returning (objective value, solution), the solution being picklable
+        lower_bound (int): lower bound on the objective
+        upper_bound (int): upper bound on the objective
+        timeout (float): timestamp of the timeout
+        workers (int, optional): number of workers (default=None, i.e. the number of CPUs, and at least 2)
+        max_clause_length (int, optional): longest learnt clauses shared, 0 to share only the bounds (default=MAX_CLAUSE_LENGTH)
+
+    Returns:
+        (int, object, bool): the best objective value found and its solution (None, None if none is found), and wether
+                             the search completed, i.e. the objective value is optimal or there is no solution
+    """
+    k = workers or max(os.cpu_count(), 2)
+    context = multiprocessing.get_context("fork")
+    outbox = context.Queue()
+    inboxes = [context.Queue() for _ in range(k)]
+    processes = [context.Process(target=_worker, args=(i, solver, distances, read, lower_bound, upper_bound, timeout,
+                                                       max_clause_length, inboxes[i], outbox))
+                 for i in range(k)]
+    best_value, best_solution = None, None
+    shared = 0
+
+    def broadcast(sender, message):
+        for i in range(k):
+            if i != sender:
+                inboxes[i].put(message)
+
+    try:
+        for process in processes:
+            process.start()
+
+        while lower_bound <= upper_bound:
+            try:
+                message = outbox.get(timeout=min(max(timeout - time.time(), 0), SHARE_INTERVAL))
+            except queue.Empty:
+                # the workers stop at the timeout, after sending all their messages
+                if time.time() >= timeout or not any(process.is_alive() for process in processes):
+                    break
+                continue
+
+            if message[0] == "sat":
+                _, sender, value, solution = message
+                if best_value is None or value < best_value:
+                    best_value, best_solution = value, solution
+                    instrumentation.incumbent(value)
+                upper_bound = min(upper_bound, value - 1)
+                broadcast(sender, ("sat", value))
+            elif message[0] == "unsat":
+                _, sender, bound = message
+                lower_bound = max(lower_bound, bound + 1)
+                broadcast(sender, ("unsat", bound))
+            else:
+                _, sender, clauses = message
+                shared += len(clauses)
+                broadcast(sender, ("clauses", clauses))
+    finally:
+        for process in processes:
+            process.kill()
+            process.join()
+        for q in inboxes + [outbox]:
+            q.cancel_join_thread()
+            q.close()
+
+    instrumentation.count("shared_clauses", shared)
+    return (best_value, best_solution, lower_bound > upper_bound)
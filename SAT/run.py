@@ -1,3 +1,12 @@
+import os
+import tempfile
+
+from common import instrumentation
+from common.sandbox import run_model
+from common.instance import read_instance
+from common.route_cache import RouteCache
+from common.config import model_parameters, z3_parameters
+
 from .testing import *
 from .model import *
 from .model_sequential import *
@@ -11,19 +20,92 @@ models = [("base", multiple_couriers_planning),
           ("sequential_no_sym_break", multiple_couriers_planning_sequential),
           ("sequential_no_implied", multiple_couriers_planning_sequential)]
 
-def run_sat(instance_file):
+def select_models(model_names=None):
+    """Returns the (name, function) of the models to run: all the listed ones, or the given names. Names of variants not
+    listed above (e.g. "base_tree_swc") are run with the model their name refers to, configured by the name
+
+    Args:
+        model_names (list[str], optional): names of the models (default=None, i.e. all the listed models)
+    """
+    if model_names is None:
+        return models
+    listed = dict(models)
+    return [(name, listed.get(name, multiple_couriers_planning_sequential if "sequential" in name else multiple_couriers_planning))
+            for name in model_names]
+
+def run_sat(instance_file, model_names=None, seed=None, timeout=300, sandbox=True, on_result=None):
+    """Runs the models on the given instance
+
+    Args:
+        instance_file (str): path of the .dat file representing the instance
+        model_names (list[str], optional): names of the models to run (default=None, i.e. all of them)
+        seed (int, optional): random seed of the solver (default=None, i.e. z3's default)
+        timeout (int, optional): timeout of each model in seconds (default=300)
+        sandbox (bool, optional): wether or not to run each model in a sandboxed child process, killed if it
+                                  overruns its timeout or runs out of memory (default=True)
+        on_result (function, optional): function of (model name, result entry) called as soon as each model finishes,
+                                        e.g. to store its result before the next one runs (default=None)
+    """
     dictionary = {}
 
-    for model_name, model in models:
+    if seed is not None:
+        set_param("sat.random_seed", seed)
+        set_param("smt.random_seed", seed)
+
+    # routes of sets of items are shared between the sequential models, and between runs if MCP_ROUTE_CACHE is set.
+    # Sandboxed models run in their own processes, so they share them through a (temporary) file
+    D = read_instance(instance_file)[4]
+    route_cache_path = os.environ.get("MCP_ROUTE_CACHE")
+    route_cache_file = None
+    if sandbox and route_cache_path is None:
+        route_cache_file = tempfile.NamedTemporaryFile(suffix=".sqlite")
+        route_cache_path = route_cache_file.name
+    shared_route_cache = None if sandbox else RouteCache(D, path=route_cache_path)
+
+    for model_name, model in select_models(model_names):
         sym_break = False if "no_sym_break" in model_name else True
         search_strategy = 'Linear' if ('sequential' in model_name  or 'linear' in model_name) else 'Binary'
+        # k-ary search over the objective with a solver per CPU, e.g. "base_parallel"
+        if "parallel" in model_name and "sequential" not in model_name:
+            search_strategy = 'Parallel'
+        # workers exchanging bounds and learnt clauses, e.g. "base_portfolio"
+        if "portfolio" in model_name and "sequential" not in model_name:
+            search_strategy = 'Portfolio'
         implied_constr = False if "no_implied" in model_name else True
-        obj_value, solving_time, routes = run_model_on_instance(model, instance_file, search=search_strategy, symmetry_breaking=sym_break, implied_constraint=implied_constr, display_solution=False)
+        kwargs = {"search": search_strategy}
+        # alternative encodings of the base model, e.g. "base_tree" or "base_tree_swc"
+        if "tree" in model_name:
+            kwargs["sum_encoding"] = 'tree'
+        if "swc" in model_name:
+            kwargs["capacity_encoding"] = 'swc'
+        # parameters of the configuration profile (see tune.py), overriding the ones given by the name
+        parameters, solver_parameters = model_parameters("SAT", model_name)
+        kwargs.update(parameters)
+
+        def run():
+            if "sequential" in model_name:
+                kwargs["route_cache"] = shared_route_cache if shared_route_cache is not None else RouteCache(D, path=route_cache_path)
+            # global z3 parameters, reset after the model
+            with z3_parameters(solver_parameters), instrumentation.recording() as recorder:
+                obj_value, solving_time, routes = run_model_on_instance(model, instance_file, symmetry_breaking=sym_break, implied_constraint=implied_constr, display_solution=False, timeout_duration=timeout, **kwargs)
+
+            # the parallel searches also stop early, without proving their result, if a probe gives up
+            optimal = solving_time < timeout and recorder.counts.get("search_complete", True)
+            entry = {"time": solving_time if optimal else timeout, "optimal": optimal, "obj": obj_value, "sol": [] if routes is None else routes,
+                     "stats": recorder.to_dict()}
+            # the heuristic or known solution returned in place of one of the model
+            if recorder.source is not None:
+                entry["source"] = recorder.source
+            return entry
 
-        model_dict = {"time": solving_time, "optimal": (solving_time < 300), "obj": obj_value, "sol": [] if routes is None else routes}
+        model_dict = run_model(run, timeout, sandbox)
 
         dictionary[model_name] = model_dict
+        if on_result is not None:
+            on_result(model_name, dictionary[model_name])
         print(f"Finished running model {model_name}")
 
+    if route_cache_file is not None:
+        route_cache_file.close()
 
-    return dictionary
\ No newline at end of file
+    return dictionary
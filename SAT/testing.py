@@ -1,8 +1,10 @@
 import os
 import sys
-import numpy as np
 import time
 
+from common import instrumentation
+from common.instance import read_instance
+
 def run_model_on_instance(MCP_model, file, **kwargs):
     """Read the instance from .dat file and run the given MCP model on it
 
@@ -10,12 +12,8 @@ def run_model_on_instance(MCP_model, file, **kwargs):
         MCP_model (function): function executing the SAT-encoding and solving of the given instance
         file (str): path of the .dat file representing the instance
     """
-    with open(file) as f:
-        m = int(next(f))
-        n = int(next(f))
-        l = [int(e) for e in next(f).split()]
-        s = [int(e) for e in next(f).split()]
-        D = np.genfromtxt(f, dtype=int).tolist()
+    instrumentation.begin("parse")
+    m, n, l, s, D = read_instance(file)
 
     return MCP_model(m, n, l, s, D, **kwargs)
 
@@ -1,6 +1,14 @@
+import os
 import math
+import itertools
 from z3 import *
 
+# Auxiliary variables of the encodings are named by integer ids (Z3 integer symbols) rather than by strings, which saves
+# formatting and storing a name for each of the millions of variables of the large instances.
+# Set MCP_READABLE_NAMES=1 to name them after the constraint they belong to instead, e.g. to debug an encoding
+READABLE_NAMES = os.environ.get("MCP_READABLE_NAMES") == "1"
+_aux_ids = itertools.count()
+
 def millisecs_left(t, timeout):
     """returns the amount of milliseconds left from t to timeout
 
@@ -9,9 +17,25 @@ def millisecs_left(t, timeout):
         timeout (int): timestamp of the timeout
 
     Returns:
-        int: the milliseconds left
+        int: the milliseconds left, rounded up so that a solver timing out stops at or after timeout
+    """
+    return math.ceil((timeout - t) * 1000)
+
+def aux_bools(name, *shape):
+    """Returns new auxiliary Z3 Bool variables, never shared with other constraints
+
+    Args:
+        name (str): name of the variables, only used if READABLE_NAMES (followed by their indices)
+        shape (int): the dimensions, e.g. aux_bools(name, n) for a list and aux_bools(name, n, k) for a n x k matrix
+
+    Returns:
+        list[Bool]: the variables, in nested lists of the given shape
     """
-    return int((timeout - t) * 1000)
+    if len(shape) == 1:
+        if READABLE_NAMES:
+            return [Bool(f"{name}_{k}") for k in range(shape[0])]
+        return [Bool(next(_aux_ids)) for k in range(shape[0])]
+    return [aux_bools(f"{name}_{j}", *shape[1:]) for j in range(shape[0])]
 
 def flatten(matrix):
     """flattens a 2D list into a 1D list
@@ -65,43 +89,25 @@ def bin_to_int(x):
     return x
 
 
-## evaluate model variables
+## encoding size
 
-def evaluate(model, bools):
-    """Evaluate every element of bools using model recursively
+def encoding_size(solver):
+    """Returns the size of the CNF actually given to the SAT solver for the assertions of solver, after the
+    Tseitin transformation of the non-clausal constraints
 
     Args:
-        model (ModelRef): the model to evaluate on
-        bools (n-dim list[Bool]): the bools to evaluate, can be of arbitrary dimension
+        solver (Solver): the solver holding the encoding
 
     Returns:
-        n-dim list[int]: object of the same dimensions of bools, with a 1 in the corresponding position of 
-                         the bools that evaluated to true w.r.t. model
+        (int, int): number of variables and number of clauses of the CNF
     """
-    if not isinstance(bools[0], list):
-        return [1 if model.evaluate(b) else 0 for b in bools]
-    return [evaluate(model, b) for b in bools]
-
-def retrieve_routes(orders, assignments):
-    """Returns for each courier, the list of items that he must deliver, in order of delivery
+    goal = Goal()
+    goal.add(solver.assertions())
+    cnf = Then('simplify', 'tseitin-cnf')(goal)[0]
+    variables = set()
+    for clause in cnf:
+        literals = clause.children() if is_or(clause) else [clause]
+        for literal in literals:
+            variables.add((literal.children()[0] if is_not(literal) else literal).get_id())
+    return (len(variables), len(cnf))
 
-    Args:
-        orders (list[list[bool]]): matrix representing the order of delivery of each object 
-                                   in its route, namely orders[j][k] == True iff object j is delivered as k-th by its courier 
-        assignments (list[list[bool]]): matrix of assignments, assignments[i][j] = True iff courier i delivers
-                                        object j, false otherwise.
-    """
-    m = len(assignments)
-    n = len(assignments[0])
-    routes = [[0 for j in range(n)] for i in range(m)]
-    for node in range(n):
-        for time in range(n):
-            if orders[node][time]:
-                for courier in range(m):
-                    if assignments[courier][node]:
-                        routes[courier][time] = node+1
-                        break
-                break
-
-    routes = [[x for x in row if x != 0] for row in routes] # remove trailing zeros
-    return routes
\ No newline at end of file
@@ -1,16 +1,35 @@
 from z3 import *
+import os
 import time
 
+from common import instrumentation
+from common.bounds import objective_bounds
+from common.encoding_cache import encoding_key, load_encoding, store_encoding
+from common.preprocessing import infeasible_assignments, infeasible_arcs
+from common.readout import VariableArray
+from common.routes import unpermute, successors_from_positions, routes_from_successors
+
 from .utils import *
 
+# source files defining the encoding, any change to them invalidates the cached encodings
+ENCODING_SOURCES = [os.path.join(os.path.dirname(os.path.realpath(__file__)), f) for f in ["model.py", "utils.py", "../common/preprocessing.py"]]
+
 #------------------------------------------------------------------------------
 # Model
 #------------------------------------------------------------------------------
 
-def SMT(m, n, l, s, D, symmetry_breaking=True, implied_constraint=True, timeout_duration=300):
+def SMT(m, n, l, s, D, symmetry_breaking=True, implied_constraint=True, timeout_duration=300, use_cache=True, heuristic=True):
     COURIERS = range(m)
     ITEMS = range(n)
 
+    # bounds on the objective, computed before sorting the couriers so that the heuristic routes are in their original order
+    instrumentation.begin("bounds")
+    lower_bound, upper_bound, incumbent = objective_bounds(m, n, l, s, D, implied_constraint, heuristic, timeout=timeout_duration)
+    if incumbent is not None and incumbent[0] <= lower_bound:
+        # the heuristic solution is optimal
+        instrumentation.source(incumbent[2])
+        return (incumbent[0], 0, incumbent[1])
+
     if symmetry_breaking:
         # sort the list of loads, keeping the permutation used for later
         L = [(l[i], i) for i in range(m)]
@@ -23,93 +42,110 @@ def SMT(m, n, l, s, D, symmetry_breaking=True, implied_constraint=True, timeout_
     # Variables
     #------------------------------------------------------------------------------
 
-    A = [ [ Bool("a_%s_%s" % (i+1, j+1)) for j in ITEMS ]
+    # Preprocessing: pairs courier-item that can't be part of any solution are never allocated,
+    # arcs that can't be part of any route shorter than upper_bound are forbidden
+    impossible_A = infeasible_assignments(l, s)
+    impossible_arcs = infeasible_arcs(D, upper_bound)
+
+    A = [ [ BoolVal(False) if impossible_A[i][j] else Bool("a_%s_%s" % (i+1, j+1)) for j in ITEMS ]
         for i in COURIERS ]
 
-    O = [ [ Int("o_%s_%s" % (i+1, j+1)) for j in ITEMS ]
+    O = [ [ IntVal(0) if impossible_A[i][j] else Int("o_%s_%s" % (i+1, j+1)) for j in ITEMS ]
         for i in COURIERS ]
 
     dist = [ Int("dist_%s" % (i+1)) for i in COURIERS ]
 
     solver = Solver()
     start_time = time.time()
+    instrumentation.begin("encode")
 
-    #------------------------------------------------------------------------------
-    # Constraints
-    #------------------------------------------------------------------------------
-
-    # Constraints to create the effective loads array
-    loads = [ Int("loads_%s" % (i+1)) for i in COURIERS ]
-    for i in COURIERS:
-        solver.add(loads[i] == Sum([If(A[i][j], s[j], 0) for j in ITEMS]))
+    obj = Int('obj')
 
-    if symmetry_breaking:
-        solver.add(And([loads[i] >= loads[i+1] for i in range(m-1)]))
-        for i in range(m-1):
-            solver.add(Implies(loads[i] == loads[i+1], precedes(A[i], A[i+1])))
-
-    # Contraint to count the items carried by each courier
-    counts = [ Int("counts_%s" % (i+1)) for i in COURIERS ]
-    for i in COURIERS:
-        solver.add(counts[i] == Sum([If(A[i][j], 1, 0) for j in ITEMS]))
-
-    # Constraints to create assignments matrix A
-    for i in COURIERS:
-        if implied_constraint:
-            solver.add(And(Or(A[i]), PbLe([(A[i][j], s[j]) for j in ITEMS], l[i])))
-        else:
-            solver.add(PbLe([(A[i][j], s[j]) for j in ITEMS], l[i]))
-    for j in ITEMS:
-        solver.add(Sum([A[i][j] for i in COURIERS]) == 1)
-
-    # Constraints to create route orders matrix O
-    for i in COURIERS:
+    def encode():
+        #------------------------------------------------------------------------------
+        # Constraints
+        #------------------------------------------------------------------------------
+
+        # Constraints to create the effective loads array
+        loads = [ Int("loads_%s" % (i+1)) for i in COURIERS ]
+        for i in COURIERS:
+            solver.add(loads[i] == Sum([If(A[i][j], s[j], 0) for j in ITEMS]))
+
+        if symmetry_breaking:
+            solver.add(And([loads[i] >= loads[i+1] for i in range(m-1)]))
+            for i in range(m-1):
+                solver.add(Implies(loads[i] == loads[i+1], precedes(A[i], A[i+1])))
+
+        # Contraint to count the items carried by each courier
+        counts = [ Int("counts_%s" % (i+1)) for i in COURIERS ]
+        for i in COURIERS:
+            solver.add(counts[i] == Sum([If(A[i][j], 1, 0) for j in ITEMS]))
+
+        # Constraints to create assignments matrix A
+        for i in COURIERS:
+            if implied_constraint:
+                solver.add(And(Or(A[i]), PbLe([(A[i][j], s[j]) for j in ITEMS], l[i])))
+            else:
+                solver.add(PbLe([(A[i][j], s[j]) for j in ITEMS], l[i]))
         for j in ITEMS:
-            solver.add(If(Not(A[i][j]), O[i][j] == 0, O[i][j] > 0))
-    for i in COURIERS:
-        order_items = [If(O[i][j] != 0, O[i][j], 0) for j in ITEMS]
-        non_zero_items = [If(order_items[j] != 0, order_items[j], -j) for j in ITEMS]
-        solver.add(Distinct(non_zero_items))
-        solver.add(And([order_items[j] <= counts[i] for j in ITEMS]))
-
-    # Constraint to create dist
-    for i in COURIERS:
-        order_items = [O[i][j] for j in ITEMS]
-        dist_expr = Sum([
-            Sum([
-                If(And(order_items[j1] != 0, order_items[j2] - order_items[j1] == 1), D[j1][j2], 0)
-                for j2 in ITEMS
+            solver.add(Sum([A[i][j] for i in COURIERS]) == 1)
+
+        # Constraints to create route orders matrix O
+        for i in COURIERS:
+            for j in ITEMS:
+                solver.add(If(Not(A[i][j]), O[i][j] == 0, O[i][j] > 0))
+        for i in COURIERS:
+            order_items = [If(O[i][j] != 0, O[i][j], 0) for j in ITEMS]
+            non_zero_items = [If(order_items[j] != 0, order_items[j], -j) for j in ITEMS]
+            solver.add(Distinct(non_zero_items))
+            solver.add(And([order_items[j] <= counts[i] for j in ITEMS]))
+
+        # Constraint to create dist
+        for i in COURIERS:
+            order_items = [O[i][j] for j in ITEMS]
+            dist_expr = Sum([
+                Sum([
+                    If(And(order_items[j1] != 0, order_items[j2] - order_items[j1] == 1), D[j1][j2], 0)
+                    for j2 in ITEMS if not impossible_arcs[j1][j2]
+                ])
+                for j1 in ITEMS
             ])
-            for j1 in ITEMS
-        ])
-        dist_expr += Sum([If(order_items[j0] == 1, D[n][j0], 0) for j0 in ITEMS])
-        dist_expr += Sum([If(order_items[jn] == counts[i], D[jn][n], 0) for jn in ITEMS])
-        solver.add(dist[i] == dist_expr)
-
-    #------------------------------------------------------------------------------
-    # Objective
-    #------------------------------------------------------------------------------
-
-    obj = Int('obj')
-    solver.add(obj == maximum([dist[i] for i in COURIERS]))
+            dist_expr += Sum([If(order_items[j0] == 1, D[n][j0], 0) for j0 in ITEMS])
+            dist_expr += Sum([If(order_items[jn] == counts[i], D[jn][n], 0) for jn in ITEMS])
+            solver.add(dist[i] == dist_expr)
+            for j1 in ITEMS:
+                for j2 in ITEMS:
+                    if impossible_arcs[j1][j2] and not (impossible_A[i][j1] or impossible_A[i][j2]):
+                        solver.add(Implies(order_items[j1] != 0, order_items[j2] - order_items[j1] != 1))
+            for j in ITEMS:
+                if impossible_arcs[n][j] or impossible_arcs[j][n]:
+                    solver.add(order_items[j] == 0)
+
+        #------------------------------------------------------------------------------
+        # Objective
+        #------------------------------------------------------------------------------
+
+        solver.add(obj == maximum([dist[i] for i in COURIERS]))
+
+        solver.add(obj >= lower_bound)
+        solver.add(obj <= upper_bound)
+
+    # the encoding only depends on the instance and on the constraints used, so it is shared between runs
+    cache_key = encoding_key("SMT.model", ENCODING_SOURCES, m, n, l, s, D, symmetry_breaking, implied_constraint, lower_bound, upper_bound)
+    cached = use_cache and load_encoding(solver, cache_key)
+    if not cached:
+        encode()
+        if use_cache:
+            store_encoding(solver, cache_key)
+    instrumentation.count("cached_encoding", cached)
 
     #------------------------------------------------------------------------------
     # Search Strategy
     #------------------------------------------------------------------------------
 
-    lower_bound = max([D[n][j] + D[j][n] for j in ITEMS])
-    
-    max_distances = [max(D[i][:-1]) for i in range(n)]
-    max_distances.sort()
-    if implied_constraint:
-        upper_bound = sum(max_distances[m:]) + max(D[n]) + max([D[j][n] for j in range(n)])
-    else:
-        upper_bound = sum(max_distances[1:]) + max(D[n]) + max([D[j][n] for j in range(n)])
-
-    solver.add(obj >= lower_bound)
-    solver.add(obj <= upper_bound)
-
     encoding_time = time.time()
+    instrumentation.count("assertions", len(solver.assertions()))
+    instrumentation.begin("solve")
     # print(f"Starting search after: {encoding_time:3.3} seconds with lowerbound: [{lower_bound}]\n")
     timeout = encoding_time + timeout_duration
 
@@ -118,9 +154,10 @@ def SMT(m, n, l, s, D, symmetry_breaking=True, implied_constraint=True, timeout_
 
     solver.push()
     solver.set('timeout', millisecs_left(time.time(), timeout))
-    while solver.check() == sat:
+    while instrumentation.check(solver) == sat:
         model = solver.model()
         result_objective = model[obj].as_long()
+        instrumentation.incumbent(result_objective)
 
         # print(f"Intermediate objective value: {result_objective} after {(time.time() - start_time):3.3} seconds")
         if result_objective <= lower_bound:
@@ -135,6 +172,9 @@ def SMT(m, n, l, s, D, symmetry_breaking=True, implied_constraint=True, timeout_
             break
         solver.set('timeout', millisecs_left(now, timeout))
 
+    instrumentation.statistics(solver)
+    instrumentation.begin("readout")
+
     end_time = time.time()
     if end_time > timeout:
         solving_time = timeout_duration    # solving_time has upper bound of timeout_duration if it timeouts
@@ -142,20 +182,17 @@ def SMT(m, n, l, s, D, symmetry_breaking=True, implied_constraint=True, timeout_
         solving_time = math.floor(end_time - encoding_time)
 
     if model is None:
+        if incumbent is not None:
+            instrumentation.source(incumbent[2])
+            return (incumbent[0], solving_time, incumbent[1])
         ans = "N/A" if solving_time == timeout_duration else "UNSAT"
         return (ans, solving_time, None)
     
-    # reorder all variables w.r.t. the original permutation of load capacities, i.e. of couriers
+    result_O = VariableArray(O, dtype=int).read(model)
+    # reorder the couriers w.r.t. the original permutation of load capacities
     if symmetry_breaking:
-        A_copy = copy.deepcopy(A)
-        O_copy = copy.deepcopy(O)
-        for i in range(m):
-            A[permutation[i]] = A_copy[i]
-            O[permutation[i]] = O_copy[i]
-
-    result_O = [ [ model[O[i][j]].as_long() for j in ITEMS ]
-                for i in COURIERS ]
+        result_O = unpermute(result_O, permutation)
 
-    deliveries = retrieve_routes(result_O)
+    deliveries = routes_from_successors(successors_from_positions(result_O))
 
     return (result_objective, solving_time, deliveries)
\ No newline at end of file
@@ -1,16 +1,31 @@
 from z3 import *
 import time
 
+from common import instrumentation
+from common.bounds import objective_bounds
+from common.route_cache import RouteCache
+from common.preprocessing import infeasible_assignments, infeasible_arcs
+from common.readout import VariableArray
+from common.routes import successors_from_positions, routes_from_successors
+
 from .utils import *
 
 #------------------------------------------------------------------------------
 # Model
 #------------------------------------------------------------------------------
 
-def SMT_three_solvers(m, n, l, s, D, symmetry_breaking=True, implied_constraint=True, timeout_duration=300):
+def SMT_three_solvers(m, n, l, s, D, symmetry_breaking=True, implied_constraint=True, timeout_duration=300, route_cache=None, heuristic=True):
     COURIERS = range(m)
     ITEMS = range(n)
 
+    # bounds on the objective, computed before sorting the couriers so that the heuristic routes are in their original order
+    instrumentation.begin("bounds")
+    lower_bound, upper_bound, incumbent = objective_bounds(m, n, l, s, D, implied_constraint, heuristic, timeout=timeout_duration)
+    if incumbent is not None and incumbent[0] <= lower_bound:
+        # the heuristic solution is optimal
+        instrumentation.source(incumbent[2])
+        return (incumbent[0], 0, incumbent[1])
+
     if symmetry_breaking:
         # sort the list of loads, keeping the permutation used for later
         L = [(l[i], i) for i in range(m)]
@@ -23,16 +38,22 @@ def SMT_three_solvers(m, n, l, s, D, symmetry_breaking=True, implied_constraint=
     # Variables
     #------------------------------------------------------------------------------
 
-    A = [ [ Bool("a_%s_%s" % (i+1, j+1)) for j in ITEMS ]
+    # Preprocessing: pairs courier-item that can't be part of any solution are never allocated,
+    # arcs that can't be part of any route shorter than upper_bound are forbidden
+    impossible_A = infeasible_assignments(l, s)
+    impossible_arcs = infeasible_arcs(D, upper_bound)
+
+    A = [ [ BoolVal(False) if impossible_A[i][j] else Bool("a_%s_%s" % (i+1, j+1)) for j in ITEMS ]
         for i in COURIERS ]
 
-    O = [ [ Int("o_%s_%s" % (i+1, j+1)) for j in ITEMS ]
+    O = [ [ IntVal(0) if impossible_A[i][j] else Int("o_%s_%s" % (i+1, j+1)) for j in ITEMS ]
         for i in COURIERS ]
 
     dist = [ Int("dist_%s" % (i+1)) for i in COURIERS ]
 
     solver_A, solver_O, solver = Solver(), Solver(), Solver()
     start_time = time.time()
+    instrumentation.begin("encode")
 
     #------------------------------------------------------------------------------
     # Constraints
@@ -83,12 +104,19 @@ def SMT_three_solvers(m, n, l, s, D, symmetry_breaking=True, implied_constraint=
         dist_expr = Sum([
             Sum([
                 If(And(order_items[j1] != 0, order_items[j2] - order_items[j1] == 1), D[j1][j2], 0)
-                for j2 in ITEMS
+                for j2 in ITEMS if not impossible_arcs[j1][j2]
             ])
             for j1 in ITEMS
         ])
         dist_expr += Sum([If(order_items[j0] == 1, D[n][j0], 0) for j0 in ITEMS])
         dist_expr += Sum([If(order_items[jn] == counts[i], D[jn][n], 0) for jn in ITEMS])
+        for j1 in ITEMS:
+            for j2 in ITEMS:
+                if impossible_arcs[j1][j2] and not (impossible_A[i][j1] or impossible_A[i][j2]):
+                    add_constraint([solver_O, solver], Implies(order_items[j1] != 0, order_items[j2] - order_items[j1] != 1))
+        for j in ITEMS:
+            if impossible_arcs[n][j] or impossible_arcs[j][n]:
+                add_constraint([solver_O, solver], order_items[j] == 0)
         if implied_constraint:
             solver.add(dist[i] == dist_expr)
         else:
@@ -105,69 +133,90 @@ def SMT_three_solvers(m, n, l, s, D, symmetry_breaking=True, implied_constraint=
     # Search Strategy
     #------------------------------------------------------------------------------
 
-    lower_bound = max([D[n][j] + D[j][n] for j in ITEMS])
-
-    max_distances = [max(D[i][:-1]) for i in range(n)]
-    max_distances.sort()
-    if implied_constraint:
-        upper_bound = sum(max_distances[m:]) + max(D[n]) + max(
-            [D[j][n] for j in range(n)])
-    else:
-        upper_bound = sum(max_distances[1:]) + max(D[n]) + max(
-            [D[j][n] for j in range(n)])
-
     solver.add(obj >= lower_bound)
     solver.add(obj <= upper_bound)
 
     encoding_time = time.time()
+    instrumentation.count("assertions", len(solver.assertions()))
+    instrumentation.begin("solve")
     # print(f"Starting search after: {encoding_time:3.3} seconds with lowerbound: [{lower_bound}]\n")
     timeout = encoding_time + timeout_duration
 
-    model = None
+    routes = None
     result_objective = upper_bound
+    if incumbent is not None:
+        # only the assignments improving the heuristic solution are routed
+        result_objective = incumbent[0]
+        routes = [ [ j-1 for j in incumbent[1][permutation[i] if symmetry_breaking else i] ] for i in COURIERS ]
+        solver.add(obj < result_objective)
+
+    if route_cache is None:
+        route_cache = RouteCache(D)
+
+    A_readout = VariableArray(A)
+    O_readout = VariableArray(O, dtype=int)
 
     solver_A.set('timeout', millisecs_left(time.time(), timeout))
-    while solver_A.check() == sat:
+    while instrumentation.check(solver_A) == sat:
         model_A = solver_A.model()
-        result_A = [ [ model_A.evaluate(A[i][j]) for j in ITEMS ]
-            for i in COURIERS ]
+        result_A = A_readout.read(model_A).tolist()
         # print(f"Found A after {(time.time() - start_time):.4} seconds")
+        item_sets = [ [ j for j in ITEMS if result_A[i][j] ] for i in COURIERS ]
+        cached = [ route_cache.get(items) for items in item_sets ]
         solver_O.push()
         solver.push()
-        for i in COURIERS:
-            for j in ITEMS:
-                add_constraint([solver_O, solver], result_A[i][j] == A[i][j])
-        now = time.time()
-        if now >= timeout:
-            break
-        solver_O.set('timeout', millisecs_left(now, timeout))
-        while solver_O.check() == sat:
-            model_O = solver_O.model()
-            result_O = [ [ model_O[O[i][j]].as_long() for j in ITEMS ]
-                    for i in COURIERS ]
-            # print(f"Found O after {(time.time() - start_time):.4} seconds")
-            solver.push()
+        if routes is not None and any(route_cache.lower_bound(items) >= result_objective for items in item_sets):
+            # the cached bounds show that this assignment can't improve the incumbent
+            pass
+        elif all(entry is not None and entry[2] for entry in cached):
+            # the optimal route of every courier is already known
+            objective = max(entry[0] for entry in cached)
+            if objective < result_objective:
+                result_objective = objective
+                instrumentation.incumbent(result_objective)
+                routes = [ entry[1] for entry in cached ]
+                # print(f"Intermediate objective value: {result_objective} after {(time.time() - start_time):.4} seconds\n")
+        else:
             for i in COURIERS:
                 for j in ITEMS:
-                    solver.add(And(result_O[i][j] == O[i][j], result_A[i][j] == A[i][j]))
-            now = time.time()
-            if now >= timeout:
-                break
-            solver.set('timeout', millisecs_left(now, timeout))
-            if solver.check() == sat:
-                model = solver.model()
-                result_objective = model[obj].as_long()
-                # print(f"Intermediate objective value: {result_objective} after {(time.time() - start_time):.4} seconds\n")
-                solver.add(obj < result_objective)
-            solver_O.add(Or([ O[i][j] != result_O[i][j] for j in ITEMS for i in COURIERS ]))
-            solver.pop()
-            solver.add(obj < result_objective)
-            if result_objective <= lower_bound:
-                break
+                    add_constraint([solver_O, solver], result_A[i][j] == A[i][j])
             now = time.time()
             if now >= timeout:
                 break
             solver_O.set('timeout', millisecs_left(now, timeout))
+            while instrumentation.check(solver_O) == sat:
+                model_O = solver_O.model()
+                result_O = O_readout.read(model_O)
+                routes_O = routes_from_successors(successors_from_positions(result_O))
+                result_O = result_O.tolist()
+                # print(f"Found O after {(time.time() - start_time):.4} seconds")
+                solver.push()
+                for i in COURIERS:
+                    for j in ITEMS:
+                        solver.add(And(result_O[i][j] == O[i][j], result_A[i][j] == A[i][j]))
+                now = time.time()
+                if now >= timeout:
+                    break
+                solver.set('timeout', millisecs_left(now, timeout))
+                if instrumentation.check(solver) == sat:
+                    model = solver.model()
+                    result_objective = model[obj].as_long()
+                    instrumentation.incumbent(result_objective)
+                    routes = [ [ j-1 for j in route ] for route in routes_O ]
+                    # the routes found are the best known for their sets of items
+                    for i in COURIERS:
+                        route_cache.put(item_sets[i], model[dist[i]].as_long(), routes[i], False)
+                    # print(f"Intermediate objective value: {result_objective} after {(time.time() - start_time):.4} seconds\n")
+                    solver.add(obj < result_objective)
+                solver_O.add(Or([ O[i][j] != result_O[i][j] for j in ITEMS for i in COURIERS ]))
+                solver.pop()
+                solver.add(obj < result_objective)
+                if result_objective <= lower_bound:
+                    break
+                now = time.time()
+                if now >= timeout:
+                    break
+                solver_O.set('timeout', millisecs_left(now, timeout))
 
         solver_A.add(Or([ A[i][j] != result_A[i][j] for j in ITEMS for i in COURIERS ]))
         solver_O.pop()
@@ -180,28 +229,36 @@ def SMT_three_solvers(m, n, l, s, D, symmetry_breaking=True, implied_constraint=
             break
         solver_A.set('timeout', millisecs_left(now, timeout))
 
+    instrumentation.statistics(solver_A, "A.")
+    instrumentation.statistics(solver_O, "O.")
+    instrumentation.statistics(solver)
+    instrumentation.begin("readout")
+
     end_time = time.time()
     if end_time > timeout:
         solving_time = timeout_duration    # solving_time has upper bound of timeout_duration if it timeouts
     else:
         solving_time = math.floor(end_time - encoding_time)
 
-    if model is None:
+    if routes is None:
+        if incumbent is not None:
+            instrumentation.source(incumbent[2])
+            return (incumbent[0], solving_time, incumbent[1])
         ans = "N/A" if solving_time == timeout_duration else "UNSAT"
         return (ans, solving_time, None)
 
-    # reorder all variables w.r.t. the original permutation of load capacities, i.e. of couriers
-    if symmetry_breaking:
-        A_copy = copy.deepcopy(A)
-        O_copy = copy.deepcopy(O)
-        for i in range(m):
-            A[permutation[i]] = A_copy[i]
-            O[permutation[i]] = O_copy[i]
+    if incumbent is not None and result_objective == incumbent[0]:
+        # no assignment improved the incumbent the routes were seeded with
+        instrumentation.source(incumbent[2])
 
-    result_O = [ [ model[O[i][j]].as_long() for j in ITEMS ]
-                for i in COURIERS ]
+    # reorder the routes w.r.t. the original permutation of load capacities, i.e. of couriers
+    if symmetry_breaking:
+        routes_copy = routes
+        routes = [None] * m
+        for i in COURIERS:
+            routes[permutation[i]] = routes_copy[i]
 
-    deliveries = retrieve_routes(result_O)
+    deliveries = [ [ j+1 for j in route ] for route in routes ]
 
     return (result_objective, solving_time, deliveries)
 
@@ -1,16 +1,80 @@
 from z3 import *
 import time
 
+from common import instrumentation
+from common.bounds import objective_bounds
+from common.tsp import solve_routes, make_pool
+from common.route_cache import RouteCache
+from common.preprocessing import infeasible_assignments
+from common.readout import VariableArray
+
 from .utils import *
 
+#------------------------------------------------------------------------------
+# Route subproblem
+#------------------------------------------------------------------------------
+
+def single_courier_tsp(items, D, timeout):
+    k = len(items)
+    ITEMS = range(k)
+    origin = len(D) - 1
+
+    O = [ Int("o_%s" % (j+1)) for j in ITEMS ]
+
+    solver = Solver()
+    solver.add(And([And(O[j] >= 1, O[j] <= k) for j in ITEMS]))
+    solver.add(Distinct(O))
+
+    dist = Int('dist')
+    dist_expr = Sum([
+        Sum([
+            If(O[j2] - O[j1] == 1, D[items[j1]][items[j2]], 0)
+            for j2 in ITEMS if j2 != j1
+        ])
+        for j1 in ITEMS
+    ])
+    dist_expr += Sum([If(O[j0] == 1, D[origin][items[j0]], 0) for j0 in ITEMS])
+    dist_expr += Sum([If(O[jn] == k, D[items[jn]][origin], 0) for jn in ITEMS])
+    solver.add(dist == dist_expr)
+
+    model = None
+    optimal = False
+    now = time.time()
+    while now < timeout:
+        solver.set('timeout', millisecs_left(now, timeout))
+        result = instrumentation.check(solver)
+        if result != sat:
+            optimal = (result == unsat)
+            break
+        model = solver.model()
+        solver.add(dist < model[dist].as_long())
+        now = time.time()
+
+    if model is None:
+        return None
+
+    route = [-1] * k
+    for j in ITEMS:
+        route[model[O[j]].as_long() - 1] = items[j]
+
+    return (model[dist].as_long(), route, optimal)
+
 #------------------------------------------------------------------------------
 # Model
 #------------------------------------------------------------------------------
 
-def SMT_two_solvers(m, n, l, s, D, symmetry_breaking=True, implied_constraint=True, timeout_duration=300):
+def SMT_two_solvers(m, n, l, s, D, symmetry_breaking=True, implied_constraint=True, timeout_duration=300, route_cache=None, heuristic=True):
     COURIERS = range(m)
     ITEMS = range(n)
 
+    # bounds on the objective, computed before sorting the couriers so that the heuristic routes are in their original order
+    instrumentation.begin("bounds")
+    lower_bound, _, incumbent = objective_bounds(m, n, l, s, D, implied_constraint, heuristic, timeout=timeout_duration)
+    if incumbent is not None and incumbent[0] <= lower_bound:
+        # the heuristic solution is optimal
+        instrumentation.source(incumbent[2])
+        return (incumbent[0], 0, incumbent[1])
+
     if symmetry_breaking:
         # sort the list of loads, keeping the permutation used for later
         L = [(l[i], i) for i in range(m)]
@@ -23,17 +87,15 @@ def SMT_two_solvers(m, n, l, s, D, symmetry_breaking=True, implied_constraint=Tr
     # Variables
     #------------------------------------------------------------------------------
 
-    A = [ [ Bool("a_%s_%s" % (i+1, j+1)) for j in ITEMS ]
-        for i in COURIERS ]
+    # Preprocessing: pairs courier-item that can't be part of any solution are never allocated
+    impossible_A = infeasible_assignments(l, s)
 
-    O = [ [ Int("o_%s_%s" % (i+1, j+1)) for j in ITEMS ]
+    A = [ [ BoolVal(False) if impossible_A[i][j] else Bool("a_%s_%s" % (i+1, j+1)) for j in ITEMS ]
         for i in COURIERS ]
 
-    dist = [ Int("dist_%s" % (i+1)) for i in COURIERS ]
-
     solver_A = Solver()
-    solver = Solver()
     start_time = time.time()
+    instrumentation.begin("encode")
 
     #------------------------------------------------------------------------------
     # Constraints
@@ -42,152 +104,103 @@ def SMT_two_solvers(m, n, l, s, D, symmetry_breaking=True, implied_constraint=Tr
     # Constraints to create the effective loads array
     loads = [ Int("loads_%s" % (i+1)) for i in COURIERS ]
     for i in COURIERS:
-        loads_constraint = loads[i] == Sum([If(A[i][j], s[j], 0) for j in ITEMS])
-        solver_A.add(loads_constraint)
-        solver.add(loads_constraint)
+        solver_A.add(loads[i] == Sum([If(A[i][j], s[j], 0) for j in ITEMS]))
 
     if symmetry_breaking:
-        loads_ord_constraint = And([loads[i] >= loads[i+1] for i in range(m-1)])
-        solver_A.add(loads_ord_constraint)
-        solver.add(loads_ord_constraint)
+        solver_A.add(And([loads[i] >= loads[i+1] for i in range(m-1)]))
         for i in range(m-1):
-            lex_constraint = Implies(loads[i] == loads[i+1], precedes(A[i], A[i+1]))
-            solver_A.add(lex_constraint)
-            solver.add(lex_constraint)
-
-    # Contraint to count the items carried by each courier
-    counts = [ Int("counts_%s" % (i+1)) for i in COURIERS ]
-    for i in COURIERS:
-        solver.add(counts[i] == Sum([If(A[i][j], 1, 0) for j in ITEMS]))
+            solver_A.add(Implies(loads[i] == loads[i+1], precedes(A[i], A[i+1])))
 
     # Constraints to create assignments matrix A
     for i in COURIERS:
         if implied_constraint:
-            A_rows_constraint = And(Or(A[i]), PbLe([(A[i][j], s[j]) for j in ITEMS], l[i]))
+            solver_A.add(And(Or(A[i]), PbLe([(A[i][j], s[j]) for j in ITEMS], l[i])))
         else:
-            A_rows_constraint = PbLe([(A[i][j], s[j]) for j in ITEMS], l[i])
-        solver_A.add(A_rows_constraint)
-        solver.add(A_rows_constraint)
+            solver_A.add(PbLe([(A[i][j], s[j]) for j in ITEMS], l[i]))
     for j in ITEMS:
-        A_cols_constraint = Sum([A[i][j] for i in COURIERS]) == 1
-        solver_A.add(A_cols_constraint)
-        solver.add(A_cols_constraint)
-
-    # Constraints to create route orders matrix O
-    for i in COURIERS:
-        for j in ITEMS:
-            solver.add(If(Not(A[i][j]), O[i][j] == 0, O[i][j] > 0))
-    for i in COURIERS:
-        order_items = [If(O[i][j] != 0, O[i][j], 0) for j in ITEMS]
-        non_zero_items = [If(order_items[j] != 0, order_items[j], -j) for j in ITEMS]
-        solver.add(Distinct(non_zero_items))
-        solver.add(And([order_items[j] <= counts[i] for j in ITEMS]))
-
-    # Constraint to create dist
-    for i in COURIERS:
-        order_items = [O[i][j] for j in ITEMS]
-        dist_expr = Sum([
-            Sum([
-                If(And(order_items[j1] != 0, order_items[j2] - order_items[j1] == 1), D[j1][j2], 0)
-                for j2 in ITEMS
-            ])
-            for j1 in ITEMS
-        ])
-        dist_expr += Sum([If(order_items[j0] == 1, D[n][j0], 0) for j0 in ITEMS])
-        dist_expr += Sum([If(order_items[jn] == counts[i], D[jn][n], 0) for jn in ITEMS])
-        if implied_constraint:
-            solver.add(dist[i] == dist_expr)
-        else:
-            solver.add(dist[i] == If(counts[i] > 0, dist_expr, 0))
-
-    #------------------------------------------------------------------------------
-    # Objective
-    #------------------------------------------------------------------------------
-
-    obj = Int('obj')
-    solver.add(obj == maximum([dist[i] for i in COURIERS]))
+        solver_A.add(Sum([A[i][j] for i in COURIERS]) == 1)
 
     #------------------------------------------------------------------------------
     # Search Strategy
     #------------------------------------------------------------------------------
 
-    lower_bound = max([D[n][j] + D[j][n] for j in ITEMS])
-    
-    max_distances = [max(D[i][:-1]) for i in range(n)]
-    max_distances.sort()
-    if implied_constraint:
-        upper_bound = sum(max_distances[m:]) + max(D[n]) + max([D[j][n] for j in range(n)])
-    else:
-        upper_bound = sum(max_distances[1:]) + max(D[n]) + max([D[j][n] for j in range(n)])
-
-    solver.add(obj >= lower_bound)
-    solver.add(obj <= upper_bound)
-
     encoding_time = time.time()
+    instrumentation.count("assertions", len(solver_A.assertions()))
+    instrumentation.begin("solve")
     # print(f"Starting search after: {encoding_time:3.3} seconds with lowerbound: [{lower_bound}]\n")
     timeout = encoding_time + timeout_duration
 
-    model = None
-    result_objective = upper_bound
+    routes = None
+    result_objective = None
+    if incumbent is not None:
+        # only the assignments improving the heuristic solution are routed
+        result_objective = incumbent[0]
+        routes = [ [ j-1 for j in incumbent[1][permutation[i] if symmetry_breaking else i] ] for i in COURIERS ]
+
+    # the routing of each courier is solved independently, reusing the routes of already seen sets of items
+    if route_cache is None:
+        route_cache = RouteCache(D)
+    pool = make_pool(m)
+    A_readout = VariableArray(A)
 
     solver_A.set('timeout', millisecs_left(time.time(), timeout))
-    while solver_A.check() == sat:
+    while instrumentation.check(solver_A) == sat:
         model_A = solver_A.model()
-        result_A = [ [ model_A.evaluate(A[i][j]) for j in ITEMS ]
-            for i in COURIERS ]
+        result_A = A_readout.read(model_A).tolist()
         # print(f"Found A after {(time.time() - start_time):3.3} seconds")
-        solver.push()
-        for i in COURIERS:
-            for j in ITEMS:
-                solver.add(result_A[i][j] == A[i][j])
-        now = time.time()
-        if now >= timeout:
-            break
-        solver.set('timeout', millisecs_left(now, timeout))
-        while solver.check() == sat:
-            model = solver.model()
-            result_objective = model[obj].as_long()
 
-            # print(f"Intermediate objective value: {result_objective} after {(time.time() - start_time):3.3} seconds")
-            solver.add(obj < result_objective)
-            if result_objective <= lower_bound:
-                break
-            now = time.time()
-            if now >= timeout:
+        item_sets = [ [ j for j in ITEMS if result_A[i][j] ] for i in COURIERS ]
+        if result_objective is None or all(route_cache.lower_bound(items) < result_objective for items in item_sets):
+            courier_routes = solve_routes(item_sets, D, single_courier_tsp, timeout, route_cache, pool)
+            if courier_routes is None:
                 break
-            solver.set('timeout', millisecs_left(now, timeout))
+
+            objective = max(length for length, _, _ in courier_routes)
+            if result_objective is None or objective < result_objective:
+                result_objective = objective
+                instrumentation.incumbent(result_objective)
+                routes = [ route for _, route, _ in courier_routes ]
+                # print(f"Intermediate objective value: {result_objective} after {(time.time() - start_time):3.3} seconds")
+                if result_objective <= lower_bound:
+                    break
+
+        # no courier can carry a superset of a set of items whose route can't be shorter than the incumbent
+        for items in item_sets:
+            if items and route_cache.lower_bound(items) >= result_objective:
+                solver_A.add(And([ Or([ Not(A[i][j]) for j in items ]) for i in COURIERS ]))
 
         solver_A.add(Or([ A[i][j] != result_A[i][j] for j in ITEMS for i in COURIERS ]))
-        solver.pop()
-        solver.add(obj < result_objective)
-        if result_objective <= lower_bound:
-            break
         now = time.time()
         if now >= timeout:
             break
         solver_A.set('timeout', millisecs_left(now, timeout))
 
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    instrumentation.statistics(solver_A)
+    instrumentation.begin("readout")
+
     end_time = time.time()
     if end_time > timeout:
         solving_time = timeout_duration    # solving_time has upper bound of timeout_duration if it timeouts
     else:
         solving_time = math.floor(end_time - encoding_time)
 
-    if model is None:
+    if routes is None:
         ans = "N/A" if solving_time == timeout_duration else "UNSAT"
         return (ans, solving_time, None)
-    
-    # reorder all variables w.r.t. the original permutation of load capacities, i.e. of couriers
-    if symmetry_breaking:
-        A_copy = copy.deepcopy(A)
-        O_copy = copy.deepcopy(O)
-        for i in range(m):
-            A[permutation[i]] = A_copy[i]
-            O[permutation[i]] = O_copy[i]
 
-    result_O = [ [ model[O[i][j]].as_long() for j in ITEMS ]
-                for i in COURIERS ]
+    if incumbent is not None and result_objective == incumbent[0]:
+        # no assignment improved the incumbent the routes were seeded with
+        instrumentation.source(incumbent[2])
+
+    # reorder the routes w.r.t. the original permutation of load capacities, i.e. of couriers
+    if symmetry_breaking:
+        routes_copy = routes
+        routes = [None] * m
+        for i in COURIERS:
+            routes[permutation[i]] = routes_copy[i]
 
-    deliveries = retrieve_routes(result_O)
+    deliveries = [ [ j+1 for j in route ] for route in routes ]
 
-    return (result_objective, solving_time, deliveries)
\ No newline at end of file
+    return (result_objective, solving_time, deliveries)
@@ -1,4 +1,11 @@
-import numpy as np
+import os
+import tempfile
+
+from common import instrumentation
+from common.sandbox import run_model
+from common.instance import read_instance
+from common.route_cache import RouteCache
+from common.config import model_parameters, z3_parameters
 
 from .model import *
 from .model_two_solvers import *
@@ -15,27 +22,72 @@ models = [ ("base", SMT),
 
 
 def run_model_on_instance(MCP_model, file, **kwargs):
-    with open(file) as f:
-        m = int(next(f))
-        n = int(next(f))
-        l = [int(e) for e in next(f).split()]
-        s = [int(e) for e in next(f).split()]
-        D = np.genfromtxt(f, dtype=int).tolist()
+    instrumentation.begin("parse")
+    m, n, l, s, D = read_instance(file)
 
     return MCP_model(m, n, l, s, D, **kwargs)
 
 
-def run_smt(instance_file):
+def run_smt(instance_file, model_names=None, seed=None, timeout=300, sandbox=True, on_result=None):
+    """Runs the models on the given instance
+
+    Args:
+        instance_file (str): path of the .dat file representing the instance
+        model_names (list[str], optional): names of the models to run (default=None, i.e. all of them)
+        seed (int, optional): random seed of the solver (default=None, i.e. z3's default)
+        timeout (int, optional): timeout of each model in seconds (default=300)
+        sandbox (bool, optional): wether or not to run each model in a sandboxed child process, killed if it
+                                  overruns its timeout or runs out of memory (default=True)
+        on_result (function, optional): function of (model name, result entry) called as soon as each model finishes,
+                                        e.g. to store its result before the next one runs (default=None)
+    """
     dictionary = {}
 
+    if seed is not None:
+        set_param("sat.random_seed", seed)
+        set_param("smt.random_seed", seed)
+
+    # routes of sets of items are shared between the sequential models, and between runs if MCP_ROUTE_CACHE is set.
+    # Sandboxed models run in their own processes, so they share them through a (temporary) file
+    D = read_instance(instance_file)[4]
+    route_cache_path = os.environ.get("MCP_ROUTE_CACHE")
+    route_cache_file = None
+    if sandbox and route_cache_path is None:
+        route_cache_file = tempfile.NamedTemporaryFile(suffix=".sqlite")
+        route_cache_path = route_cache_file.name
+    shared_route_cache = None if sandbox else RouteCache(D, path=route_cache_path)
+
     for model_name, model in models:
+        if model_names is not None and model_name not in model_names:
+            continue
         sym_break = False if "no_sym_break" in model_name else True
         implied_constr = False if "no_implied" in model_name else True
-        obj_value, solving_time, routes = run_model_on_instance(model, instance_file, symmetry_breaking=sym_break, implied_constraint=implied_constr)
+        # parameters of the configuration profile (see tune.py)
+        parameters, solver_parameters = model_parameters("SMT", model_name)
 
-        model_dict = {"time": solving_time, "optimal": (solving_time < 300), "obj": obj_value, "sol": [] if routes is None else routes}
+        def run():
+            kwargs = dict(parameters)
+            if "sequential" in model_name:
+                kwargs["route_cache"] = shared_route_cache if shared_route_cache is not None else RouteCache(D, path=route_cache_path)
+            # global z3 parameters, reset after the model
+            with z3_parameters(solver_parameters), instrumentation.recording() as recorder:
+                obj_value, solving_time, routes = run_model_on_instance(model, instance_file, symmetry_breaking=sym_break, implied_constraint=implied_constr, timeout_duration=timeout, **kwargs)
+
+            entry = {"time": solving_time, "optimal": (solving_time < timeout), "obj": obj_value, "sol": [] if routes is None else routes,
+                     "stats": recorder.to_dict()}
+            # the heuristic or known solution returned in place of one of the model
+            if recorder.source is not None:
+                entry["source"] = recorder.source
+            return entry
+
+        model_dict = run_model(run, timeout, sandbox)
 
         dictionary[model_name] = model_dict
+        if on_result is not None:
+            on_result(model_name, dictionary[model_name])
         print(f"Finished running model {model_name}")
 
-    return dictionary
\ No newline at end of file
+    if route_cache_file is not None:
+        route_cache_file.close()
+
+    return dictionary
@@ -1,3 +1,4 @@
+import math
 
 from z3 import *
 
@@ -7,33 +8,29 @@ from z3 import *
 
 
 def millisecs_left(t, timeout):
-    return int((timeout - t) * 1000)
+    # rounded up: z3 stops as soon as the milliseconds pass, and stopping before timeout would look like a proof of optimality
+    return math.ceil((timeout - t) * 1000)
 
 def maximum(a):
-    m = a[0]
-    for v in a[1:]:
-        m = If(v > m, v, m)
-    return m
+    # balanced tree of pairwise maxima, logarithmic depth in the number of terms
+    level = list(a)
+    while len(level) > 1:
+        pairs = [If(level[k+1] > level[k], level[k+1], level[k]) for k in range(0, len(level) - 1, 2)]
+        if len(level) % 2 == 1:
+            pairs.append(level[-1])
+        level = pairs
+    return level[0]
 
 def precedes(a1, a2):
-    if len(a1) == 1 and len(a2) == 1:
-        return Not(And(Not(a1[0]), a2[0]))
-    return Or(And(a1[0], Not(a2[0])),
-              And(a1[0] == a2[0], precedes(a1[1:], a2[1:])))
+    # built iteratively from the last position, without slicing
+    last = len(a1) - 1
+    formula = Not(And(Not(a1[last]), a2[last]))
+    for k in range(last - 1, -1, -1):
+        formula = Or(And(a1[k], Not(a2[k])),
+                     And(a1[k] == a2[k], formula))
+    return formula
 
 
 def add_constraint(solvers, constraint):
     for s in solvers:
         s.add(constraint)
-
-def retrieve_routes(orders):
-    sol = []
-    m = len(orders)
-    n = len(orders[0])
-    for i in range(m):
-        route = [-1] * sum(x > 0 for x in orders[i])
-        for j in range(n):
-            if orders[i][j] != 0:
-                route[orders[i][j]-1] = j+1
-        sol.append(route)
-    return sol
\ No newline at end of file
@@ -0,0 +1,366 @@
+import os
+import sys
+import csv
+import json
+import math
+import time
+import queue
+import argparse
+import resource
+import statistics
+import subprocess
+import multiprocessing
+
+from common.runners import RUNNERS, SEEDED_METHODS, load_runner
+
+
+TIMEOUT = 300
+
+FIELDS = ["method", "model", "instance", "seed", "rep", "status", "obj", "optimal", "time",
+          "wall", "encode", "peak_rss_mb", "incumbents", "stats", "source"]
+
+# ratios at which the performance profiles are reported
+TAUS = [1, 1.25, 1.5, 2, 4, 8, 16, 32, 64]
+
+
+#------------------------------------------------------------------------------
+# Running
+#------------------------------------------------------------------------------
+
+def instance_path(method, instance, instance_dir=None):
+    """Returns the path of instance number {instance} in the format read by {method}, among the instances of the
+    project or the ones generated in instance_dir by generate_instances.py"""
+    if method == "CP":
+        directory = os.path.join("CP", "instances_dzn") if instance_dir is None else os.path.join(instance_dir, "instances_dzn")
+        return os.path.join(directory, f"inst{instance:02d}.dzn")
+    directory = "instances_dat" if instance_dir is None else os.path.join(instance_dir, "instances_dat")
+    return os.path.join(directory, f"inst{instance:02d}.dat")
+
+
+def run_once(method, model, instance, seed, timeout, results, instance_dir=None):
+    """Runs a single model on an instance, to be called in a fresh process so that the peak memory is its own.
+    The record of the run is put in the results queue"""
+    runner = load_runner(method)
+    kwargs = {"model_names": [model], "timeout": timeout}
+    if seed is not None and method in SEEDED_METHODS:
+        kwargs["seed"] = seed
+
+    start = time.perf_counter()
+    try:
+        entry = runner(instance_path(method, instance, instance_dir), **kwargs).get(model)
+        status = "missing" if entry is None else None
+    except Exception as e:
+        entry = None
+        status = f"error: {e!r}"
+    wall = time.perf_counter() - start
+
+    # ru_maxrss is in KB on Linux, solver subprocesses (e.g. minizinc) are accounted as children
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+    record = {"method": method, "model": model, "instance": instance, "seed": seed,
+              "wall": round(wall, 3), "peak_rss_mb": round(peak_rss / 1024, 1), "incumbents": []}
+    if entry is not None:
+        obj = entry.get("obj")
+        stats = entry.get("stats", {})
+        record.update({"obj": obj, "optimal": entry.get("optimal"), "time": entry.get("time"), "source": entry.get("source"),
+                       "encode": stats.get("phases", {}).get("encode"), "incumbents": stats.get("incumbents", []),
+                       "stats": json.dumps({key: value for key, value in stats.items() if key != "incumbents"})})
+        # models killed by the sandbox report why
+        status = entry.get("status", "solved" if isinstance(obj, int) else str(obj).lower())
+        # models not reporting their incumbents only have the final one
+        if isinstance(obj, int) and not record["incumbents"]:
+            record["incumbents"] = [(entry.get("time", wall), obj)]
+    record["status"] = status
+    results.put(record)
+
+
+def run_benchmark(configs, instances, seeds, reps, outfile, timeout=TIMEOUT, instance_dir=None):
+    """Runs every configuration on every instance, {reps} times for each seed, each run in its own process,
+    appending the records of the runs to the CSV file outfile
+
+    Args:
+        configs (list[(str, str)]): (method, model name) pairs
+        instances (list[int]): instance numbers
+        seeds (list[int]): random seeds (None for the solvers' default)
+        reps (int): repetitions of each run
+        outfile (str): path of the CSV file
+        timeout (int, optional): timeout of each run in seconds (default=TIMEOUT)
+        instance_dir (str, optional): directory of the instances generated by generate_instances.py (default=None,
+                                      i.e. the instances of the project)
+    """
+    context = multiprocessing.get_context("spawn")
+    new_file = not os.path.exists(outfile)
+    with open(outfile, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        if new_file:
+            writer.writeheader()
+        for instance in instances:
+            for method, model in configs:
+                for seed in seeds:
+                    for rep in range(reps):
+                        results = context.Queue()
+                        process = context.Process(target=run_once, args=(method, model, instance, seed, timeout, results, instance_dir))
+                        process.start()
+                        record = None
+                        while record is None:
+                            try:
+                                record = results.get(timeout=1)
+                            except queue.Empty:
+                                if not process.is_alive():
+                                    record = {"method": method, "model": model, "instance": instance, "seed": seed,
+                                              "status": f"crashed (exit code {process.exitcode})", "incumbents": []}
+                        process.join()
+                        record["rep"] = rep
+                        record["incumbents"] = json.dumps(record["incumbents"])
+                        writer.writerow(record)
+                        f.flush()
+                        print(f"{method}:{model} on inst{instance:02d} (seed {seed}, rep {rep}): "
+                              f"{record['status']} obj={record.get('obj')} wall={record.get('wall')}s")
+
+
+#------------------------------------------------------------------------------
+# Reports
+#------------------------------------------------------------------------------
+
+def load_runs(outfile):
+    """Reads the records of the runs from the CSV file, parsing their fields"""
+    runs = []
+    with open(outfile, newline="") as f:
+        for row in csv.DictReader(f):
+            row["instance"] = int(row["instance"])
+            row["obj"] = int(row["obj"]) if row["obj"].lstrip("-").isdigit() else None
+            row["optimal"] = row["optimal"] == "True"
+            for field in ["time", "wall", "encode", "peak_rss_mb"]:
+                row[field] = float(row[field]) if row[field] not in ("", "None") else None
+            row["incumbents"] = json.loads(row["incumbents"]) if row["incumbents"] else []
+            # the runs returning the heuristic or known solution instead of their own (missing in older files)
+            row["source"] = row.get("source") or None
+            runs.append(row)
+    return runs
+
+
+def primal_integral(incumbents, best, horizon):
+    """Integral over [0, horizon] of the primal gap of the incumbent, the gap being 1 until the first solution
+
+    Args:
+        incumbents (list[(float, int)]): times and objective values of the incumbents found
+        best (int): best known objective value
+        horizon (float): time horizon
+
+    Returns:
+        float: the primal integral, in seconds (0 means the best solution was known from the start)
+    """
+    integral = 0
+    gap = 1
+    last_time = 0
+    for t, obj in sorted(incumbents):
+        t = min(t, horizon)
+        integral += gap * (t - last_time)
+        last_time = t
+        gap = 0 if obj == best else abs(obj - best) / max(abs(obj), abs(best))
+    return integral + gap * (horizon - last_time)
+
+
+def time_to_target(incumbents, target):
+    """Returns the time at which an incumbent of value at most target was found, inf if never"""
+    return min([t for t, obj in incumbents if obj <= target], default=math.inf)
+
+
+def performance_profiles(costs, taus):
+    """Dolan-More performance profiles: for each configuration, the fraction of instances on which its cost is within a
+    factor tau of the best configuration on that instance
+
+    Args:
+        costs (dict[str, dict[int, float]]): costs[config][instance], inf if the configuration failed on the instance
+        taus (list[float]): the ratios at which to evaluate the profiles
+
+    Returns:
+        dict[str, list[float]]: for each configuration, the value of its profile at each tau
+    """
+    instances = sorted({instance for by_instance in costs.values() for instance in by_instance})
+    best = {instance: min(by_instance.get(instance, math.inf) for by_instance in costs.values()) for instance in instances}
+    profiles = {}
+    for config, by_instance in costs.items():
+        ratios = []
+        for instance in instances:
+            cost = by_instance.get(instance, math.inf)
+            if math.isinf(cost) or math.isinf(best[instance]):
+                ratios.append(math.inf)
+            else:
+                # solved in (almost) no time counts as the best time
+                ratios.append(max(cost, 1e-3) / max(best[instance], 1e-3))
+        profiles[config] = [sum(r <= tau for r in ratios) / len(instances) for tau in taus]
+    return profiles
+
+
+def report(outfile, outdir, taus=TAUS, horizon=TIMEOUT):
+    """Writes (and prints) the per-instance table and the performance profiles of the runs in outfile
+
+    Args:
+        outfile (str): CSV file of the runs
+        outdir (str): directory where to write instances.csv and profiles.csv
+        taus (list[float], optional): ratios of the performance profiles
+        horizon (float, optional): time horizon of the primal integrals
+    """
+    runs = load_runs(outfile)
+    best = {}
+    for run in runs:
+        if run["obj"] is not None:
+            best[run["instance"]] = min(best.get(run["instance"], run["obj"]), run["obj"])
+
+    groups = {}
+    for run in runs:
+        groups.setdefault((f"{run['method']}:{run['model']}", run["instance"]), []).append(run)
+
+    def median(values):
+        values = [v for v in values if v is not None]
+        return round(statistics.median(values), 3) if values else None
+
+    rows = []
+    proof_times = {}
+    target_times = {}
+    for (config, instance), group in sorted(groups.items(), key=lambda item: (item[0][1], item[0][0])):
+        target = best.get(instance)
+        objs = [run["obj"] for run in group if run["obj"] is not None]
+        # a known solution returned as optimal (see MCP_REGISTRY) is no proof of the configuration
+        optimal_walls = [run["wall"] for run in group if run["optimal"] and run["obj"] is not None and run["source"] != "registry"]
+        ttt = [time_to_target(run["incumbents"], target) for run in group] if target is not None else [math.inf]
+        integrals = [primal_integral(run["incumbents"], target, horizon) for run in group] if target is not None else [horizon]
+        row = {"instance": instance, "config": config, "runs": len(group),
+               "best_obj": min(objs) if objs else None, "best_known": target,
+               "optimal": f"{len(optimal_walls)}/{len(group)}",
+               "not_own": f"{sum(run['source'] is not None for run in group)}/{len(group)}",
+               "wall": median(run["wall"] for run in group),
+               "encode": median(run["encode"] for run in group),
+               "peak_rss_mb": median(run["peak_rss_mb"] for run in group),
+               "time_to_target": median(ttt), "primal_integral": round(statistics.mean(integrals), 3)}
+        rows.append(row)
+        # a configuration "solves" an instance when it proves optimality in every run
+        proof_times.setdefault(config, {})[instance] = statistics.median(optimal_walls) if len(optimal_walls) == len(group) else math.inf
+        target_times.setdefault(config, {})[instance] = statistics.median(ttt)
+
+    os.makedirs(outdir, exist_ok=True)
+    with open(os.path.join(outdir, "instances.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else ["instance"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+    with open(os.path.join(outdir, "profiles.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["metric", "config"] + taus)
+        for metric, costs in [("time_to_optimality", proof_times), ("time_to_target", target_times)]:
+            for config, profile in performance_profiles(costs, taus).items():
+                writer.writerow([metric, config] + [round(p, 3) for p in profile])
+
+    print_table(rows)
+    for metric, costs in [("time to optimality", proof_times), ("time to target", target_times)]:
+        print(f"\nPerformance profiles ({metric}), fraction of instances within tau of the best:")
+        print_table([{"config": config, **{f"tau={tau}": round(p, 2) for tau, p in zip(taus, profile)}}
+                     for config, profile in performance_profiles(costs, taus).items()])
+
+
+def print_table(rows):
+    if not rows:
+        return
+    columns = list(rows[0].keys())
+    widths = [max(len(str(c)), *(len(str(row[c])) for row in rows)) for c in columns]
+    print("  ".join(str(c).ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(w) for c, w in zip(columns, widths)))
+
+
+#------------------------------------------------------------------------------
+# Startup
+#------------------------------------------------------------------------------
+
+def startup_times(methods, reps, outdir):
+    """Measures the startup cost of each method: the wall time of a fresh interpreter importing its runner, as
+    run_master.py does, compared to an interpreter importing nothing. Writes (and prints) outdir/startup.csv
+
+    Args:
+        methods (list[str]): methods whose runners are imported
+        reps (int): launches of each interpreter, whose median is reported
+        outdir (str): directory where to write startup.csv
+    """
+    commands = [("none", "pass")] + [(method, f"from common.runners import load_runner; load_runner({method!r})")
+                                     for method in methods]
+    rows = []
+    for name, command in commands:
+        walls = []
+        for _ in range(reps):
+            start = time.perf_counter()
+            returncode = subprocess.run([sys.executable, "-c", command], capture_output=True).returncode
+            walls.append(time.perf_counter() - start)
+        rows.append({"runner": name, "median_s": round(statistics.median(walls), 3), "min_s": round(min(walls), 3),
+                     "status": "ok" if returncode == 0 else f"import failed ({returncode})"})
+
+    with open(os.path.join(outdir, "startup.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print_table(rows)
+
+
+#------------------------------------------------------------------------------
+# Command line
+#------------------------------------------------------------------------------
+
+def parse_instances(text):
+    """Parses instance numbers like '1-5,7'"""
+    instances = []
+    for part in text.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            instances += list(range(int(first), int(last) + 1))
+        else:
+            instances.append(int(part))
+    return instances
+
+
+def parse_config(text):
+    """Parses a configuration like 'SAT:base'"""
+    method, _, model = text.partition(":")
+    if method not in RUNNERS or not model:
+        raise argparse.ArgumentTypeError(f"configurations must be METHOD:model with METHOD in {list(RUNNERS)}, was given '{text}'")
+    return (method, model)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark MCP model configurations and report on their performance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run configurations on instances, then report")
+    run_parser.add_argument("--configs", type=parse_config, nargs="+", required=True, help="METHOD:model, e.g. SAT:base SMT:sequential_2solvers")
+    run_parser.add_argument("--instances", type=parse_instances, required=True, help="instance numbers, e.g. 1-5,7")
+    run_parser.add_argument("--seeds", type=int, nargs="+", default=[None], help="random seeds (default: solvers' default)")
+    run_parser.add_argument("--reps", type=int, default=1, help="repetitions for each seed")
+    run_parser.add_argument("--timeout", type=int, default=TIMEOUT, help="timeout of each run in seconds")
+    run_parser.add_argument("--instance-dir", default=None, help="directory of instances generated by generate_instances.py")
+    run_parser.add_argument("--registry", action="store_true", help="seed the runs with the best known solutions of the results database")
+    run_parser.add_argument("--out", default="bench", help="output directory (runs are appended to OUT/runs.csv)")
+
+    report_parser = subparsers.add_parser("report", help="report on the runs already recorded")
+    report_parser.add_argument("--out", default="bench", help="output directory containing runs.csv")
+
+    startup_parser = subparsers.add_parser("startup", help="measure the time to import the runner of each method")
+    startup_parser.add_argument("--methods", nargs="+", choices=list(RUNNERS), default=list(RUNNERS), help="methods to measure")
+    startup_parser.add_argument("--reps", type=int, default=10, help="launches of each interpreter")
+    startup_parser.add_argument("--out", default="bench", help="output directory (writes OUT/startup.csv)")
+
+    for p in [run_parser, report_parser]:
+        p.add_argument("--taus", type=float, nargs="+", default=TAUS, help="ratios of the performance profiles")
+        p.add_argument("--horizon", type=float, default=TIMEOUT, help="time horizon of the primal integrals")
+
+    args = parser.parse_args()
+    os.makedirs(args.out, exist_ok=True)
+    outfile = os.path.join(args.out, "runs.csv")
+
+    if args.command == "startup":
+        startup_times(args.methods, args.reps, args.out)
+    else:
+        if args.command == "run":
+            if args.registry:
+                # read by common.bounds in the processes of the runs
+                os.environ["MCP_REGISTRY"] = "1"
+            run_benchmark(args.configs, args.instances, args.seeds, args.reps, outfile, args.timeout, args.instance_dir)
+        report(outfile, args.out, args.taus, args.horizon)
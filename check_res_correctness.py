@@ -4,8 +4,15 @@ import sys
 import json
 
 TIMEOUT = 300
-# OPT[i] = Optimal value for instance i. 
-OPT = [None, 14, 226, 12, 220, 206]
+# OPT[i] = Optimal value for instance i: the ones proven by some model in the results database (see results_db.py) and
+# confirmed by a lower bound or by another method, if there is one, and the ones known for the first five instances.
+OPT = {1: 14, 2: 226, 3: 12, 4: 220, 5: 206}
+try:
+  from common.result_db import DB_PATH, connect, optima
+  if os.path.exists(DB_PATH):
+    OPT = {**optima(connect(DB_PATH)), **OPT}
+except ImportError:
+  pass
 
 def read_json_file(file_path):
   try:
@@ -100,10 +107,10 @@ def main(args):
         if max_dist != result['obj']:
           errors += [f"{header}: objective value {result['obj']} inconsistent with max. distance {max_dist} of path {max_path}, courier {max_cour})"]
         i = int(inst_number)
-        if i < 6:
+        if i in OPT:
           if result['optimal']:
             if result['obj'] != OPT[i]:
-              errors += [f"{header}: claimed optimal value {result['obj']} inconsistent with actual optimal value {OPTS[i]})"]
+              errors += [f"{header}: claimed optimal value {result['obj']} inconsistent with actual optimal value {OPT[i]})"]
           else:
             warnings += [f"{header}: instance {inst_number} not solved to optimality"]
   print('\nCheck terminated.')
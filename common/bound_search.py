@@ -0,0 +1,120 @@
+import os
+import time
+import multiprocessing
+from multiprocessing.connection import wait
+
+import z3
+
+from . import instrumentation
+from SAT.utils import millisecs_left
+
+
+def probe_bounds(lower_bound, upper_bound, k):
+    """Returns the (at most k) bounds splitting [lower_bound, upper_bound] in k+1 parts, i.e. the midpoint for k = 1
+
+    Args:
+        lower_bound (int): smallest objective value not yet proven infeasible
+        upper_bound (int): largest objective value still to improve on
+        k (int): number of bounds
+
+    Returns:
+        list[int]: the sorted bounds
+    """
+    return sorted({lower_bound + (upper_bound - lower_bound) * (t + 1) // (k + 1) for t in range(k)})
+
+
+def _probe(solver, constraint, read, timeout, connection):
+    """Checks the solver under constraint in a forked process, sending back ("sat", objective, solution), ("unsat",) or ("unknown",)"""
+    solver.add(constraint)
+    solver.set('timeout', max(millisecs_left(time.time(), timeout), 1))
+    result = solver.check()
+    if result == z3.sat:
+        connection.send(("sat",) + read(solver.model()))
+    else:
+        connection.send(("unsat",) if result == z3.unsat else ("unknown",))
+    connection.close()
+
+
+def parallel_bound_search(solver, bound_constraint, read, lower_bound, upper_bound, timeout, probes=None):
+    """k-ary search of the optimal objective value: k forked copies of solver each check whether a different bound in
+    [lower_bound, upper_bound] is feasible. As soon as one answers the bounds are updated, the probes made obsolete by
+    them (below the new lower bound or above the new incumbent) are killed, and new ones are started within the new
+    bounds. Each probe is a copy of the solver, so memory grows with the number of probes
+
+    Args:
+        solver (Solver): solver with the encoding of the problem
+        bound_constraint (function): function of (lower, bound) returning the constraint lower <= objective <= bound
+        read (function): function of a model returning (objective value, solution), the solution being picklable
+        lower_bound (int): lower bound on the objective
+        upper_bound (int): upper bound on the objective
+        timeout (float): timestamp of the timeout
+        probes (int, optional): number of concurrent probes (default=None, i.e. the number of CPUs)
+
+    Returns:
+        (int, object, bool): the best objective value found and its solution (None, None if none is found), and wether
+                             the search completed, i.e. the objective value is optimal or there is no solution
+    """
+    k = probes or os.cpu_count()
+    context = multiprocessing.get_context("fork")
+    running = {}    # connection -> (bound, process, start)
+    best_value, best_solution = None, None
+
+    def stop(connection):
+        _, process, _ = running.pop(connection)
+        process.kill()
+        process.join()
+        connection.close()
+
+    try:
+        while lower_bound <= upper_bound:
+            probed = {bound for bound, _, _ in running.values()}
+            for bound in probe_bounds(lower_bound, upper_bound, k):
+                if len(running) >= k:
+                    break
+                if bound in probed:
+                    continue
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=_probe, args=(solver, bound_constraint(lower_bound, bound), read, timeout, sender))
+                process.start()
+                sender.close()
+                running[receiver] = (bound, process, time.perf_counter())
+
+            now = time.time()
+            if now >= timeout:
+                break
+            ready = wait(list(running), timeout - now)
+            if not ready:
+                break
+
+            unknown = False
+            for connection in ready:
+                bound, process, start = running[connection]
+                try:
+                    answer = connection.recv()
+                except EOFError:
+                    answer = ("unknown",)
+                instrumentation.solver_call(time.perf_counter() - start)
+                stop(connection)
+
+                if answer[0] == "sat":
+                    value, solution = answer[1], answer[2]
+                    if best_value is None or value < best_value:
+                        best_value, best_solution = value, solution
+                        instrumentation.incumbent(value)
+                    upper_bound = min(upper_bound, value - 1)
+                elif answer[0] == "unsat":
+                    lower_bound = max(lower_bound, bound + 1)
+                else:
+                    # the probe ran out of time
+                    unknown = True
+            if unknown:
+                break
+
+            # kill the probes of bounds already known to be feasible or infeasible
+            for connection in [c for c, (bound, _, _) in running.items() if bound < lower_bound or bound > upper_bound]:
+                stop(connection)
+    finally:
+        for connection in list(running):
+            stop(connection)
+
+    return (best_value, best_solution, lower_bound > upper_bound)
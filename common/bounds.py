@@ -0,0 +1,253 @@
+import os
+import time
+
+import numpy as np
+
+from . import instrumentation
+
+
+# rounds of the local search of the heuristic solution, each one moving an item out of the longest route
+HEURISTIC_MAX_ROUNDS = 1000
+
+# share of the timeout of a model that the improvement of the heuristic solution may take: 2-opt alone is O(k^3) per
+# pass on a route of k items, so on large instances the routes are left as they are when it runs out
+HEURISTIC_TIME_SHARE = 0.1
+
+# wether to seed the bounds with the best known solutions and proven lower bounds of the results database
+# (see results_db.py), so that runs stop as soon as they match a known optimum
+USE_REGISTRY = os.environ.get("MCP_REGISTRY") == "1"
+
+
+def max_items_per_courier(m, n, l, s, implied_constraint=True):
+    """Computes an upper bound on the number of items delivered by a single courier: the most of the smallest items that
+    fit in the largest capacity, and at most n-m+1 if every courier delivers at least one item
+
+    Args:
+        m (int): number of couriers
+        n (int): number of items
+        l (list[int]): l[i] represents the maximum load of courier i
+        s (list[int]): s[j] represents the size of item j
+        implied_constraint (bool, optional): wether every courier delivers at least one item (default=True)
+
+    Returns:
+        int: the maximum number of items of a route
+    """
+    k = int(np.searchsorted(np.cumsum(np.sort(s)), max(l), side="right"))
+    if implied_constraint:
+        k = min(k, n - m + 1)
+    return k
+
+
+def trivial_bounds(D, max_items):
+    """Computes the bounds on the objective used by all the models: a courier travels at least the round trip to the
+    farthest item, and at most max_items - 1 of the longest arcs between items, plus the longest arcs leaving and
+    reaching the origin
+
+    Args:
+        D (list[list[int]]): (n+1)x(n+1) distance matrix, the origin being the last row/column
+        max_items (int): maximum number of items of a route, see max_items_per_courier
+
+    Returns:
+        (int, int): the lower and upper bounds on the objective
+    """
+    D = np.asarray(D)
+    n = D.shape[0] - 1
+    lower_bound = int((D[n, :n] + D[:n, n]).max())
+    max_distances = np.sort(D[:n, :n].max(axis=1))
+    upper_bound = int(max_distances[n - max_items + 1:].sum() + D[n].max() + D[:n, n].max())
+    return (lower_bound, upper_bound)
+
+
+def assignment_lower_bound(m, l, s, D):
+    """Computes a lower bound on the objective from the total distance travelled: every item is reached by an arc at
+    least as long as its shortest incoming arc, every courier needed to carry all the items (at least as many as the
+    largest capacities covering their total size) reaches the origin by an arc at least as long as the shortest one,
+    and symmetrically for the arcs leaving. The longest route is at least the m-th part of the total
+
+    Args:
+        m (int): number of couriers
+        l (list[int]): l[i] represents the maximum load of courier i
+        s (list[int]): s[j] represents the size of item j
+        D (list[list[int]]): (n+1)x(n+1) distance matrix, the origin being the last row/column
+
+    Returns:
+        int: the lower bound on the objective
+    """
+    D = np.asarray(D)
+    n = D.shape[0] - 1
+    couriers = min(int(np.searchsorted(np.cumsum(np.sort(l)[::-1]), sum(s))) + 1, m)
+    # self loops are never travelled
+    arcs = D + np.diag(np.full(n + 1, D.max() + 1))
+    incoming = arcs[:, :n].min(axis=0).sum() + couriers * D[:n, n].min()
+    outgoing = arcs[:n, :].min(axis=1).sum() + couriers * D[n, :n].min()
+    return int(-(-max(incoming, outgoing) // m))
+
+
+def _route_length(route, D):
+    """Returns the length of Origin -> route -> Origin, route being a NumPy array of items (0-based)"""
+    origin = D.shape[0] - 1
+    if len(route) == 0:
+        return 0
+    return int(D[origin, route[0]] + D[route[:-1], route[1:]].sum() + D[route[-1], origin])
+
+
+def _insertion(route, j, D):
+    """Returns the cheapest position to insert item j in route, and the increase of its length"""
+    origin = D.shape[0] - 1
+    nodes = np.concatenate([[origin], route, [origin]])
+    increase = D[nodes[:-1], j] + D[j, nodes[1:]] - D[nodes[:-1], nodes[1:]]
+    position = int(increase.argmin())
+    return (position, int(increase[position]))
+
+
+def _expired(deadline):
+    return deadline is not None and time.time() >= deadline
+
+
+def _two_opt(route, D, deadline=None):
+    """Improves route by reversing segments (the distances may be asymmetric, so whole lengths are compared) and by
+    moving single items, until no move shortens it or the deadline (a timestamp, None for none) passes"""
+    length = _route_length(route, D)
+    improved = True
+    while improved:
+        improved = False
+        for a in range(len(route) - 1):
+            if _expired(deadline):
+                return (route, length)
+            for b in range(a + 2, len(route) + 1):
+                candidate = np.concatenate([route[:a], route[a:b][::-1], route[b:]])
+                candidate_length = _route_length(candidate, D)
+                if candidate_length < length:
+                    route, length, improved = candidate, candidate_length, True
+        for a in range(len(route)):
+            rest = np.delete(route, a)
+            position, increase = _insertion(rest, route[a], D)
+            if _route_length(rest, D) + increase < length:
+                route = np.insert(rest, position, route[a])
+                length, improved = _route_length(route, D), True
+    return (route, length)
+
+
+def heuristic_solution(m, n, l, s, D, deadline=None):
+    """Computes a feasible solution greedily: the items, largest first, are inserted in the cheapest position of the route
+    of the courier, among the ones they fit in, whose route stays the shortest. The routes are then improved with 2-opt,
+    and by moving items out of the longest route as long as it gets shorter, until the deadline
+
+    Args:
+        m (int): number of couriers
+        n (int): number of items
+        l (list[int]): l[i] represents the maximum load of courier i
+        s (list[int]): s[j] represents the size of item j
+        D (list[list[int]]): (n+1)x(n+1) distance matrix, the origin being the last row/column
+        deadline (float, optional): timestamp after which the routes are no longer improved (default=None, i.e. none)
+
+    Returns:
+        (int, list[list[int]]): the objective value and for each courier the items (1-based) in order of delivery,
+                                or None if the greedy assignment doesn't fit the items in the couriers
+    """
+    D = np.asarray(D)
+    load = np.zeros(m, dtype=int)
+    routes = [np.zeros(0, dtype=int) for _ in range(m)]
+    lengths = np.zeros(m, dtype=int)
+
+    # construction
+    for j in sorted(range(n), key=lambda j: (-s[j], -(D[n, j] + D[j, n]))):
+        best = None
+        for i in range(m):
+            if load[i] + s[j] > l[i]:
+                continue
+            position, increase = _insertion(routes[i], j, D)
+            if best is None or (lengths[i] + increase, increase) < best[0]:
+                best = ((lengths[i] + increase, increase), i, position)
+        if best is None:
+            return None
+        _, i, position = best
+        routes[i] = np.insert(routes[i], position, j)
+        lengths[i] = _route_length(routes[i], D)
+        load[i] += s[j]
+
+    for i in range(m):
+        routes[i], lengths[i] = _two_opt(routes[i], D, deadline)
+
+    # local search: move an item of the longest route to the route where it fits best, if both end up shorter than it
+    for _ in range(HEURISTIC_MAX_ROUNDS):
+        if _expired(deadline):
+            instrumentation.count("heuristic_cut_short", True)
+            break
+        longest = int(lengths.argmax())
+        best = None
+        for a in range(len(routes[longest])):
+            j = routes[longest][a]
+            rest = np.delete(routes[longest], a)
+            rest_length = _route_length(rest, D)
+            for i in range(m):
+                if i == longest or load[i] + s[j] > l[i]:
+                    continue
+                position, increase = _insertion(routes[i], j, D)
+                new_max = max(rest_length, lengths[i] + increase)
+                if new_max < lengths[longest] and (best is None or new_max < best[0]):
+                    best = (new_max, a, i, position)
+        if best is None:
+            break
+        _, a, i, position = best
+        j = routes[longest][a]
+        routes[longest] = np.delete(routes[longest], a)
+        routes[i] = np.insert(routes[i], position, j)
+        load[longest] -= s[j]
+        load[i] += s[j]
+        for k in [longest, i]:
+            routes[k], lengths[k] = _two_opt(routes[k], D, deadline)
+
+    return (int(lengths.max()), [(route + 1).tolist() for route in routes])
+
+
+def objective_bounds(m, n, l, s, D, implied_constraint=True, heuristic=True, registry=None, timeout=None):
+    """Computes the bounds on the objective shared by all the methods: the strongest of the lower bounds, and the
+    smallest between the trivial upper bound and the objective value of the heuristic solution. With the registry,
+    the best known solution of the instance is an incumbent too, and its proven lower bound (the optimum, if
+    confirmed) a lower bound, so that the models return a known optimum without searching. The lower bound computed
+    here is recorded as the "lower_bound" count and the one of the registry as "registry_lower_bound", so that the
+    results database never takes a seeded bound for a proof. Likewise the incumbent carries its source, which the
+    models record (see instrumentation.source) when they return it instead of a solution of their own
+
+    Args:
+        m (int): number of couriers
+        n (int): number of items
+        l (list[int]): l[i] represents the maximum load of courier i
+        s (list[int]): s[j] represents the size of item j
+        D (list[list[int]]): (n+1)x(n+1) distance matrix, the origin being the last row/column
+        implied_constraint (bool, optional): wether every courier delivers at least one item (default=True)
+        heuristic (bool, optional): wether or not to compute the heuristic solution (default=True)
+        registry (bool, optional): wether or not to use the best known solution of the results database (default=None,
+                                   i.e. USE_REGISTRY)
+        timeout (int, optional): timeout of the model in seconds, HEURISTIC_TIME_SHARE of which bounds the improvement of
+                                 the heuristic solution (default=None, i.e. no limit)
+
+    Returns:
+        (int, int, (int, list[list[int]], str)): the lower and upper bounds, and the best of the heuristic and known
+                                                 solutions with its source, "heuristic" or "registry" (None if none),
+                                                 which the models return if they find no better solution in time
+    """
+    lower_bound, upper_bound = trivial_bounds(D, max_items_per_courier(m, n, l, s, implied_constraint))
+    lower_bound = max(lower_bound, assignment_lower_bound(m, l, s, D))
+    instrumentation.count("lower_bound", lower_bound)
+    deadline = None if timeout is None else time.time() + HEURISTIC_TIME_SHARE * timeout
+    incumbent = heuristic_solution(m, n, l, s, D, deadline) if heuristic else None
+    if incumbent is not None:
+        incumbent = (*incumbent, "heuristic")
+    if USE_REGISTRY if registry is None else registry:
+        from .result_db import known_solution
+        known = known_solution(m, n, l, s, D)
+        if known is not None:
+            instrumentation.count("registry_obj", known["obj"])
+            instrumentation.count("registry_optimal", known["confirmed"])
+            if known["lower_bound"] is not None:
+                instrumentation.count("registry_lower_bound", known["lower_bound"])
+                lower_bound = max(lower_bound, known["lower_bound"])
+            if incumbent is None or known["obj"] < incumbent[0]:
+                incumbent = (known["obj"], known["sol"], "registry")
+    if incumbent is not None:
+        upper_bound = min(upper_bound, incumbent[0])
+        instrumentation.incumbent(incumbent[0])
+    instrumentation.count("upper_bound", upper_bound)
+    return (lower_bound, upper_bound, incumbent)
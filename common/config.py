@@ -0,0 +1,68 @@
+import os
+import json
+from contextlib import contextmanager
+
+
+# parameters of the solver of a model (e.g. "solver:smt.phase_selection") rather than of the model itself
+SOLVER_PREFIX = "solver:"
+
+_profiles = {}
+
+
+def load_profile(path=None):
+    """Loads a configuration profile, as written by tune.py: a JSON object mapping each method to the parameters of
+    its models, by model name ("*" for all the models of the method), e.g.
+    {"CP": {"Gecode_LNS": {"restart_scale": 50, "lns_rate": 80}}, "SAT": {"*": {"solver:smt.phase_selection": 3}}}
+
+    Args:
+        path (str, optional): path of the profile (default=None, i.e. $MCP_PROFILE, if set)
+
+    Returns:
+        dict: the profile, empty if there is none
+    """
+    path = path or os.environ.get("MCP_PROFILE")
+    if not path:
+        return {}
+    if path not in _profiles:
+        with open(path) as f:
+            _profiles[path] = json.load(f)
+    return _profiles[path]
+
+
+def model_parameters(method, model_name, path=None):
+    """Returns the parameters of a model in the configuration profile, overriding the defaults of its runner: the ones
+    given for all the models of its method, updated with the ones given for the model
+
+    Args:
+        method (str): method of the model, e.g. "SAT"
+        model_name (str): name of the model
+        path (str, optional): path of the profile (default=None, i.e. $MCP_PROFILE, if set)
+
+    Returns:
+        (dict, dict): the parameters of the model (keyword arguments or features, depending on the method), and the
+                      ones of its solver, without SOLVER_PREFIX
+    """
+    by_model = load_profile(path).get(method, {})
+    parameters = {**by_model.get("*", {}), **by_model.get(model_name, {})}
+    model = {name: value for name, value in parameters.items() if not name.startswith(SOLVER_PREFIX)}
+    solver = {name[len(SOLVER_PREFIX):]: value for name, value in parameters.items() if name.startswith(SOLVER_PREFIX)}
+    return (model, solver)
+
+
+@contextmanager
+def z3_parameters(parameters):
+    """Sets global z3 parameters within the context, restoring their previous values when leaving it, so that the
+    parameters of a model don't leak into the models run after it in the same process (i.e. when not sandboxed)
+
+    Args:
+        parameters (dict): values of the z3 parameters, by name
+    """
+    import z3
+    previous = {name: z3.get_param(name) for name in parameters}
+    try:
+        for name, value in parameters.items():
+            z3.set_param(name, value)
+        yield
+    finally:
+        for name, value in previous.items():
+            z3.set_param(name, value)
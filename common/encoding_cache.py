@@ -0,0 +1,77 @@
+import os
+import gzip
+import hashlib
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def cache_dir(*subdirs):
+    """Returns (creating it if needed) the directory of the on-disk caches, i.e. $MCP_CACHE_DIR or .cache in the project root
+
+    Args:
+        subdirs (str): subdirectories to append to the cache directory
+
+    Returns:
+        str: the path of the directory
+    """
+    path = os.path.join(os.environ.get("MCP_CACHE_DIR", os.path.join(PROJECT_ROOT, ".cache")), *subdirs)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def encoding_key(model_name, sources, *data):
+    """Returns the key identifying the encoding of an instance by a model variant
+
+    Args:
+        model_name (str): name of the model building the encoding
+        sources (list[str]): paths of the source files defining the encoding, so that changing them invalidates the cache
+        data: anything else the encoding depends on (instance parameters, flags), with a deterministic repr
+
+    Returns:
+        str: the hex digest of the key
+    """
+    # imported here, so that the CP models can use cache_dir without loading z3
+    import z3
+
+    h = hashlib.sha1()
+    h.update(model_name.encode())
+    h.update(z3.get_version_string().encode())
+    for source in sources:
+        with open(source, "rb") as f:
+            h.update(f.read())
+    h.update(repr(data).encode())
+    return h.hexdigest()
+
+
+def load_encoding(solver, key):
+    """Loads into solver the cached assertions with the given key
+
+    Args:
+        solver (Solver): the solver to add the assertions to
+        key (str): key of the encoding, as returned by encoding_key
+
+    Returns:
+        bool: true iff the encoding was cached and has been loaded
+    """
+    path = os.path.join(cache_dir("encodings"), f"{key}.smt2.gz")
+    if not os.path.exists(path):
+        return False
+    with gzip.open(path, "rt") as f:
+        solver.from_string(f.read())
+    return True
+
+
+def store_encoding(solver, key):
+    """Stores the assertions of solver in the cache as gzipped SMT-LIB2 under the given key
+
+    Args:
+        solver (Solver): the solver whose assertions to store
+        key (str): key of the encoding, as returned by encoding_key
+    """
+    path = os.path.join(cache_dir("encodings"), f"{key}.smt2.gz")
+    # write to a temporary file first, so that concurrent runs never read a partial encoding
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp_path, "wt") as f:
+        f.write(solver.sexpr())
+    os.replace(tmp_path, path)
@@ -0,0 +1,82 @@
+import re
+
+import numpy as np
+
+
+def read_instance(file):
+    """Reads an instance of the Multiple Couriers Planning problem from a .dat file
+
+    Args:
+        file (str): path of the .dat file representing the instance
+
+    Returns:
+        (int, int, list[int], list[int], list[list[int]]): number of couriers m, number of items n,
+            load capacities l, item sizes s and (n+1)x(n+1) distance matrix D
+    """
+    with open(file) as f:
+        m = int(next(f))
+        n = int(next(f))
+        l = [int(e) for e in next(f).split()]
+        s = [int(e) for e in next(f).split()]
+        D = np.genfromtxt(f, dtype=int).tolist()
+
+    return m, n, l, s, D
+
+
+def read_dzn(file):
+    """Reads an instance of the Multiple Couriers Planning problem from a MiniZinc .dzn file
+
+    Args:
+        file (str): path of the .dzn file representing the instance
+
+    Returns:
+        (int, int, list[int], list[int], list[list[int]]): number of couriers m, number of items n,
+            load capacities l, item sizes s and (n+1)x(n+1) distance matrix D
+    """
+    with open(file) as f:
+        # strip comments
+        text = re.sub("%.*", "", f.read())
+
+    m = int(re.search(r"\bm\s*=\s*(\d+)\s*;", text).group(1))
+    n = int(re.search(r"\bn\s*=\s*(\d+)\s*;", text).group(1))
+    l = [int(e) for e in re.search(r"\bl\s*=\s*\[([^\]]*)\]", text).group(1).split(",") if e.strip()]
+    s = [int(e) for e in re.search(r"\bs\s*=\s*\[([^\]]*)\]", text).group(1).split(",") if e.strip()]
+    rows = re.search(r"\bD\s*=\s*\[\|(.*?)\|\]", text, re.DOTALL).group(1).split("|")
+    D = [[int(e) for e in row.split(",") if e.strip()] for row in rows if row.strip()]
+
+    return m, n, l, s, D
+
+
+def write_dat(file, m, n, l, s, D):
+    """Writes an instance of the Multiple Couriers Planning problem in the .dat format read by read_instance
+
+    Args:
+        file (str): path of the .dat file
+        m (int): number of couriers
+        n (int): number of items
+        l (list[int]): load capacities
+        s (list[int]): item sizes
+        D (iterable[list[int]]): the rows of the (n+1)x(n+1) distance matrix, e.g. a generator of them for large instances
+    """
+    with open(file, "w") as f:
+        f.write(f"{m}\n{n}\n{' '.join(map(str, l))}\n{' '.join(map(str, s))}\n")
+        for row in D:
+            f.write(" ".join(map(str, np.asarray(row).tolist())) + " \n")
+
+
+def write_dzn(file, m, n, l, s, D):
+    """Writes an instance of the Multiple Couriers Planning problem in the MiniZinc .dzn format read by read_dzn
+
+    Args:
+        file (str): path of the .dzn file
+        m (int): number of couriers
+        n (int): number of items
+        l (list[int]): load capacities
+        s (list[int]): item sizes
+        D (iterable[list[int]]): the rows of the (n+1)x(n+1) distance matrix, e.g. a generator of them for large instances
+    """
+    with open(file, "w") as f:
+        f.write(f"m = {m};\nl = [{', '.join(map(str, l))}];\n\nn = {n};\ns = [{', '.join(map(str, s))}];\n\nD =[")
+        for row in D:
+            f.write("| " + ", ".join(map(str, np.asarray(row).tolist())) + "\n\t")
+        f.write("|];\n")
@@ -0,0 +1,216 @@
+import time
+import resource
+from contextlib import contextmanager
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size in MB of the process or of its terminated solver subprocesses (e.g. minizinc),
+    whichever is larger. Every model runs in its own sandboxed process, so this is the peak memory of the model"""
+    # ru_maxrss is in KB on Linux
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak / 1024, 1)
+
+
+# statistics of the z3 solvers that are not counts of the search/encoding
+IGNORED_STATISTICS = ["num allocs", "rlimit count", "max memory", "memory", "time"]
+
+
+class Recorder:
+    """Collects what happens during the run of a single model, with the same surface for every method:
+    - phases: consecutive named phases (parse, encode, solve, readout), with their duration
+    - solver calls: duration of every call to a solver
+    - counts: sizes of the encoding (variables, clauses, constraints) and solver statistics
+    - incumbents: the incumbent solutions found over time
+    - events: timestamps of named events
+    - memory: the peak RSS (MB) reached by the end of each phase, e.g. to tell encodings running out of memory
+      before the search starts
+    - source: where the result comes from when the model returns a solution it didn't find itself, i.e. the
+      incumbent of objective_bounds ("heuristic" or "registry"), None for the solutions of the model
+    Times are in seconds since the recorder started
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.current_phase = None
+        self.solver_calls = []
+        self.counts = {}
+        self.incumbents = []
+        self.events = {}
+        self.memory = {}
+        self.source = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def begin(self, phase):
+        """Ends the current phase (if any) and begins the given one"""
+        self.end()
+        self.current_phase = (phase, time.perf_counter())
+
+    def end(self):
+        """Ends the current phase (if any)"""
+        if self.current_phase is not None:
+            phase, start = self.current_phase
+            self.add_time(phase, time.perf_counter() - start)
+            self.memory[phase] = peak_rss_mb()
+            self.current_phase = None
+
+    def add_time(self, phase, seconds):
+        """Adds seconds to the duration of phase, e.g. for the phases timed by the solvers themselves"""
+        self.phases[phase] = round(self.phases.get(phase, 0) + seconds, 3)
+
+    def solver_call(self, seconds):
+        self.solver_calls.append(round(seconds, 3))
+
+    def count(self, name, value):
+        self.counts[name] = value
+
+    def incumbent(self, obj):
+        """Records a new incumbent solution of objective value obj"""
+        self.incumbents.append((round(self.elapsed(), 3), int(obj)))
+
+    def mark(self, event):
+        """Records the time of the first occurrence of event"""
+        self.events.setdefault(event, round(self.elapsed(), 3))
+
+    def to_dict(self):
+        self.end()
+        return {"phases": self.phases,
+                "solver_calls": {"count": len(self.solver_calls), "total": round(sum(self.solver_calls), 3),
+                                 "max": max(self.solver_calls, default=0), "durations": self.solver_calls},
+                "counts": self.counts,
+                "incumbents": self.incumbents,
+                "events": self.events,
+                "memory": self.memory,
+                "peak_rss_mb": peak_rss_mb()}
+
+
+# the recorder of the model currently running, if any. The models report to it through the module level
+# functions below, which do nothing when nothing is being recorded
+_active = None
+
+# function called with the objective value of every incumbent recorded, e.g. to stream them to a client of serve.py
+_incumbent_listener = None
+
+
+def start_recording():
+    """Starts recording the run of a model, replacing any active recorder
+
+    Returns:
+        Recorder: the active recorder
+    """
+    global _active
+    _active = Recorder()
+    return _active
+
+
+def stop_recording():
+    """Stops recording
+
+    Returns:
+        Recorder: the recorder that was active, or None
+    """
+    global _active
+    recorder, _active = _active, None
+    if recorder is not None:
+        recorder.end()
+    return recorder
+
+
+@contextmanager
+def recording():
+    """Records the run of a model within the context, restoring the previously active recorder at its end
+
+    Yields:
+        Recorder: the active recorder
+    """
+    global _active
+    previous = _active
+    recorder = start_recording()
+    try:
+        yield recorder
+    finally:
+        recorder.end()
+        _active = previous
+
+
+def begin(phase):
+    if _active is not None:
+        _active.begin(phase)
+
+
+def end():
+    if _active is not None:
+        _active.end()
+
+
+def add_time(phase, seconds):
+    if _active is not None:
+        _active.add_time(phase, seconds)
+
+
+def solver_call(seconds):
+    if _active is not None:
+        _active.solver_call(seconds)
+
+
+def count(name, value):
+    if _active is not None:
+        _active.count(name, value)
+
+
+def incumbent(obj):
+    if _active is not None:
+        _active.incumbent(obj)
+        if _incumbent_listener is not None:
+            _incumbent_listener(int(obj))
+
+
+def source(name):
+    """Records that the result of the model is not its own solution but the incumbent it was given, see Recorder"""
+    if _active is not None:
+        _active.source = name
+
+
+def listen_incumbents(function):
+    """Calls function(obj) at every incumbent recorded from now on, also in the sandboxed processes forked afterwards
+
+    Args:
+        function (function): function of the objective value of the incumbent, None to stop listening
+    """
+    global _incumbent_listener
+    _incumbent_listener = function
+
+
+def mark(event):
+    if _active is not None:
+        _active.mark(event)
+
+
+def check(solver, *assumptions):
+    """Calls solver.check(*assumptions), recording the duration of the call
+
+    Returns:
+        CheckSatResult: the result of the call
+    """
+    start = time.perf_counter()
+    result = solver.check(*assumptions)
+    if _active is not None:
+        _active.solver_call(time.perf_counter() - start)
+    return result
+
+
+def statistics(solver, prefix=""):
+    """Records the statistics of a z3 solver (conflicts, decisions, propagations, variables and clauses created...)
+
+    Args:
+        solver (Solver): the solver
+        prefix (str, optional): prefix of the names of the counts, to tell apart the solvers of a model (default="")
+    """
+    if _active is None:
+        return
+    stats = solver.statistics()
+    for key in stats.keys():
+        if key not in IGNORED_STATISTICS:
+            _active.count(prefix + key, stats.get_key_value(key))
@@ -0,0 +1,54 @@
+import numpy as np
+
+
+def infeasible_assignments(l, s):
+    """Computes the item-courier pairs that can't be part of any solution, i.e. the item doesn't fit in the courier
+
+    Args:
+        l (list[int]): l[i] represents the maximum load of courier i
+        s (list[int]): s[j] represents the size of item j
+
+    Returns:
+        list[list[bool]]: m x n matrix, True in position [i][j] iff courier i can't deliver item j
+    """
+    return (np.asarray(s)[None, :] > np.asarray(l)[:, None]).tolist()
+
+
+def infeasible_arcs(D, upper_bound):
+    """Computes the arcs that can't be travelled in any route of length at most upper_bound. Since the distances are
+    quasimetric, the shortest route travelling the arc (j, k) is Origin -> j -> k -> Origin
+
+    Args:
+        D (list[list[int]]): (n+1)x(n+1) distance matrix, the origin being the last row/column
+        upper_bound (int): upper bound on the length of every route
+
+    Returns:
+        list[list[bool]]: (n+1)x(n+1) matrix, True in position [j][k] iff the arc j -> k can't be travelled.
+                          The diagonal is always False, self loops are left to the models
+    """
+    D = np.asarray(D)
+    n = D.shape[0] - 1
+    shortest_tour = D[n, :][:, None] + D + D[:, n][None, :]
+    infeasible = shortest_tour > upper_bound
+    np.fill_diagonal(infeasible, False)
+    return infeasible.tolist()
+
+
+def infeasible_routes(l, s, D, upper_bound):
+    """Computes for each courier the arcs it can't travel, either because they can't be part of a route of length at most
+    upper_bound or because they leave/reach an item that doesn't fit in the courier
+
+    Args:
+        l (list[int]): l[i] represents the maximum load of courier i
+        s (list[int]): s[j] represents the size of item j
+        D (list[list[int]]): (n+1)x(n+1) distance matrix, the origin being the last row/column
+        upper_bound (int): upper bound on the length of every route
+
+    Returns:
+        list[list[list[bool]]]: m x (n+1) x (n+1) tensor, True in position [i][j][k] iff courier i can't travel the arc j -> k
+    """
+    assignments = np.asarray(infeasible_assignments(l, s), dtype=bool)
+    # the origin is always reachable
+    nodes = np.concatenate([assignments, np.zeros((len(l), 1), dtype=bool)], axis=1)
+    arcs = np.asarray(infeasible_arcs(D, upper_bound), dtype=bool)
+    return (arcs[None, :, :] | nodes[:, :, None] | nodes[:, None, :]).tolist()
@@ -0,0 +1,79 @@
+import numpy as np
+from z3 import is_true, is_false, is_int_value
+
+
+def _flatten(variables):
+    """Returns the shape of the nested lists variables and their elements in row-major order"""
+    shape = []
+    level = variables
+    while isinstance(level, (list, tuple)):
+        shape.append(len(level))
+        if len(level) == 0:
+            break
+        level = level[0]
+    flat = variables
+    for _ in range(len(shape) - 1):
+        flat = [e for row in flat for e in row]
+    return tuple(shape), flat
+
+
+def _constant_value(e):
+    """Returns the python value of the z3 constant e (None if unassigned, i.e. don't care), or raises if e is symbolic"""
+    if e is None or is_false(e):
+        return 0
+    if is_true(e):
+        return 1
+    if is_int_value(e):
+        return e.as_long()
+    raise ValueError(f"{e} is not a constant")
+
+
+class VariableArray:
+    """Fixed tensor of Z3 variables, read from the models of a solver into NumPy arrays of the same shape.
+    The variables are flattened once, so that each readout only queries the model for the interpretation
+    of each variable's declaration; constants (e.g. variables fixed by preprocessing) are never queried
+
+    Args:
+        variables (n-dim list[ExprRef]): the Bool/Int variables or constants, can be of arbitrary dimension
+        dtype (type, optional): type of the returned arrays, bool for Bool variables and int for Int ones (default=bool)
+    """
+
+    def __init__(self, variables, dtype=bool):
+        self.shape, flat = _flatten(variables)
+        self.values = np.zeros(len(flat), dtype=dtype)
+        positions = []
+        self.decls = []
+        for k, v in enumerate(flat):
+            if is_true(v) or is_false(v) or is_int_value(v):
+                self.values[k] = _constant_value(v)
+            else:
+                positions.append(k)
+                self.decls.append(v.decl())
+        self.positions = np.asarray(positions, dtype=int)
+
+    def read(self, model):
+        """Returns the values of the variables in model
+
+        Args:
+            model (ModelRef): the model to read
+
+        Returns:
+            np.ndarray: array of the shape of the variables with their values, unassigned variables being 0/False
+        """
+        values = self.values.copy()
+        if len(self.decls) > 0:
+            values[self.positions] = [_constant_value(model.get_interp(d)) for d in self.decls]
+        return values.reshape(self.shape)
+
+
+def binary_to_int(bits):
+    """Converts binary numbers (most significant bit first) along the last axis of bits into integers
+
+    Args:
+        bits (np.ndarray): array of bits, the last axis being the digits of the numbers
+
+    Returns:
+        np.ndarray: the integers, with the shape of bits without its last axis
+    """
+    digits = bits.shape[-1]
+    return bits.astype(np.int64) @ (np.int64(1) << np.arange(digits - 1, -1, -1, dtype=np.int64))
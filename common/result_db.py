@@ -0,0 +1,310 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+
+from .instance import read_instance
+from .results import format_result, write_atomic
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# the database of the results, shared by all the methods
+DB_PATH = os.environ.get("MCP_RESULTS_DB", os.path.join(PROJECT_ROOT, "results.sqlite"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    instance INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    model TEXT NOT NULL,
+    position INTEGER,           -- position of the model in the res/ file
+    time INTEGER,
+    optimal INTEGER,
+    obj INTEGER,                -- NULL if no solution was found
+    status TEXT,                -- the status of the sandbox (timeout, oom, error), NULL if the model returned
+    lower_bound INTEGER,
+    upper_bound INTEGER,
+    incumbents TEXT,            -- JSON list of [time, objective value]
+    valid INTEGER,              -- wether the solution is feasible with the objective value given, NULL if no solution
+    errors TEXT,                -- JSON list of the errors of an invalid solution
+    entry TEXT NOT NULL,        -- the whole result entry as JSON, to regenerate the res/ files
+    ingested REAL,
+    source TEXT,                -- "heuristic" or "registry" if the model returned the incumbent it was given, NULL if its own
+    PRIMARY KEY (instance, method, model)
+);
+CREATE INDEX IF NOT EXISTS results_by_method ON results (method, model, instance);
+CREATE INDEX IF NOT EXISTS results_by_obj ON results (instance, obj);
+CREATE TABLE IF NOT EXISTS instances (
+    instance INTEGER PRIMARY KEY,
+    key TEXT NOT NULL           -- see instance_key
+);
+CREATE INDEX IF NOT EXISTS instances_by_key ON instances (key);
+"""
+
+
+def connect(path=DB_PATH):
+    """Opens (creating it if needed) the database of the results
+
+    Args:
+        path (str, optional): path of the SQLite file (default=DB_PATH, i.e. $MCP_RESULTS_DB or results.sqlite in the project root)
+
+    Returns:
+        sqlite3.Connection: the connection, whose rows can be accessed by column name
+    """
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    db.executescript(SCHEMA)
+    # databases created before the source column
+    if "source" not in [row["name"] for row in db.execute("PRAGMA table_info(results)")]:
+        db.execute("ALTER TABLE results ADD COLUMN source TEXT")
+    return db
+
+
+def instance_key(m, n, l, s, D):
+    """Returns a hash identifying the data of an instance, so that the models, which don't know the instance number,
+    can look up its results
+
+    Returns:
+        str: the hex digest identifying the instance
+    """
+    h = hashlib.sha1(json.dumps([m, n, list(l), list(s)]).encode())
+    for row in D:
+        h.update(" ".join(str(int(e)) for e in row).encode())
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def solution_errors(m, n, l, s, D, solution, obj):
+    """Checks a solution the way check_res_correctness.py does
+
+    Args:
+        m (int): number of couriers
+        n (int): number of items
+        l (list[int]): load capacities
+        s (list[int]): item sizes
+        D (list[list[int]]): (n+1)x(n+1) distance matrix
+        solution (list[list[int]]): for each courier the items (1-based) in order of delivery
+        obj (int): the objective value claimed
+
+    Returns:
+        list[str]: the errors, empty if the solution is valid
+    """
+    errors = []
+    if len(solution) != m:
+        errors.append(f"solution has {len(solution)} routes instead of {m}")
+    items = sorted(j for route in solution for j in route)
+    if items != list(range(1, n + 1)):
+        errors.append(f"solution delivers items {items} instead of each of 1..{n} once")
+        return errors
+    longest = 0
+    for i, route in enumerate(solution):
+        load = sum(s[j - 1] for j in route)
+        if i < m and load > l[i]:
+            errors.append(f"route {route} of courier {i} has total size {load}, exceeding its capacity {l[i]}")
+        nodes = [n] + [j - 1 for j in route] + [n]
+        longest = max(longest, sum(D[a][b] for a, b in zip(nodes, nodes[1:])))
+    if longest != obj:
+        errors.append(f"objective value {obj} inconsistent with max. distance {longest}")
+    return errors
+
+
+def ingest_entry(db, instance, method, model, entry, position=None, data=None):
+    """Stores (replacing it) the result entry of a model on an instance. The entry of a model returning the incumbent
+    it was given (see common/bounds.py) instead of a solution of its own has its "source", "heuristic" or "registry"
+
+    Args:
+        db (sqlite3.Connection): the database
+        instance (int): instance number
+        method (str): method of the model, e.g. "SAT"
+        model (str): name of the model
+        entry (dict): the result entry
+        position (int, optional): position of the model in the res/ file (default=None)
+        data (tuple, optional): (m, n, l, s, D) of the instance, to validate the solution (default=None, i.e. not validated)
+    """
+    obj = entry.get("obj")
+    obj = obj if isinstance(obj, int) else None
+    stats = entry.get("stats", {})
+    counts = stats.get("counts", {})
+    valid, errors = None, None
+    if obj is not None and data is not None:
+        errors = solution_errors(*data, entry.get("sol", []), obj)
+        valid = not errors
+    db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+               (instance, method, model, position, entry.get("time"), int(bool(entry.get("optimal"))), obj,
+                entry.get("status"), counts.get("lower_bound"), counts.get("upper_bound"),
+                json.dumps(stats.get("incumbents", [])), valid, None if errors is None else json.dumps(errors),
+                json.dumps(entry), time.time(), entry.get("source")))
+
+
+def ingest_res(db, res_dir="res", instances_dir="instances_dat"):
+    """Stores the result entries of the res/<METHOD>/<n>.json files, validating their solutions against the instances
+
+    Args:
+        db (sqlite3.Connection): the database
+        res_dir (str, optional): directory of the results, with a subdirectory per method (default="res")
+        instances_dir (str, optional): directory of the instNN.dat files (default="instances_dat")
+
+    Returns:
+        int: the number of entries stored
+    """
+    count = 0
+    for method in sorted(os.listdir(res_dir)):
+        method_dir = os.path.join(res_dir, method)
+        if method.startswith(".") or not os.path.isdir(method_dir):
+            continue
+        for file in sorted(os.listdir(method_dir)):
+            match = re.fullmatch(r"(\d+)\.json", file)
+            if match is None:
+                continue
+            instance = int(match.group(1))
+            instance_file = os.path.join(instances_dir, f"inst{instance:02d}.dat")
+            data = read_instance(instance_file) if os.path.exists(instance_file) else None
+            if data is not None:
+                db.execute("INSERT OR REPLACE INTO instances VALUES (?, ?)", (instance, instance_key(*data)))
+            with open(os.path.join(method_dir, file)) as f:
+                results = json.load(f)
+            for position, (model, entry) in enumerate(results.items()):
+                ingest_entry(db, instance, method, model, entry, position, data)
+                count += 1
+    db.commit()
+    return count
+
+
+def best_known(db, instances=None):
+    """Returns the best known solution of each instance among the valid ones, preferring the ones found by the models
+to the heuristic or known solutions they returned (see ingest_entry), whose optimal flags are not claims of the models
+
+    Args:
+        db (sqlite3.Connection): the database
+        instances (list[int], optional): the instances (default=None, i.e. all of them)
+
+    Returns:
+        dict[int, dict]: for each instance its best known objective value "obj", wether a model proved it optimal
+                         "optimal", a "method" and "model" finding it, its solution "sol", the largest lower bound
+                         computed by the models "proven_lower_bound", the methods claiming its optimality
+                         "optimal_methods", wether its optimality is "confirmed" (see optima), the largest lower
+                         bound "lower_bound", i.e. obj if confirmed, and the "source" of the solution, None if a
+                         model found it
+    """
+    rows = db.execute("SELECT instance, method, model, obj, optimal, entry, lower_bound, source FROM results WHERE obj IS NOT NULL "
+                      "AND valid IS NOT 0 ORDER BY instance, obj, source IS NOT NULL, optimal DESC, time").fetchall()
+    best = {}
+    for row in rows:
+        if instances is not None and row["instance"] not in instances:
+            continue
+        # the optimal flag of a returned incumbent is no claim of the model: a heuristic solution meeting the lower
+        # bound is confirmed by it below, and a known one proves nothing
+        optimal = bool(row["optimal"]) and row["source"] is None
+        if row["instance"] not in best:
+            best[row["instance"]] = {"obj": row["obj"], "optimal": optimal, "method": row["method"],
+                                     "model": row["model"], "sol": json.loads(row["entry"]).get("sol", []),
+                                     "proven_lower_bound": row["lower_bound"],
+                                     "optimal_methods": [row["method"]] if optimal else [], "source": row["source"]}
+        else:
+            known = best[row["instance"]]
+            if row["obj"] == known["obj"] and optimal:
+                known["optimal"] = True
+                if row["method"] not in known["optimal_methods"]:
+                    known["optimal_methods"].append(row["method"])
+            if row["lower_bound"] is not None:
+                known["proven_lower_bound"] = max(known["proven_lower_bound"] or 0, row["lower_bound"])
+    for known in best.values():
+        # the optimal flags are reported by the models themselves, so a single one is not trusted
+        known["confirmed"] = known["optimal"] and (known["proven_lower_bound"] == known["obj"]
+                                                   or len(known["optimal_methods"]) >= 2)
+        known["lower_bound"] = known["obj"] if known["confirmed"] else known["proven_lower_bound"]
+    return best
+
+
+def optima(db):
+    """Returns the optimal objective value of the instances solved to optimality by some model, only if confirmed by
+    a lower bound computed by the models or by the models of at least two methods, since the optimal flags are
+    reported by the models themselves
+
+    Returns:
+        dict[int, int]: instance -> optimal value
+    """
+    return {instance: known["obj"] for instance, known in best_known(db).items() if known["confirmed"]}
+
+
+def gaps(db, method=None, model=None):
+    """Returns the gap of each result to the best known solution of its instance, (obj - best) / best
+
+    Args:
+        db (sqlite3.Connection): the database
+        method (str, optional): only the results of this method (default=None, i.e. all)
+        model (str, optional): only the results of this model (default=None, i.e. all)
+
+    Returns:
+        list[dict]: instance, method, model, obj, best, gap (None without a solution) and source (see ingest_entry)
+                    of each result
+    """
+    best = best_known(db)
+    query = "SELECT instance, method, model, obj, optimal, valid, source FROM results WHERE 1"
+    arguments = []
+    for column, value in [("method", method), ("model", model)]:
+        if value is not None:
+            query += f" AND {column} = ?"
+            arguments.append(value)
+    rows = []
+    for row in db.execute(query + " ORDER BY instance, method, position", arguments):
+        target = best.get(row["instance"], {}).get("obj")
+        gap = None
+        if row["obj"] is not None and target:
+            gap = round((row["obj"] - target) / target, 4)
+        rows.append({"instance": row["instance"], "method": row["method"], "model": row["model"], "obj": row["obj"],
+                     "optimal": bool(row["optimal"]), "valid": row["valid"], "best": target, "gap": gap,
+                     "source": row["source"]})
+    return rows
+
+
+def export_res(db, res_dir="res"):
+    """Regenerates the res/<METHOD>/<n>.json files from the database, with the models in their original order
+
+    Args:
+        db (sqlite3.Connection): the database
+        res_dir (str, optional): directory of the results (default="res")
+
+    Returns:
+        list[str]: the paths of the files written
+    """
+    files = {}
+    for row in db.execute("SELECT instance, method, model, entry FROM results ORDER BY method, instance, position"):
+        files.setdefault((row["method"], row["instance"]), {})[row["model"]] = json.loads(row["entry"])
+    paths = []
+    for (method, instance), results in files.items():
+        os.makedirs(os.path.join(res_dir, method), exist_ok=True)
+        path = os.path.join(res_dir, method, f"{instance}.json")
+        write_atomic(path, format_result(results))
+        paths.append(path)
+    return paths
+
+
+def known_solution(m, n, l, s, D, db=None):
+    """Returns the best known solution of an instance, found by its data, if it is valid for it
+
+    Args:
+        m (int): number of couriers
+        n (int): number of items
+        l (list[int]): load capacities
+        s (list[int]): item sizes
+        D (list[list[int]]): (n+1)x(n+1) distance matrix
+        db (sqlite3.Connection, optional): the database (default=None, i.e. the one at DB_PATH, if it exists)
+
+    Returns:
+        dict: the best known solution as returned by best_known, None if the instance has no valid known solution
+    """
+    if db is None:
+        if not os.path.exists(DB_PATH):
+            return None
+        db = connect(DB_PATH)
+    row = db.execute("SELECT instance FROM instances WHERE key = ?", (instance_key(m, n, l, s, D),)).fetchone()
+    if row is None:
+        return None
+    known = best_known(db, [row["instance"]]).get(row["instance"])
+    # checked again, in case the instance file changed since the results were ingested
+    if known is None or solution_errors(m, n, l, s, D, known["sol"], known["obj"]):
+        return None
+    return known
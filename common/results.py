@@ -0,0 +1,70 @@
+import os
+import json
+import tempfile
+
+
+def format_result(value, indent=4, level=0):
+    """Formats a result dictionary as JSON the way the res/ files are written: objects one key per line, arrays
+    (e.g. the solutions) on a single line
+
+    Args:
+        value (object): the JSON-serializable value
+        indent (int, optional): spaces of indentation of each level (default=4)
+        level (int, optional): level of value in the whole document (default=0)
+
+    Returns:
+        str: the JSON text
+    """
+    if not isinstance(value, dict) or not value:
+        return json.dumps(value)
+    inner = " " * (indent * (level + 1))
+    items = [f"{inner}{json.dumps(str(key))}: {format_result(item, indent, level + 1)}" for key, item in value.items()]
+    return "{\n" + ",\n".join(items) + "\n" + " " * (indent * level) + "}"
+
+
+def write_atomic(path, text):
+    """Writes text to path atomically: to a temporary file in the same directory, renamed over path once complete,
+    so that readers (and a crash) never see a truncated file
+
+    Args:
+        path (str): path of the file
+        text (str): its content
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=os.path.basename(path))
+    try:
+        # mkstemp creates the file readable by the owner only, unlike open
+        umask = os.umask(0)
+        os.umask(umask)
+        os.fchmod(fd, 0o666 & ~umask)
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+class ResultStore:
+    """Result file of a method on an instance (res/<METHOD>/<n>.json), rewritten atomically with all the entries
+    so far as soon as each model finishes, e.g. passed as on_result to the runners. The entries already in the file
+    are kept, those of the models run again being replaced, so that neither a crash of the run nor a run of some of
+    the models loses the previous results
+
+    Args:
+        path (str): path of the JSON file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def add(self, model_name, entry):
+        """Stores the result entry of a model"""
+        self.entries[model_name] = entry
+        write_atomic(self.path, format_result(self.entries))
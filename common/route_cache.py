@@ -0,0 +1,110 @@
+import hashlib
+import sqlite3
+from collections import OrderedDict
+
+
+def instance_hash(D):
+    """Returns a hash identifying the distance matrix D, the only data the length of a route depends on
+
+    Args:
+        D (list[list[int]]): (n+1)x(n+1) distance matrix
+
+    Returns:
+        str: the hex digest identifying D
+    """
+    h = hashlib.sha1()
+    for row in D:
+        h.update(" ".join(str(int(e)) for e in row).encode())
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+class RouteCache:
+    """Bounded LRU cache of the best known route of each set of items of an instance, optionally backed by
+    an SQLite file shared between runs. Entries are (length, route, optimal) tuples, keyed by frozenset of
+    0-based items, so that the cache can be used as the memo of common.tsp.solve_routes
+
+    Args:
+        D (list[list[int]]): (n+1)x(n+1) distance matrix, the origin being the last row/column
+        capacity (int, optional): maximum number of entries kept in memory (default=100000)
+        path (str, optional): path of the SQLite file storing the entries on disk (default=None, i.e. memory only)
+    """
+
+    def __init__(self, D, capacity=100000, path=None):
+        self.D = D
+        self.capacity = capacity
+        self.instance = instance_hash(D)
+        self.entries = OrderedDict()
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path)
+            self.db.execute("CREATE TABLE IF NOT EXISTS routes (instance TEXT, items TEXT, length INTEGER, "
+                            "route TEXT, optimal INTEGER, PRIMARY KEY (instance, items))")
+
+    @staticmethod
+    def _items_key(items):
+        return ",".join(str(j) for j in sorted(items))
+
+    def get(self, items):
+        """Returns the cached (length, route, optimal) of the given set of items, or None if not cached"""
+        key = frozenset(items)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if self.db is None:
+            return None
+        row = self.db.execute("SELECT length, route, optimal FROM routes WHERE instance = ? AND items = ?",
+                              (self.instance, self._items_key(key))).fetchone()
+        if row is None:
+            return None
+        route = [int(j) for j in row[1].split(",")] if row[1] else []
+        entry = (row[0], route, bool(row[2]))
+        self._remember(key, entry)
+        return entry
+
+    def put(self, items, length, route, optimal):
+        """Stores the route of the given set of items, unless a better (or proven optimal) one is already cached"""
+        key = frozenset(items)
+        old = self.get(key)
+        if old is not None and (old[2] or (old[0] <= length and not optimal)):
+            return
+        entry = (length, list(route), optimal)
+        self._remember(key, entry)
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO routes VALUES (?, ?, ?, ?, ?)",
+                            (self.instance, self._items_key(key), length, ",".join(str(j) for j in route), int(optimal)))
+            self.db.commit()
+
+    def lower_bound(self, items):
+        """Returns a lower bound on the length of any route delivering (at least) the given set of items
+
+        Args:
+            items (list[int]): items (0-based)
+
+        Returns:
+            int: the optimal length if cached, otherwise the longest round trip Origin -> j -> Origin
+        """
+        entry = self.get(items)
+        if entry is not None and entry[2]:
+            return entry[0]
+        origin = len(self.D) - 1
+        return max([self.D[origin][j] + self.D[j][origin] for j in items], default=0)
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    # dict-like interface, as expected by common.tsp.solve_routes
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        entry = self.get(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry
+
+    def __setitem__(self, key, entry):
+        self.put(key, *entry)
@@ -0,0 +1,178 @@
+import numpy as np
+
+
+# Every solution is converted to successor arrays: succ[i][v] is the node (0-based, the origin being node n) visited
+# by courier i after node v, and succ[i][v] == v for the nodes courier i doesn't visit (origin included, if the
+# courier stays at the origin). This is also the representation of the MiniZinc models, apart from being 1-based.
+
+
+def unpermute(values, permutation):
+    """Reorders the couriers (first axis) of values back to their original order, after sorting them by permutation
+
+    Args:
+        values (np.ndarray): the values of the sorted couriers
+        permutation (list[int]): permutation[i] is the original index of the i-th sorted courier
+
+    Returns:
+        np.ndarray: values with the rows in the original order of the couriers
+    """
+    original = np.empty_like(values)
+    original[np.asarray(permutation)] = values
+    return original
+
+
+def successors_from_routes(routes, n):
+    """Converts routes to successor arrays
+
+    Args:
+        routes (list[list[int]]): for each courier the items (1-based) in order of delivery
+        n (int): number of items
+
+    Returns:
+        np.ndarray: m x (n+1) successor arrays
+    """
+    succ = np.tile(np.arange(n + 1), (len(routes), 1))
+    for i, route in enumerate(routes):
+        if len(route) > 0:
+            nodes = np.concatenate([[n], np.asarray(route, dtype=int) - 1])
+            succ[i, nodes] = np.roll(nodes, -1)
+    return succ
+
+
+def successors_from_arcs(R):
+    """Converts arc variables (SAT r, AMPL X) to successor arrays
+
+    Args:
+        R (array-like): m x (n+1) x (n+1) tensor, R[i][j][k] == 1 iff courier i travels from j to k
+
+    Returns:
+        np.ndarray: m x (n+1) successor arrays
+    """
+    R = np.asarray(R) > 0
+    nodes = np.arange(R.shape[1])
+    return np.where(R.any(axis=2), R.argmax(axis=2), nodes[None, :])
+
+
+def successors_from_times(T, A):
+    """Converts times of delivery and assignments (SAT t and a) to successor arrays
+
+    Args:
+        T (array-like): n x n matrix, T[j][k] == 1 iff item j is delivered as k-th by its courier
+        A (array-like): m x n matrix, A[i][j] == 1 iff courier i delivers item j
+
+    Returns:
+        np.ndarray: m x (n+1) successor arrays
+    """
+    A = np.asarray(A) > 0
+    m, n = A.shape
+    times = np.asarray(T).argmax(axis=1)
+    couriers = A.argmax(axis=0)
+    # items sorted by courier, then by time of delivery
+    order = np.lexsort((times, couriers))
+    bounds = np.searchsorted(couriers[order], np.arange(m + 1))
+    return successors_from_routes([order[bounds[i]:bounds[i+1]] + 1 for i in range(m)], n)
+
+
+def successors_from_positions(O):
+    """Converts the positions of the items in the routes (SMT O) to successor arrays
+
+    Args:
+        O (array-like): m x n matrix, O[i][j] = k > 0 iff courier i delivers item j as k-th, 0 if it doesn't deliver it
+
+    Returns:
+        np.ndarray: m x (n+1) successor arrays
+    """
+    O = np.asarray(O)
+    routes = []
+    for row in O:
+        items = np.flatnonzero(row)
+        routes.append(items[np.argsort(row[items], kind="stable")] + 1)
+    return successors_from_routes(routes, O.shape[1])
+
+
+def successors_from_minizinc(T):
+    """Converts the 1-based successor arrays of the MiniZinc models to successor arrays
+
+    Args:
+        T (array-like): m x (n+1) matrix, T[i][j] is the node (1-based) visited by courier i after node j+1
+
+    Returns:
+        np.ndarray: m x (n+1) successor arrays
+    """
+    return np.asarray(T, dtype=int) - 1
+
+
+def routes_from_successors(succ):
+    """Follows the successor arrays from the origin: the walks take O(n + m) steps overall, but converting the arrays
+    to lists takes O(m * n)
+
+    Args:
+        succ (np.ndarray): m x (n+1) successor arrays
+
+    Returns:
+        list[list[int]]: for each courier the items (1-based) in order of delivery
+    """
+    origin = succ.shape[1] - 1
+    routes = []
+    for row in succ.tolist():
+        route = []
+        v = row[origin]
+        # at most n steps, so that a subtour not containing the origin can't loop forever
+        while v != origin and len(route) < origin:
+            route.append(v + 1)
+            v = row[v]
+        routes.append(route)
+    return routes
+
+
+def cycle_labels(succ):
+    """Labels every node with the smallest node of its cycle, by pointer jumping over the successor arrays
+
+    Args:
+        succ (np.ndarray): m x (n+1) successor arrays, each row being a permutation
+
+    Returns:
+        np.ndarray: m x (n+1) labels, two nodes of a courier have the same label iff they are in the same cycle
+    """
+    labels = np.tile(np.arange(succ.shape[1]), (succ.shape[0], 1))
+    jump = succ.copy()
+    steps = 1
+    while steps < succ.shape[1]:
+        labels = np.minimum(labels, np.take_along_axis(labels, jump, axis=1))
+        jump = np.take_along_axis(jump, jump, axis=1)
+        steps *= 2
+    return labels
+
+
+def hamiltonian(succ):
+    """Checks for each courier that its successor array is a single cycle through the origin, i.e. it has no subtours
+
+    Args:
+        succ (np.ndarray): m x (n+1) successor arrays
+
+    Returns:
+        np.ndarray: m booleans, true iff the corresponding courier travels a hamiltonian cycle over the nodes it visits
+    """
+    nodes = np.arange(succ.shape[1])
+    # every node must be reached once, i.e. each row must be a permutation
+    permutation = (np.sort(succ, axis=1) == nodes[None, :]).all(axis=1)
+    if not permutation.all():
+        return permutation
+    labels = cycle_labels(succ)
+    visited = succ != nodes[None, :]
+    same_cycle = labels == labels[:, -1:]
+    return (same_cycle | ~visited).all(axis=1)
+
+
+def check_solution(succ, n):
+    """Checks that the successor arrays are hamiltonian cycles delivering every item exactly once
+
+    Args:
+        succ (np.ndarray): m x (n+1) successor arrays
+        n (int): number of items
+
+    Returns:
+        bool: true iff the successor arrays represent a valid set of routes
+    """
+    visited = succ[:, :n] != np.arange(n)[None, :]
+    return bool(hamiltonian(succ).all() and (visited.sum(axis=0) == 1).all())
@@ -0,0 +1,25 @@
+import importlib
+
+
+# method -> (module, function) of its runner, imported only when the method is run, so that e.g. running CP
+# doesn't load z3 or amplpy
+RUNNERS = {"CP": ("CP.run", "run_cp"),
+           "SAT": ("SAT.run", "run_sat"),
+           "SMT": ("SMT.run", "run_smt"),
+           "MIP": ("MIP.run", "run_mip")}
+
+# methods whose runners accept a random seed
+SEEDED_METHODS = ["CP", "SAT", "SMT"]
+
+
+def load_runner(method):
+    """Imports the runner of a method
+
+    Args:
+        method (str): one among RUNNERS
+
+    Returns:
+        function: the runner, e.g. run_sat
+    """
+    module, function = RUNNERS[method]
+    return getattr(importlib.import_module(module), function)
@@ -0,0 +1,151 @@
+import os
+import sys
+import signal
+import resource
+import threading
+import traceback
+import multiprocessing
+
+
+# seconds a model may run beyond its timeout (e.g. encoding, readout) before being killed
+WALL_GRACE = int(os.environ.get("MCP_WALL_GRACE", 30))
+
+# address space limit of each model in MB, 0 for no limit
+MEMORY_LIMIT_MB = int(os.environ.get("MCP_MEMORY_LIMIT_MB", 0))
+
+# seconds between SIGTERM and SIGKILL when killing a model
+KILL_GRACE = 2
+
+# messages of the errors z3 raises when it runs out of memory (the allocation failing, or max_memory exceeded)
+Z3_OUT_OF_MEMORY = ["out of memory", "max. memory exceeded"]
+
+
+def _out_of_memory(e):
+    """Returns wether the exception e reports running out of memory: a MemoryError, or z3's own error"""
+    if isinstance(e, MemoryError):
+        return True
+    # z3 is only loaded by the SAT/SMT models
+    z3 = sys.modules.get("z3")
+    return z3 is not None and isinstance(e, z3.Z3Exception) and str(e.value) in Z3_OUT_OF_MEMORY
+
+
+def _child(function, connection, memory_limit_mb, cpu_limit):
+    # own process group, so that the solver subprocesses (minizinc, AMPL solvers, process pools) are killed with it
+    os.setpgrp()
+    if memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if cpu_limit:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + KILL_GRACE))
+    try:
+        connection.send(("ok", function()))
+    except MemoryError:
+        connection.send(("oom", None))
+    except Exception as e:
+        connection.send(("oom" if _out_of_memory(e) else "error", traceback.format_exc()))
+    finally:
+        connection.close()
+
+
+def _kill_group(process):
+    """Terminates the process group of the child, killing it if it doesn't terminate in KILL_GRACE seconds"""
+    for sig in [signal.SIGTERM, signal.SIGKILL]:
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            return
+        process.join(KILL_GRACE)
+        if not process.is_alive():
+            return
+
+
+def run_sandboxed(function, wall_limit=None, memory_limit_mb=MEMORY_LIMIT_MB, cpu_limit=None):
+    """Runs function() in a child process with a hard wall-clock limit and resource limits
+
+    Args:
+        function (function): the function to run, without arguments. The child is forked, so it can be a closure
+        wall_limit (float, optional): seconds after which the child and its subprocesses are killed (default=None, i.e. no limit)
+        memory_limit_mb (int, optional): address space limit of the child in MB (default=MEMORY_LIMIT_MB, 0 for no limit)
+        cpu_limit (int, optional): CPU seconds limit of the child (default=None, i.e. no limit)
+
+    Returns:
+        (str, object): the status, among "ok", "timeout", "oom" and "error", and respectively the value returned
+                       by function, None, None, the traceback of the error
+    """
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_child, args=(function, sender, memory_limit_mb, cpu_limit))
+    process.start()
+    sender.close()
+
+    # the child is in its own process group, so a process terminated while running it (e.g. a cancelled job of
+    # serve.py) kills it explicitly. Signal handlers can only be set from the main thread
+    def terminate(signum, frame):
+        _kill_group(process)
+        raise SystemExit(128 + signum)
+    previous_handler = None
+    if threading.current_thread() is threading.main_thread():
+        previous_handler = signal.signal(signal.SIGTERM, terminate)
+
+    try:
+        if receiver.poll(wall_limit):
+            try:
+                status, value = receiver.recv()
+            except EOFError:
+                # the child died without sending anything
+                status, value = None, None
+        else:
+            status, value = "timeout", None
+    finally:
+        if previous_handler is not None:
+            signal.signal(signal.SIGTERM, previous_handler)
+    _kill_group(process)
+    process.join()
+    receiver.close()
+
+    if status is None:
+        if process.exitcode in [-signal.SIGXCPU, -signal.SIGKILL] and cpu_limit:
+            status = "timeout"
+        elif process.exitcode == -signal.SIGKILL:
+            # killed by the kernel OOM killer
+            status = "oom"
+        else:
+            status, value = "error", f"exit code {process.exitcode}"
+    return (status, value)
+
+
+def failure_entry(status, timeout, value=None):
+    """Returns the result entry of a model that didn't return
+
+    Args:
+        status (str): the status returned by run_sandboxed
+        timeout (int): timeout of the model in seconds
+        value (object, optional): the value returned by run_sandboxed, the traceback for errors
+
+    Returns:
+        dict: result entry with no solution and the status
+    """
+    entry = {"time": timeout, "optimal": False, "obj": "N/A", "sol": [], "status": status}
+    if status == "error" and value is not None:
+        entry["error"] = str(value).strip().split("\n")[-1]
+    return entry
+
+
+def run_model(function, timeout, sandbox=True):
+    """Runs the model run by function() and returns its result entry, in a sandbox killing it WALL_GRACE seconds
+    after its timeout
+
+    Args:
+        function (function): function running the model and returning its result entry
+        timeout (int): timeout of the model in seconds
+        sandbox (bool, optional): wether or not to run the model in a sandboxed child process (default=True)
+
+    Returns:
+        dict: the result entry of the model, or the one of its failure
+    """
+    if not sandbox:
+        return function()
+    status, value = run_sandboxed(function, wall_limit=timeout + WALL_GRACE)
+    if status == "ok":
+        return value
+    return failure_entry(status, timeout, value)
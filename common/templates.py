@@ -0,0 +1,59 @@
+import os
+import hashlib
+from string import Template
+
+from .encoding_cache import cache_dir
+from .results import write_atomic
+
+
+def render(template, flags, values=None):
+    """Generates a model variant from a template, the same for MiniZinc and AMPL models: the lines between
+    "@if <flag>" (or "@if not <flag>"), an optional "@else" and "@endif" are kept depending on the flag, the
+    directives being alone on their line, and the placeholders $name are replaced by the values
+
+    Args:
+        template (str): text of the template
+        flags (dict[str, bool]): value of each flag used by the template
+        values (dict[str, object], optional): values of the placeholders (default=None, i.e. none)
+
+    Returns:
+        str: the text of the variant
+    """
+    lines = []
+    # for each enclosing @if, wether its lines are kept
+    kept = []
+    for number, line in enumerate(template.split("\n"), 1):
+        directive = line.strip().split()
+        if directive and directive[0] == "@if":
+            name = directive[-1]
+            if name not in flags:
+                raise ValueError(f"Flag [{name}] of line {number} not given, the flags are {sorted(flags)}")
+            kept.append(bool(flags[name]) != (directive[1] == "not"))
+        elif directive == ["@else"]:
+            kept[-1] = not kept[-1]
+        elif directive == ["@endif"]:
+            kept.pop()
+        elif all(kept):
+            lines.append(line)
+    if kept:
+        raise ValueError(f"{len(kept)} @if without @endif in the template")
+    return Template("\n".join(lines)).substitute(values or {})
+
+
+def cached_file(text, name, extension):
+    """Writes a generated model to the cache (see common/encoding_cache.py), under a name with the hash of its text,
+    unless it is already there
+
+    Args:
+        text (str): the model
+        name (str): prefix of the name of the file, e.g. the name of the template
+        extension (str): extension of the file, e.g. "mzn"
+
+    Returns:
+        str: the path of the file
+    """
+    digest = hashlib.sha1(text.encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir("models"), f"{name}-{digest}.{extension}")
+    if not os.path.exists(path):
+        write_atomic(path, text)
+    return path
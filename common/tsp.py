@@ -0,0 +1,141 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+# routes with at most this many items are solved exactly with Held-Karp instead of a solver
+HELD_KARP_MAX_ITEMS = 10
+
+
+def route_length(route, D):
+    """Returns the length of the tour Origin -> route -> Origin
+
+    Args:
+        route (list[int]): items (0-based) in order of delivery
+        D (list[list[int]]): (n+1)x(n+1) distance matrix, the origin being the last row/column
+
+    Returns:
+        int: the distance travelled
+    """
+    origin = len(D) - 1
+    length = 0
+    previous = origin
+    for j in route:
+        length += D[previous][j]
+        previous = j
+    return length + D[previous][origin]
+
+
+def held_karp(items, D):
+    """Exact dynamic programming (Held-Karp) solution of the single courier TSP over {items} + Origin
+
+    Args:
+        items (list[int]): items (0-based) the courier must deliver
+        D (list[list[int]]): (n+1)x(n+1) distance matrix, the origin being the last row/column
+
+    Returns:
+        (int, list[int]): the optimal tour length and the items in order of delivery
+    """
+    origin = len(D) - 1
+    k = len(items)
+    if k == 0:
+        return (0, [])
+
+    full = (1 << k) - 1
+    # cost[mask][j] = shortest path leaving the origin, visiting the items in mask and ending in items[j]
+    cost = [[None] * k for _ in range(full + 1)]
+    parent = [[None] * k for _ in range(full + 1)]
+    for j in range(k):
+        cost[1 << j][j] = D[origin][items[j]]
+
+    for mask in range(1, full + 1):
+        for j in range(k):
+            c = cost[mask][j]
+            if c is None:
+                continue
+            for h in range(k):
+                if mask & (1 << h):
+                    continue
+                next_mask = mask | (1 << h)
+                new_cost = c + D[items[j]][items[h]]
+                if cost[next_mask][h] is None or new_cost < cost[next_mask][h]:
+                    cost[next_mask][h] = new_cost
+                    parent[next_mask][h] = j
+
+    best_length, last = min((cost[full][j] + D[items[j]][origin], j) for j in range(k))
+
+    # walk the parents back to the origin
+    order = []
+    mask = full
+    while last is not None:
+        order.append(items[last])
+        last, mask = parent[mask][last], mask & ~(1 << last)
+    order.reverse()
+
+    return (best_length, order)
+
+
+def solve_routes(item_sets, D, tsp_solver, timeout, memo=None, pool=None):
+    """Solves the routing phase of a fixed assignment as independent single courier TSPs
+
+    Routes of at most HELD_KARP_MAX_ITEMS items are solved exactly in process, the others are
+    submitted to {pool} (if given) to be solved concurrently by {tsp_solver}.
+
+    Args:
+        item_sets (list[list[int]]): item_sets[i] are the items (0-based) assigned to courier i
+        D (list[list[int]]): (n+1)x(n+1) distance matrix, the origin being the last row/column
+        tsp_solver (function): picklable function (items, D, timeout) -> (length, route, optimal) or None,
+                               solving a single courier TSP before the timestamp timeout
+        timeout (float): timestamp of the timeout
+        memo (dict, optional): results already computed, keyed by frozenset of items. Updated in place
+        pool (Executor, optional): executor used to solve the subproblems concurrently
+
+    Returns:
+        list[(int, list[int], bool)]: for each courier its tour length, its route and wether the route is optimal,
+                                      or None if some route could not be found before the timeout
+    """
+    if memo is None:
+        memo = {}
+
+    results = [None] * len(item_sets)
+    pending = {}
+    for i, items in enumerate(item_sets):
+        key = frozenset(items)
+        if key in memo and memo[key][2]:
+            results[i] = memo[key]
+        elif len(items) <= HELD_KARP_MAX_ITEMS:
+            length, route = held_karp(items, D)
+            results[i] = memo[key] = (length, route, True)
+        elif key in pending:
+            pending[key].append(i)
+        else:
+            pending[key] = [i]
+
+    futures = {}
+    for key, couriers in pending.items():
+        items = item_sets[couriers[0]]
+        if pool is None:
+            futures[key] = tsp_solver(items, D, timeout)
+        else:
+            futures[key] = pool.submit(tsp_solver, items, D, timeout)
+
+    for key, couriers in pending.items():
+        result = futures[key] if pool is None else futures[key].result()
+        if result is None:
+            return None
+        memo[key] = result
+        for i in couriers:
+            results[i] = result
+
+    return results
+
+
+def make_pool(m):
+    """Returns a process pool sized for solving the routes of m couriers concurrently
+
+    Args:
+        m (int): number of couriers
+
+    Returns:
+        ProcessPoolExecutor: the process pool
+    """
+    return ProcessPoolExecutor(max_workers=max(1, min(m, os.cpu_count() or 1)))
@@ -0,0 +1,203 @@
+import os
+import argparse
+
+import numpy as np
+
+from common.instance import write_dat, write_dzn
+
+
+LAYOUTS = ["uniform", "clustered"]
+METRICS = ["euclidean", "manhattan", "quasimetric"]
+DEPOTS = ["center", "corner", "random"]
+
+# the distances of the quasimetric grow by this factor of the height difference when going uphill
+UPHILL_COST = 1.0
+
+# rows of the distance matrix computed at once when writing an instance
+CHUNK_ROWS = 256
+
+
+#------------------------------------------------------------------------------
+# Generation
+#------------------------------------------------------------------------------
+
+def generate_points(n, layout, depot, grid, clusters, rng):
+    """Places the n items and the origin on the integer grid [0, grid]^2
+
+    Args:
+        n (int): number of items
+        layout (str) ['uniform', 'clustered']: items uniformly on the grid, or around `clusters` centers
+        depot (str) ['center', 'corner', 'random']: position of the origin
+        grid (int): side of the grid
+        clusters (int): number of clusters of the clustered layout
+        rng (Generator): random number generator
+
+    Returns:
+        np.ndarray: (n+1)x2 coordinates, the origin being the last row as in the distance matrix
+    """
+    if layout == "uniform":
+        points = rng.integers(0, grid + 1, size=(n, 2))
+    elif layout == "clustered":
+        centers = rng.integers(0, grid + 1, size=(clusters, 2))
+        spread = max(grid / (4 * np.sqrt(clusters)), 1)
+        points = centers[rng.integers(0, clusters, size=n)] + rng.normal(0, spread, size=(n, 2))
+        points = np.clip(np.rint(points), 0, grid).astype(int)
+    else:
+        raise ValueError(f"Input parameter [layout] must be among {LAYOUTS}, was given '{layout}'")
+
+    if depot == "center":
+        origin = [grid // 2, grid // 2]
+    elif depot == "corner":
+        origin = [0, 0]
+    elif depot == "random":
+        origin = rng.integers(0, grid + 1, size=2)
+    else:
+        raise ValueError(f"Input parameter [depot] must be among {DEPOTS}, was given '{depot}'")
+
+    return np.vstack([points, origin])
+
+
+def distance_rows(points, heights, metric, first, last):
+    """Computes rows first..last-1 of the distance matrix. The distances are integers satisfying the triangle
+    inequality (the Euclidean ones are rounded up to keep it), and are 0 only from a point to itself
+
+    Args:
+        points (np.ndarray): (n+1)x2 coordinates
+        heights (np.ndarray): height of each point, used by the quasimetric
+        metric (str) ['euclidean', 'manhattan', 'quasimetric']: the Euclidean distance, the Manhattan distance, or the
+                     Euclidean distance plus UPHILL_COST times the height climbed, which is asymmetric
+        first (int): first row
+        last (int): last row (excluded)
+
+    Returns:
+        np.ndarray: the (last-first)x(n+1) rows
+    """
+    delta = points[first:last, None, :] - points[None, :, :]
+    if metric == "manhattan":
+        D = np.abs(delta).sum(axis=2)
+    elif metric == "euclidean":
+        D = np.ceil(np.sqrt((delta ** 2).sum(axis=2))).astype(int)
+    elif metric == "quasimetric":
+        uphill = np.maximum(heights[None, :] - heights[first:last, None], 0)
+        D = np.ceil(np.sqrt((delta ** 2).sum(axis=2)) + UPHILL_COST * uphill).astype(int)
+    else:
+        raise ValueError(f"Input parameter [metric] must be among {METRICS}, was given '{metric}'")
+    # distinct items may be placed on the same point
+    D = np.maximum(D, 1)
+    D[np.arange(last - first), np.arange(first, last)] = 0
+    return D
+
+
+def generate_loads(m, n, tightness, max_size, rng):
+    """Draws the sizes of the items and the capacities of the couriers. The capacities are built from a random
+    assignment of the items (at least one per courier), so that the instance is always feasible
+
+    Args:
+        m (int): number of couriers
+        n (int): number of items, at least m
+        tightness (float): in (0, 1], the total size of the items over the total capacity
+        max_size (int): largest size of an item
+        rng (Generator): random number generator
+
+    Returns:
+        (list[int], list[int]): the capacities l and the sizes s
+    """
+    if not 0 < tightness <= 1:
+        raise ValueError(f"Input parameter [tightness] must be in (0, 1], was given {tightness}")
+    s = rng.integers(1, max_size + 1, size=n)
+    assignment = np.concatenate([rng.permutation(m), rng.integers(0, m, size=n - m)])
+    rng.shuffle(assignment)
+    loads = np.bincount(assignment, weights=s, minlength=m)
+    l = np.ceil(loads / tightness).astype(int)
+    return (l.tolist(), s.tolist())
+
+
+def generate_instance(m, n, tightness=0.8, max_size=50, layout="uniform", metric="euclidean", depot="center",
+                      grid=None, clusters=None, seed=0):
+    """Generates an instance of the Multiple Couriers Planning problem, deterministically from seed. The distance
+    matrix is not built, so that instances with tens of thousands of items can be written row by row
+
+    Args:
+        m (int): number of couriers
+        n (int): number of items, at least m
+        tightness (float, optional): total size of the items over the total capacity, in (0, 1] (default=0.8)
+        max_size (int, optional): largest size of an item (default=50)
+        layout (str, optional) ['uniform', 'clustered']: placement of the items (default='uniform')
+        metric (str, optional) ['euclidean', 'manhattan', 'quasimetric']: the distances (default='euclidean')
+        depot (str, optional) ['center', 'corner', 'random']: position of the origin (default='center')
+        grid (int, optional): side of the grid (default=None, i.e. 10 sqrt(n), at least 100)
+        clusters (int, optional): number of clusters of the clustered layout (default=None, i.e. sqrt(n))
+        seed (int, optional): random seed (default=0)
+
+    Returns:
+        (int, int, list[int], list[int], function): m, n, l, s and a function of (first, last) returning the rows
+                                                   first..last-1 of the (n+1)x(n+1) distance matrix D
+    """
+    if n < m:
+        raise ValueError(f"Every courier must deliver at least one item, was given m={m} and n={n}")
+    rng = np.random.default_rng(seed)
+    grid = grid or max(int(10 * np.sqrt(n)), 100)
+    clusters = clusters or max(int(np.sqrt(n)), 1)
+
+    l, s = generate_loads(m, n, tightness, max_size, rng)
+    points = generate_points(n, layout, depot, grid, clusters, rng)
+    heights = rng.uniform(0, grid / 10, size=n + 1)
+
+    def rows(first, last):
+        return distance_rows(points, heights, metric, first, last)
+
+    return (m, n, l, s, rows)
+
+
+#------------------------------------------------------------------------------
+# Writing
+#------------------------------------------------------------------------------
+
+def chunked_rows(n, rows):
+    """Yields the rows of the distance matrix, computing CHUNK_ROWS of them at a time"""
+    for first in range(0, n + 1, CHUNK_ROWS):
+        yield from rows(first, min(first + CHUNK_ROWS, n + 1))
+
+
+def write_instance(directory, number, m, n, l, s, rows):
+    """Writes an instance as directory/instances_dat/inst{number}.dat and directory/instances_dzn/inst{number}.dzn,
+    the layout benchmark.py expects with --instance-dir
+
+    Returns:
+        (str, str): the paths of the .dat and .dzn files
+    """
+    paths = []
+    for subdirectory, extension, writer in [("instances_dat", "dat", write_dat), ("instances_dzn", "dzn", write_dzn)]:
+        os.makedirs(os.path.join(directory, subdirectory), exist_ok=True)
+        path = os.path.join(directory, subdirectory, f"inst{number:02d}.{extension}")
+        writer(path, m, n, l, s, chunked_rows(n, rows))
+        paths.append(path)
+    return tuple(paths)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic MCP instances as .dat/.dzn pairs, deterministically from a seed")
+    parser.add_argument("--m", type=int, nargs="+", required=True, help="numbers of couriers")
+    parser.add_argument("--n", type=int, nargs="+", required=True, help="numbers of items, one instance for each (m, n) pair with n >= m")
+    parser.add_argument("--tightness", type=float, default=0.8, help="total size of the items over the total capacity, in (0, 1]")
+    parser.add_argument("--max-size", type=int, default=50, help="largest size of an item")
+    parser.add_argument("--layout", choices=LAYOUTS, default="uniform", help="placement of the items")
+    parser.add_argument("--metric", choices=METRICS, default="euclidean", help="distances between the points")
+    parser.add_argument("--depot", choices=DEPOTS, default="center", help="position of the origin")
+    parser.add_argument("--grid", type=int, default=None, help="side of the grid (default: 10 sqrt(n), at least 100)")
+    parser.add_argument("--clusters", type=int, default=None, help="clusters of the clustered layout (default: sqrt(n))")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the first instance, incremented for each next one")
+    parser.add_argument("--first", type=int, default=1, help="number of the first instance")
+    parser.add_argument("--out", default="generated", help="output directory")
+    args = parser.parse_args()
+
+    number, seed = args.first, args.seed
+    for m in args.m:
+        for n in args.n:
+            if n < m:
+                continue
+            instance = generate_instance(m, n, args.tightness, args.max_size, args.layout, args.metric, args.depot,
+                                         args.grid, args.clusters, seed)
+            dat, dzn = write_instance(args.out, number, *instance)
+            print(f"inst{number:02d}: m={m}, n={n}, seed={seed} -> {dat}, {dzn}")
+            number, seed = number + 1, seed + 1
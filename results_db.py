@@ -0,0 +1,48 @@
+import argparse
+
+from benchmark import print_table, parse_instances
+from common.result_db import DB_PATH, connect, ingest_res, best_known, gaps, export_res
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database of the results of all the methods, models and instances")
+    parser.add_argument("--db", default=DB_PATH, help="path of the SQLite database (default: $MCP_RESULTS_DB or results.sqlite)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="store the results of the res/ files, validating their solutions")
+    ingest_parser.add_argument("--res", default="res", help="directory of the results")
+    ingest_parser.add_argument("--instances", default="instances_dat", help="directory of the .dat instances")
+
+    best_parser = subparsers.add_parser("best", help="best known solution of each instance")
+    best_parser.add_argument("--instances", type=parse_instances, default=None, help="instance numbers, e.g. 1-5,7")
+    best_parser.add_argument("--sol", action="store_true", help="also print the solutions")
+
+    gaps_parser = subparsers.add_parser("gaps", help="gap of each result to the best known solution")
+    gaps_parser.add_argument("--method", default=None, help="only the results of this method")
+    gaps_parser.add_argument("--model", default=None, help="only the results of this model")
+
+    export_parser = subparsers.add_parser("export", help="regenerate the res/ files from the database")
+    export_parser.add_argument("--res", default="res", help="directory of the results")
+
+    args = parser.parse_args()
+    db = connect(args.db)
+
+    if args.command == "ingest":
+        print(f"Stored {ingest_res(db, args.res, args.instances)} results in {args.db}")
+        invalid = db.execute("SELECT instance, method, model, errors FROM results WHERE valid = 0").fetchall()
+        for row in invalid:
+            print(f"Invalid solution of {row['method']}:{row['model']} on instance {row['instance']}: {row['errors']}")
+    elif args.command == "best":
+        rows = []
+        for instance, known in sorted(best_known(db, args.instances).items()):
+            row = {"instance": instance, "obj": known["obj"], "optimal": known["optimal"],
+                   "confirmed": known["confirmed"], "lower_bound": known["lower_bound"], "found_by": f"{known['method']}:{known['model']}"}
+            if args.sol:
+                row["sol"] = known["sol"]
+            rows.append(row)
+        print_table(rows)
+    elif args.command == "gaps":
+        print_table(gaps(db, args.method, args.model))
+    elif args.command == "export":
+        paths = export_res(db, args.res)
+        print(f"Wrote {len(paths)} files in {args.res}")
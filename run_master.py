@@ -1,17 +1,9 @@
 import os
 import sys
-import subprocess
-import io
-import numpy as np
-import math
 import re
-import json
-import jsbeautifier
 
-from CP.run import run_cp
-from SAT.run import run_sat
-from SMT.run import run_smt
-from MIP.run import run_mip
+from common.runners import load_runner
+from common.results import ResultStore
 
 if __name__ == "__main__":
     if len(sys.argv) != 3:
@@ -47,24 +39,15 @@ if __name__ == "__main__":
     inst_number = int(groups[0])
 
 
-    # Models execution
-    method_to_runner = {"CP": run_cp,
-                        "SAT": run_sat,
-                        "SMT": run_smt,
-                        "MIP": run_mip}
-    
-    runner = method_to_runner[solving_method]
-
-    print(f"Starting to run models of method {solving_method}")
-    dictionary = runner(filename)
-
-    opts = jsbeautifier.default_options()
-    opts.keep_array_indentation = True
-    output = jsbeautifier.beautify(json.dumps(dictionary), opts)
+    # Models execution, importing only the runner of the method
+    runner = load_runner(solving_method)
 
     outfile_name = os.path.join(os.getcwd(), 'res', solving_method, f"{inst_number}.json")
 
-    with open(outfile_name, "w+") as outfile:
-        outfile.write(output)
+    # the result file is rewritten atomically as soon as each model finishes
+    store = ResultStore(outfile_name)
+
+    print(f"Starting to run models of method {solving_method}")
+    runner(filename, on_result=store.add)
 
     print(f"Successfully run {solving_method} model on instance file: {filename} with resulting output in JSON file: {outfile_name}")
@@ -0,0 +1,460 @@
+import os
+import json
+import time
+import uuid
+import pickle
+import shutil
+import signal
+import asyncio
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+from common.runners import RUNNERS, SEEDED_METHODS, load_runner
+from common import instrumentation
+from common.instance import write_dat, write_dzn
+
+
+# jobs waiting for a worker, beyond which new ones are rejected
+QUEUE_SIZE = 64
+
+# default timeout of each model of a job in seconds
+TIMEOUT = 300
+
+# largest request body accepted, in bytes
+MAX_BODY = 256 * 1024 * 1024
+
+# seconds a cancelled worker has to stop its model before being killed
+KILL_GRACE = 5
+
+PROJECT_ROOT = os.path.dirname(os.path.realpath(__file__))
+
+# the directories of the instances a request can name by path, by the format read by each method
+INSTANCE_DIRS = {"CP": os.path.join(PROJECT_ROOT, "CP", "instances_dzn"),
+                 "SAT": os.path.join(PROJECT_ROOT, "instances_dat"),
+                 "SMT": os.path.join(PROJECT_ROOT, "instances_dat"),
+                 "MIP": os.path.join(PROJECT_ROOT, "instances_dat")}
+
+# errors of unpickling a corrupted message, besides pickle.UnpicklingError
+UNPICKLING_ERRORS = (pickle.UnpicklingError, AttributeError, ImportError, IndexError, ValueError, TypeError, KeyError)
+
+STATUS_TEXT = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               409: "Conflict", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+#------------------------------------------------------------------------------
+# Workers
+#------------------------------------------------------------------------------
+
+class ModelPipe:
+    """Pipe of the incumbents of a model, which runs in a sandboxed process forked from the worker, relayed to the
+    server by a thread of the worker. Only the worker writes to its connection to the server, and a model killed while
+    writing (e.g. at its timeout) can only corrupt its own pipe"""
+
+    def __init__(self, job_id, send):
+        self.reader, self.writer = multiprocessing.Pipe(duplex=False)
+        self.thread = threading.Thread(target=self._relay, args=(job_id, send), daemon=True)
+        self.thread.start()
+
+    def _relay(self, job_id, send):
+        while True:
+            try:
+                found, obj = self.reader.recv()
+            except (EOFError, OSError):
+                break
+            except UNPICKLING_ERRORS:
+                # a model killed while writing: the rest of the pipe can't be read
+                break
+            send(("incumbent", job_id, (found, obj)))
+        self.reader.close()
+
+    def send(self, obj):
+        """Sends an incumbent of objective value obj, called in the model process"""
+        self.writer.send((round(time.time(), 3), obj))
+
+    def close(self):
+        """Closes the pipe after the model finished, once its last incumbents are relayed"""
+        self.writer.close()
+        self.thread.join(KILL_GRACE)
+
+
+def _worker(connection):
+    """Long-lived worker: imports the runners once, then runs the jobs it receives, sending back their incumbents
+    and results. Its models run in sandboxed processes forked from it, so they start with the solvers already loaded.
+    Each model sends its incumbents on its own pipe (see ModelPipe), created before it starts"""
+    runners = {}
+    for method in RUNNERS:
+        try:
+            runners[method] = load_runner(method)
+        except ImportError as e:
+            # e.g. amplpy not installed, reported to the jobs of that method
+            runners[method] = e
+
+    # the relay threads write to the connection too
+    lock = threading.Lock()
+
+    def send(message):
+        with lock:
+            connection.send(message)
+
+    while True:
+        try:
+            job_id, method, instance_file, kwargs = connection.recv()
+        except EOFError:
+            return
+        # the pipe of the next model to run, inherited by the model processes forked afterwards
+        pipe = ModelPipe(job_id, send)
+        instrumentation.listen_incumbents(lambda obj: pipe.send(obj))
+
+        def on_result(model_name, entry):
+            nonlocal pipe
+            pipe.close()
+            send(("model", job_id, (model_name, entry)))
+            pipe = ModelPipe(job_id, send)
+
+        try:
+            runner = runners[method]
+            if isinstance(runner, ImportError):
+                raise runner
+            message = ("done", job_id, runner(instance_file, on_result=on_result, **kwargs))
+        except SystemExit:
+            # cancelled: the sandbox killed the running model
+            message = ("cancelled", job_id, None)
+        except Exception as e:
+            message = ("failed", job_id, repr(e))
+        finally:
+            instrumentation.listen_incumbents(None)
+            pipe.close()
+        send(message)
+
+
+class Worker:
+    """A worker process and the pipe to it, restarted if it dies (e.g. killed when cancelling a job)"""
+
+    def __init__(self, context, on_message):
+        self.context = context
+        self.on_message = on_message
+        self.process = None
+        self.start()
+
+    def start(self):
+        self.connection, child_connection = self.context.Pipe()
+        self.process = self.context.Process(target=_worker, args=(child_connection,))
+        self.process.start()
+        child_connection.close()
+        asyncio.get_running_loop().add_reader(self.connection.fileno(), self._read)
+
+    def _read(self):
+        try:
+            message = self.connection.recv()
+        except (EOFError, OSError):
+            asyncio.get_running_loop().remove_reader(self.connection.fileno())
+            self.process.join(KILL_GRACE)
+            self.on_message(("died", None, f"worker died (exit code {self.process.exitcode})"))
+            return
+        except UNPICKLING_ERRORS as e:
+            # the messages that follow can't be told apart: the worker is killed, failing its job, and restarted
+            # at the next job
+            asyncio.get_running_loop().remove_reader(self.connection.fileno())
+            self.process.kill()
+            self.process.join()
+            self.on_message(("died", None, f"worker sent a corrupted message ({e!r})"))
+            return
+        self.on_message(message)
+
+    def restart(self):
+        asyncio.get_running_loop().remove_reader(self.connection.fileno())
+        self.connection.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.start()
+
+    def stop(self):
+        asyncio.get_running_loop().remove_reader(self.connection.fileno())
+        self.connection.close()
+        self.process.kill()
+        self.process.join()
+
+
+#------------------------------------------------------------------------------
+# Jobs
+#------------------------------------------------------------------------------
+
+class Job:
+    """A request to solve an instance with the models of a method. Its events (incumbents found and the final
+    status) are kept, so that clients can stream them from the start at any time"""
+
+    def __init__(self, method, instance_file, kwargs, directory=None):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.instance_file = instance_file
+        self.kwargs = kwargs
+        self.directory = directory      # temporary directory of an instance sent in the request
+        self.status = "queued"
+        self.submitted = time.time()
+        self.incumbents = []
+        self.result = None
+        self.error = None
+        self.events = []
+        self.changed = asyncio.Event()
+        self.finished = asyncio.Event()
+
+    def event(self, event):
+        self.events.append(event)
+        # wake up the streaming clients, which wait on a new Event afterwards
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def finish(self, status, result=None, error=None):
+        if self.finished.is_set():
+            return
+        self.status, self.result, self.error = status, result, error
+        self.event({"event": status, "result": result, "error": error})
+        self.finished.set()
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def to_dict(self):
+        return {"id": self.id, "method": self.method, "status": self.status, "submitted": self.submitted,
+                "incumbents": self.incumbents, "result": self.result, "error": self.error}
+
+
+def parse_job(request):
+    """Creates the job of a JSON request {"method", "models", "timeout", "seed", and either "instance_file", a path
+    on the server within the instance directory of the method (see INSTANCE_DIRS), or "instance", {"m", "n", "l",
+    "s", "D"}}
+
+    Args:
+        request (dict): the decoded JSON request
+
+    Returns:
+        Job: the job
+    """
+    method = request.get("method")
+    if method not in RUNNERS:
+        raise ValueError(f"method must be one of {list(RUNNERS)}, was given {method!r}")
+    kwargs = {"model_names": request.get("models"), "timeout": int(request.get("timeout", TIMEOUT))}
+    if request.get("seed") is not None and method in SEEDED_METHODS:
+        kwargs["seed"] = int(request["seed"])
+
+    if "instance_file" in request:
+        # relative to the project, and resolving the links, so that no other file can be read
+        instance_file = os.path.realpath(os.path.join(PROJECT_ROOT, request["instance_file"]))
+        if os.path.dirname(instance_file) != INSTANCE_DIRS[method]:
+            raise ValueError(f"instance file {request['instance_file']!r} not in {os.path.relpath(INSTANCE_DIRS[method], PROJECT_ROOT)}")
+        if not os.path.isfile(instance_file):
+            raise ValueError(f"instance file {request['instance_file']!r} not found")
+        return Job(method, instance_file, kwargs)
+
+    instance = request.get("instance")
+    if not isinstance(instance, dict):
+        raise ValueError("either instance_file or instance must be given")
+    m, n, l, s, D = [instance[key] for key in ["m", "n", "l", "s", "D"]]
+    if len(l) != m or len(s) != n or len(D) != n + 1 or any(len(row) != n + 1 for row in D):
+        raise ValueError("instance must have len(l) = m, len(s) = n and D of size (n+1)x(n+1)")
+    directory = tempfile.mkdtemp(prefix="mcp_job_")
+    # the runners tell instances apart by the number in their file name
+    instance_file = os.path.join(directory, "inst01.dzn" if method == "CP" else "inst01.dat")
+    (write_dzn if method == "CP" else write_dat)(instance_file, m, n, l, s, D)
+    return Job(method, instance_file, kwargs, directory)
+
+
+class Service:
+    """Queue of jobs run by a pool of long-lived workers"""
+
+    def __init__(self, workers, queue_size=QUEUE_SIZE):
+        self.jobs = {}
+        self.queue = asyncio.Queue(queue_size)
+        context = multiprocessing.get_context("fork")
+        self.workers = [Worker(context, self._on_message) for _ in range(workers)]
+        self.running = {}      # job id -> Worker
+        self.dispatchers = [asyncio.create_task(self._dispatch(worker)) for worker in self.workers]
+
+    def submit(self, job):
+        """Queues the job, raising asyncio.QueueFull if the queue is full"""
+        self.queue.put_nowait(job)
+        self.jobs[job.id] = job
+        job.event({"event": "queued"})
+
+    async def _dispatch(self, worker):
+        while True:
+            job = await self.queue.get()
+            if job.finished.is_set():
+                # cancelled while queued
+                continue
+            if not worker.process.is_alive():
+                worker.restart()
+            job.status = "running"
+            job.event({"event": "running"})
+            self.running[job.id] = worker
+            worker.connection.send((job.id, job.method, job.instance_file, job.kwargs))
+            await job.finished.wait()
+            self.running.pop(job.id, None)
+
+    def _on_message(self, message):
+        kind, job_id, value = message
+        if kind == "died":
+            # the worker died with its job, if it was running one
+            for running_id, worker in list(self.running.items()):
+                if not worker.process.is_alive():
+                    self.jobs[running_id].finish("failed", error=value)
+            return
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        if kind == "incumbent":
+            # seconds since the job was submitted
+            found, obj = round(value[0] - job.submitted, 3), value[1]
+            job.incumbents.append((found, obj))
+            job.event({"event": "incumbent", "time": found, "obj": obj})
+        elif kind == "model":
+            model_name, entry = value
+            job.event({"event": "model", "model": model_name, "entry": entry})
+        elif kind == "done":
+            job.finish("done", result=value)
+        else:
+            job.finish(kind, error=value)
+
+    async def cancel(self, job):
+        """Cancels a queued or running job. A running job's worker is terminated, which kills its model, and
+        restarted"""
+        if job.finished.is_set():
+            return
+        worker = self.running.get(job.id)
+        job.finish("cancelled")
+        if worker is None:
+            return
+        worker.process.terminate()
+        await asyncio.get_running_loop().run_in_executor(None, worker.process.join, KILL_GRACE)
+        worker.restart()
+
+    def close(self):
+        for task in self.dispatchers:
+            task.cancel()
+        for worker in self.workers:
+            worker.stop()
+
+
+#------------------------------------------------------------------------------
+# HTTP
+#------------------------------------------------------------------------------
+
+def response(status, body):
+    payload = json.dumps(body).encode()
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n")
+    return head.encode() + payload
+
+
+async def stream_events(job, writer):
+    """Writes the events of job as JSON lines, from the first one until it finishes"""
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n")
+    sent = 0
+    while True:
+        changed = job.changed
+        for event in job.events[sent:]:
+            writer.write((json.dumps(event) + "\n").encode())
+        sent = len(job.events)
+        await writer.drain()
+        if job.finished.is_set() and sent == len(job.events):
+            return
+        await changed.wait()
+
+
+async def handle(service, reader, writer):
+    """Serves one request:
+    - POST /jobs with a JSON job (see parse_job): queues it, answering {"id", "status"}
+    - GET /jobs/<id>: the status, incumbents and result of the job
+    - GET /jobs/<id>/events: streams its events (queued, running, incumbent, the result entry of each model as it
+      finishes, and done/failed/cancelled) as JSON lines
+    - DELETE /jobs/<id>: cancels it
+    """
+    try:
+        request_line = (await reader.readline()).decode().split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode().strip()
+            if not line:
+                break
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+        if len(request_line) < 2:
+            return
+        verb, path = request_line[0], request_line[1].rstrip("/").split("/")[1:]
+
+        if verb == "POST" and path == ["jobs"]:
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY:
+                writer.write(response(413, {"error": f"request body larger than {MAX_BODY} bytes"}))
+                return
+            try:
+                job = parse_job(json.loads(await reader.readexactly(length)))
+            except (ValueError, KeyError, TypeError) as e:
+                writer.write(response(400, {"error": str(e)}))
+                return
+            try:
+                service.submit(job)
+            except asyncio.QueueFull:
+                job.finish("rejected")
+                writer.write(response(503, {"error": "queue full"}))
+                return
+            writer.write(response(202, {"id": job.id, "status": job.status}))
+            return
+
+        if len(path) < 2 or path[0] != "jobs" or path[1] not in service.jobs:
+            writer.write(response(404, {"error": "no such job"}))
+            return
+        job = service.jobs[path[1]]
+        if verb == "GET" and len(path) == 2:
+            writer.write(response(200, job.to_dict()))
+        elif verb == "GET" and path[2:] == ["events"]:
+            await stream_events(job, writer)
+        elif verb == "DELETE" and len(path) == 2:
+            if job.finished.is_set() and job.status != "cancelled":
+                writer.write(response(409, {"error": f"job already {job.status}"}))
+            else:
+                await service.cancel(job)
+                writer.write(response(200, job.to_dict()))
+        else:
+            writer.write(response(405, {"error": f"{verb} not allowed on {request_line[1]}"}))
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+
+async def serve(host, port, workers, queue_size=QUEUE_SIZE):
+    """Serves the HTTP/JSON API on host:port until interrupted
+
+    Args:
+        host (str): address to listen on
+        port (int): port to listen on
+        workers (int): number of jobs run at the same time
+        queue_size (int, optional): jobs waiting for a worker, beyond which new ones are rejected (default=QUEUE_SIZE)
+    """
+    service = Service(workers, queue_size)
+    server = await asyncio.start_server(lambda reader, writer: handle(service, reader, writer), host, port)
+    stop = asyncio.Event()
+    for sig in [signal.SIGINT, signal.SIGTERM]:
+        asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+    print(f"Serving on {host}:{port} with {workers} workers")
+    async with server:
+        await stop.wait()
+    service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the MCP solvers over a local HTTP/JSON API")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of jobs run at the same time")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="jobs waiting for a worker, beyond which new ones are rejected")
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.host, args.port, args.workers, args.queue_size))
@@ -0,0 +1,36 @@
+import time
+
+from z3 import Int, Solver, And
+
+from common.bound_search import probe_bounds, parallel_bound_search
+from SAT.utils import millisecs_left
+
+
+def test_probe_bounds():
+    assert probe_bounds(10, 20, 1) == [15]
+    assert probe_bounds(10, 20, 3) == [12, 15, 17]
+    # fewer bounds than probes when the interval is small
+    assert probe_bounds(10, 11, 4) == [10]
+
+
+def test_millisecs_left_rounds_up():
+    assert millisecs_left(0, 1.0005) == 1001
+    assert millisecs_left(1, 1) == 0
+
+
+def test_parallel_bound_search():
+    x = Int("x")
+    solver = Solver()
+    solver.add(x >= 37, x <= 1000)
+
+    def bound_constraint(lower, bound):
+        return And(x >= lower, x <= bound)
+
+    def read(model):
+        return (model[x].as_long(), None)
+
+    value, _, complete = parallel_bound_search(solver, bound_constraint, read, 0, 1000, time.time() + 60, probes=3)
+    assert (value, complete) == (37, True)
+    # no solution at most the upper bound
+    value, _, complete = parallel_bound_search(solver, bound_constraint, read, 0, 30, time.time() + 60, probes=3)
+    assert (value, complete) == (None, True)
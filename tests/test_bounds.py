@@ -0,0 +1,48 @@
+import pytest
+
+from common import instrumentation
+from common.instance import read_instance
+from common.bounds import max_items_per_courier, trivial_bounds, assignment_lower_bound, heuristic_solution, objective_bounds
+from common.result_db import solution_errors
+from SAT.model import multiple_couriers_planning
+
+# optima of the first five instances, as in check_res_correctness.py
+OPT = {1: 14, 2: 226, 3: 12, 4: 220, 5: 206}
+
+
+@pytest.mark.parametrize("instance", sorted(OPT))
+def test_bounds_contain_the_optimum(instance):
+    m, n, l, s, D = read_instance(f"instances_dat/inst{instance:02d}.dat")
+    trivial_lower, trivial_upper = trivial_bounds(D, max_items_per_courier(m, n, l, s))
+    assert trivial_lower <= OPT[instance] <= trivial_upper
+    assert assignment_lower_bound(m, l, s, D) <= OPT[instance]
+
+    obj, routes = heuristic_solution(m, n, l, s, D)
+    assert solution_errors(m, n, l, s, D, routes, obj) == []
+
+    lower_bound, upper_bound, incumbent = objective_bounds(m, n, l, s, D, registry=False)
+    assert incumbent[:2] == (obj, routes) and incumbent[2] == "heuristic"
+    assert lower_bound <= OPT[instance] <= obj == upper_bound <= trivial_upper
+
+
+@pytest.mark.parametrize("instance", [1, 3])
+def test_linear_search_never_worse_than_the_incumbent(instance):
+    m, n, l, s, D = read_instance(f"instances_dat/inst{instance:02d}.dat")
+    heuristic_obj = heuristic_solution(m, n, l, s, D)[0]
+    with instrumentation.recording() as recorder:
+        obj, _, routes = multiple_couriers_planning(m, n, l, s, D, search='Linear', display_solution=False,
+                                                    timeout_duration=60, use_cache=False)
+    assert obj == OPT[instance]
+    assert solution_errors(m, n, l, s, D, routes, obj) == []
+    # every model found improves on (or matches) the heuristic solution
+    assert all(value <= heuristic_obj for _, value in recorder.incumbents)
+
+
+def test_heuristic_solution_stops_at_the_deadline():
+    m, n, l, s, D = read_instance("instances_dat/inst21.dat")
+    with instrumentation.recording() as recorder:
+        obj, routes = heuristic_solution(m, n, l, s, D, deadline=0)
+    # the greedy construction is kept as it is
+    assert solution_errors(m, n, l, s, D, routes, obj) == []
+    assert recorder.counts["heuristic_cut_short"]
+    assert obj >= heuristic_solution(m, n, l, s, D)[0]
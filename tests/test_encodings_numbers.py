@@ -0,0 +1,47 @@
+import itertools
+
+import pytest
+from z3 import Bool, Not, And, Solver, sat, unsat, is_true
+
+from SAT.utils import int_to_bin, bin_to_int, num_bits
+from SAT.encodings_numbers import conditional_sum_K_bin, conditional_sum_K_bin_tree, pb_leq_swc
+
+
+WEIGHTS = [3, 1, 6, 2, 5]
+
+
+@pytest.mark.parametrize("encoder", [conditional_sum_K_bin, conditional_sum_K_bin_tree])
+def test_conditional_sum(encoder):
+    x = [Bool(f"x_{j}") for j in range(len(WEIGHTS))]
+    delta = [Bool(f"delta_{k}") for k in range(num_bits(sum(WEIGHTS)) + 1)]
+    solver = Solver()
+    solver.add(encoder(x, [int_to_bin(w, num_bits(w)) for w in WEIGHTS], delta, encoder.__name__))
+    for values in itertools.product([False, True], repeat=len(WEIGHTS)):
+        expected = sum(w for w, v in zip(WEIGHTS, values) if v)
+        assumptions = [x[j] if v else Not(x[j]) for j, v in enumerate(values)]
+        assert solver.check(assumptions) == sat
+        model = solver.model()
+        assert bin_to_int([1 if is_true(model.evaluate(b, model_completion=True)) else 0 for b in delta]) == expected
+        # the sum is the only value of delta
+        equals = And([d if bit else Not(d) for d, bit in zip(delta, int_to_bin(expected, len(delta)))])
+        assert solver.check(assumptions + [Not(equals)]) == unsat
+
+
+def test_conditional_sum_tree_with_fewer_digits():
+    # the root of the tree has more digits than delta, its leading ones must be zero
+    x = [Bool(f"y_{j}") for j in range(2)]
+    delta = [Bool(f"eps_{k}") for k in range(2)]
+    solver = Solver()
+    solver.add(conditional_sum_K_bin_tree(x, [int_to_bin(2, 2), int_to_bin(3, 2)], delta, "fewer"))
+    assert solver.check([x[0], Not(x[1])]) == sat
+    assert solver.check([x[0], x[1]]) == unsat
+
+
+@pytest.mark.parametrize("K", [0, 4, 7, 12, 17])
+def test_pb_leq_swc(K):
+    x = [Bool(f"z_{j}") for j in range(len(WEIGHTS))]
+    solver = Solver()
+    solver.add(pb_leq_swc(x, WEIGHTS, K, f"test_{K}"))
+    for values in itertools.product([False, True], repeat=len(WEIGHTS)):
+        expected = sat if sum(w for w, v in zip(WEIGHTS, values) if v) <= K else unsat
+        assert solver.check([x[j] if v else Not(x[j]) for j, v in enumerate(values)]) == expected
@@ -0,0 +1,79 @@
+import re
+
+import pytest
+
+from common.instance import read_dzn
+from common.result_db import solution_errors
+from CP.run import split_statistics, extract_solution
+from CP.variants import model_text
+
+INSTANCE01 = "CP/instances_dzn/inst01.dzn"
+SOLUTION01 = (14, [[4, 3, 1], [2, 5, 6]])
+
+# output item of templates/giant_tour.mzn, which giant_tour_output evaluates
+OUTPUT = """
+output  [show(obj) ++ "\\n"] ++
+        [show(if j == n+1 then out_node(fix(succ[n+i]))
+              elseif fix(courier[j]) == i then out_node(fix(succ[j]))
+              else j endif) ++ if j == n+1 then "\\n" else " " endif | i in COURIERS, j in D_SIZE]
+"""
+
+
+def giant_tour(routes, n):
+    """Returns the successor and the courier of each node (1-based, as in the model) of the giant tour of the routes"""
+    m = len(routes)
+    succ = {}
+    courier = {}
+    for i, route in enumerate(routes, 1):
+        nodes = [n + i] + route + [n + m + i]
+        for a, b in zip(nodes, nodes[1:]):
+            succ[a] = b
+        for v in nodes:
+            courier[v] = i
+        succ[n + m + i] = n + i % m + 1
+    return succ, courier
+
+
+def giant_tour_output(obj, succ, courier, n, m):
+    """Evaluates the output item of the model on a solution"""
+    def out_node(v):
+        return v if v <= n else n + 1
+    rows = []
+    for i in range(1, m + 1):
+        row = [out_node(succ[n + i]) if j == n + 1 else out_node(succ[j]) if courier[j] == i else j for j in range(1, n + 2)]
+        rows.append(" ".join(str(v) for v in row))
+    return f"{obj}\n" + "\n".join(rows) + "\n"
+
+
+@pytest.mark.parametrize("features", [{}, {"implied": False}, {"sym_break": False},
+                                      {"restart": "luby", "lns_rate": 85}])
+def test_render(features):
+    text = model_text(template="giant_tour", **features)
+    # every directive and placeholder is rendered
+    assert not re.search(r"^\s*@", text, re.MULTILINE) and "$" not in text
+    assert "constraint circuit(succ);" in text
+    assert ("succ[n+i] != n+m+i" in text) == features.get("implied", True)
+    assert ("load[i] <= l[j]" in text) == features.get("sym_break", True)
+    if "lns_rate" in features:
+        assert "relax_and_reconstruct(succ, 85)" in text
+    assert re.sub(r"\s+", "", OUTPUT) in re.sub(r"\s+", "", text)
+
+
+def test_decode():
+    m, n, l, s, D = read_dzn(INSTANCE01)
+    obj, routes = SOLUTION01
+    succ, courier = giant_tour(routes, n)
+    # a single circuit through every node
+    v, visited = n + 1, []
+    while v not in visited:
+        visited.append(v)
+        v = succ[v]
+    assert sorted(visited) == list(range(1, n + 2 * m + 1))
+
+    stdout = giant_tour_output(obj, succ, courier, n, m) + "% time elapsed: 0.42 s\n----------\n==========\n" \
+             "%%%mzn-stat: nodes=12\n%%%mzn-stat-end\n"
+    text, statistics = split_statistics(stdout)
+    assert statistics == {"nodes": "12"}
+    solution = extract_solution(text)
+    assert (solution["obj"], solution["sol"], solution["optimal"]) == (obj, routes, True)
+    assert solution_errors(m, n, l, s, D, solution["sol"], solution["obj"]) == []
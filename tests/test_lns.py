@@ -0,0 +1,102 @@
+from types import SimpleNamespace
+
+from common import instrumentation
+from common.instance import read_instance
+from common.result_db import solution_errors
+from CP import lns
+from CP.lns import lns_search, kept_couriers
+
+M, N, L, S, D = read_instance("instances_dat/inst01.dat")
+HEURISTIC01 = (16, [[1, 2, 3, 6], [5, 4]])
+SOLUTION01 = (14, [[4, 3, 1], [2, 5, 6]])
+
+
+class Stub:
+    """solve_neighbourhood returning the given entries in turn (the last one forever), each call taking its seconds
+    on the clock of the search"""
+
+    def __init__(self, monkeypatch, *entries):
+        self.entries = list(entries)
+        self.calls = []
+        self.now = 0
+        monkeypatch.setattr(lns, "time", SimpleNamespace(time=lambda: self.now))
+
+    def __call__(self, courier, bound, order, seconds):
+        self.calls.append((courier, bound, order, seconds))
+        self.now += seconds
+        return dict(self.entries.pop(0) if len(self.entries) > 1 else self.entries[0])
+
+
+def search(stub, incumbent=HEURISTIC01, lower_bound=8, timeout=60, neighbourhoods=None):
+    with instrumentation.recording() as recorder:
+        result = lns_search(D, lower_bound, 30, incumbent, stub, timeout, neighbourhoods, seed=0)
+    return result, recorder
+
+
+def test_kept_couriers():
+    assert kept_couriers([[1, 2, 3, 6], [5, 4]], {2, 5}, N) == [1, 0, 1, 2, 0, 1]
+
+
+def test_improvement(monkeypatch):
+    better = {"time": 1, "optimal": False, "obj": SOLUTION01[0], "sol": SOLUTION01[1]}
+    unknown = {"time": 5, "optimal": False, "obj": "N/A"}
+    stub = Stub(monkeypatch, better, unknown)
+    (value, routes, optimal), recorder = search(stub, timeout=30)
+    assert (value, routes, optimal) == (*SOLUTION01, False)
+    assert solution_errors(M, N, L, S, D, routes, value) == []
+    # the first neighbourhood is searched for a solution better than the heuristic one, the next ones than the new incumbent
+    courier, bound, order, _ = stub.calls[0]
+    assert bound == HEURISTIC01[0] - 1 and 0 in courier
+    assert all(call[1] == SOLUTION01[0] - 1 for call in stub.calls[1:])
+    assert sorted(order) == list(range(1, M + 1))
+    assert [obj for _, obj in recorder.incumbents] == [SOLUTION01[0]]
+    assert sum(recorder.counts[f"lns_{name}_improvements"] for name in lns.NEIGHBOURHOODS) == 1
+
+
+def test_stops_at_the_lower_bound(monkeypatch):
+    stub = Stub(monkeypatch, {"time": 1, "optimal": False, "obj": SOLUTION01[0], "sol": SOLUTION01[1]})
+    (value, routes, optimal), recorder = search(stub, lower_bound=SOLUTION01[0])
+    assert (value, optimal) == (SOLUTION01[0], True)
+    assert recorder.counts["lns_iterations"] == 1
+
+
+def test_exhausted_neighbourhoods_grow(monkeypatch):
+    stub = Stub(monkeypatch, {"time": 1, "optimal": True, "obj": "UNSAT", "sol": []})
+    (value, routes, optimal), recorder = search(stub, timeout=100, neighbourhoods=["random"])
+    # the neighbourhoods hold no better solution, which doesn't prove the incumbent optimal
+    assert (value, routes, optimal) == (*HEURISTIC01, False)
+    relaxed = [courier.count(0) for courier, _, _, _ in stub.calls]
+    assert relaxed == sorted(relaxed) and relaxed[-1] > relaxed[0]
+    assert recorder.counts["lns_random_weight"] < 1
+
+
+def test_whole_problem_exhausted(monkeypatch):
+    # without an incumbent the first search relaxes every item, and proves there is no solution
+    stub = Stub(monkeypatch, {"time": 1, "optimal": True, "obj": "UNSAT", "sol": []})
+    (value, routes, optimal), recorder = search(stub, incumbent=None)
+    assert (value, routes, optimal) == (None, None, True)
+    assert stub.calls[0][0] == [0] * N and stub.calls[0][1] == 30
+    assert recorder.counts["lns_iterations"] == 1
+
+
+def test_timeouts_shrink_neighbourhoods(monkeypatch):
+    monkeypatch.setattr(lns, "RELAX_FRACTION", lns.MAX_RELAX_FRACTION)
+    stub = Stub(monkeypatch, {"time": 5, "optimal": False, "obj": "N/A", "sol": [], "status": "timeout"})
+    (value, routes, optimal), recorder = search(stub, timeout=40, neighbourhoods=["close"])
+    assert (value, routes, optimal) == (*HEURISTIC01, False)
+    relaxed = [courier.count(0) for courier, _, _, _ in stub.calls]
+    assert relaxed == sorted(relaxed, reverse=True) and relaxed[-1] < relaxed[0]
+    # every iteration stays within the time left
+    assert all(seconds <= lns.ITERATION_TIME for _, _, _, seconds in stub.calls)
+    assert stub.now <= 40
+
+
+def test_error_stops_the_search(monkeypatch):
+    stub = Stub(monkeypatch, {"time": 0, "optimal": False, "obj": "N/A", "sol": [], "status": "error"})
+    (value, routes, optimal), recorder = search(stub)
+    assert (value, routes, optimal) == (*HEURISTIC01, False)
+    assert len(stub.calls) == 1 and recorder.counts["lns_iterations"] == 1
+
+    stub = Stub(monkeypatch, {"time": 0, "optimal": False, "obj": "Error"})
+    (value, _, optimal), _ = search(stub)
+    assert (value, optimal) == (HEURISTIC01[0], False) and len(stub.calls) == 1
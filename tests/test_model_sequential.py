@@ -0,0 +1,25 @@
+from common import instrumentation
+from common.instance import read_instance
+from common.result_db import solution_errors
+from SAT.model_sequential import multiple_couriers_planning_sequential
+
+
+def test_default_search():
+    m, n, l, s, D = read_instance("instances_dat/inst01.dat")
+    with instrumentation.recording():
+        obj, _, routes = multiple_couriers_planning_sequential(m, n, l, s, D, display_solution=False, timeout_duration=60,
+                                                               heuristic=False)
+    assert solution_errors(m, n, l, s, D, routes, obj) == []
+
+
+def test_unimproved_heuristic_solution_is_marked():
+    m, n, l, s, D = read_instance("instances_dat/inst01.dat")
+    with instrumentation.recording() as recorder:
+        obj, _, routes = multiple_couriers_planning_sequential(m, n, l, s, D, display_solution=False, timeout_duration=0)
+    # no time to improve the heuristic solution
+    assert solution_errors(m, n, l, s, D, routes, obj) == []
+    assert recorder.source == "heuristic"
+
+    with instrumentation.recording() as recorder:
+        obj, _, routes = multiple_couriers_planning_sequential(m, n, l, s, D, display_solution=False, timeout_duration=60)
+    assert obj == 14 and recorder.source is None
@@ -0,0 +1,28 @@
+from z3 import Bool, Not, Solver, sat
+
+from common import instrumentation
+from common.instance import read_instance
+from SAT.model import multiple_couriers_planning
+from SAT.portfolio import export_clause, import_clause
+from SAT.utils import aux_bools
+
+
+def test_export_import_clause():
+    x = Bool("a_0_1")
+    y = aux_bools("aux", 1)[0]
+    literals = export_clause([x, Not(y)])
+    assert literals[0] == ("a_0_1", True) and literals[1][1] is False
+    solver = Solver()
+    solver.add(import_clause(literals), Not(x))
+    assert solver.check() == sat
+    assert solver.model().evaluate(y) == False
+
+
+def test_learnt_clauses_cross_between_workers():
+    m, n, l, s, D = read_instance("instances_dat/inst01.dat")
+    with instrumentation.recording() as recorder:
+        obj, _, routes = multiple_couriers_planning(m, n, l, s, D, search='Portfolio', display_solution=False,
+                                                    timeout_duration=60, use_cache=False, heuristic=False, probes=2)
+    assert obj == 14
+    assert recorder.counts["search_complete"]
+    assert recorder.counts["shared_clauses"] > 0
@@ -0,0 +1,44 @@
+from common import instrumentation
+from common import result_db
+from common.bounds import objective_bounds
+from common.instance import read_instance
+from common.result_db import connect, ingest_entry, instance_key, best_known
+
+INST01 = read_instance("instances_dat/inst01.dat")
+SOLUTION01 = [[4, 3, 1], [2, 5, 6]]
+
+
+def entry(optimal, lower_bound):
+    return {"time": 1, "optimal": optimal, "obj": 14, "sol": SOLUTION01, "stats": {"counts": {"lower_bound": lower_bound}}}
+
+
+def seeded_bounds():
+    with instrumentation.recording() as recorder:
+        lower_bound, _, incumbent = objective_bounds(*INST01, registry=True)
+    return lower_bound, incumbent, recorder.counts
+
+
+def test_registry_seeds_only_confirmed_optima(tmp_path, monkeypatch):
+    path = str(tmp_path / "results.sqlite")
+    monkeypatch.setattr(result_db, "DB_PATH", path)
+    db = connect(path)
+    db.execute("INSERT INTO instances VALUES (?, ?)", (1, instance_key(*INST01)))
+    ingest_entry(db, 1, "SAT", "base", entry(True, 8), data=INST01)
+    db.commit()
+
+    # a single claim of optimality: the known solution is an incumbent, not a lower bound
+    computed, _, _ = objective_bounds(*INST01, heuristic=False, registry=False)
+    lower_bound, incumbent, counts = seeded_bounds()
+    assert lower_bound == computed < 14 and incumbent[0] == 14
+    assert not counts["registry_optimal"]
+
+    # confirmed by a second method: the models stop at once, but their own lower bound is recorded
+    ingest_entry(db, 1, "CP", "base", entry(True, 8), data=INST01)
+    db.commit()
+    lower_bound, incumbent, counts = seeded_bounds()
+    assert lower_bound == 14 == counts["registry_lower_bound"]
+    assert counts["lower_bound"] == computed
+
+    # the result of such a model doesn't prove its lower bound
+    ingest_entry(db, 1, "MIP", "base", {**entry(True, counts["lower_bound"]), "stats": {"counts": counts}}, data=INST01)
+    assert best_known(db)[1]["proven_lower_bound"] == max(8, computed)
@@ -0,0 +1,75 @@
+from common.instance import read_instance
+from common.result_db import connect, ingest_entry, best_known, optima, gaps, solution_errors
+
+
+INST01 = read_instance("instances_dat/inst01.dat")
+SOLUTION01 = [[4, 3, 1], [2, 5, 6]]
+
+
+def entry(obj, optimal, lower_bound, sol=SOLUTION01):
+    return {"time": 1 if optimal else 300, "optimal": optimal, "obj": obj, "sol": sol,
+            "stats": {"counts": {"lower_bound": lower_bound}}}
+
+
+def test_solution_errors():
+    assert solution_errors(*INST01, SOLUTION01, 14) == []
+    assert len(solution_errors(*INST01, SOLUTION01, 13)) == 1
+    assert len(solution_errors(*INST01, [[4, 3], [2, 5, 6]], 14)) == 1
+    m, n, l, s, D = INST01
+    assert len(solution_errors(m, n, [0] * m, s, D, SOLUTION01, 14)) == m
+
+
+def test_best_known():
+    db = connect(":memory:")
+    ingest_entry(db, 1, "SAT", "base", entry(16, False, 8, [[4, 3, 1, 2], [5, 6]]))
+    ingest_entry(db, 1, "CP", "base", entry(14, False, 10), data=INST01)
+    ingest_entry(db, 1, "MIP", "base", entry(13, False, 8, [[4, 3, 1], [2, 5, 6]]), data=INST01)
+    known = best_known(db)[1]
+    # the invalid solution of MIP is ignored
+    assert (known["obj"], known["method"], known["optimal"]) == (14, "CP", False)
+    assert known["lower_bound"] == known["proven_lower_bound"] == 10
+
+
+def test_optima_need_confirmation():
+    db = connect(":memory:")
+    # claimed by a single method, above the lower bounds
+    ingest_entry(db, 1, "SAT", "base", entry(14, True, 8))
+    known = best_known(db)[1]
+    assert known["optimal"] and not known["confirmed"]
+    assert known["lower_bound"] == 8
+    assert optima(db) == {}
+    # claimed by another model of the same method
+    ingest_entry(db, 1, "SAT", "base_linear", entry(14, True, 8))
+    assert optima(db) == {}
+    # claimed by a second method
+    ingest_entry(db, 1, "CP", "base", entry(14, True, 8))
+    assert optima(db) == {1: 14}
+    assert best_known(db)[1]["lower_bound"] == 14
+    # proven by a lower bound
+    ingest_entry(db, 2, "SAT", "base", entry(14, True, 14))
+    assert optima(db) == {1: 14, 2: 14}
+
+
+def test_returned_incumbents_claim_nothing():
+    db = connect(":memory:")
+    ingest_entry(db, 1, "SAT", "base", {**entry(14, True, 8), "source": "registry"}, data=INST01)
+    ingest_entry(db, 1, "CP", "base", {**entry(14, True, 8), "source": "heuristic"}, data=INST01)
+    known = best_known(db)[1]
+    assert known["obj"] == 14 and known["source"] is not None
+    assert not known["optimal"] and optima(db) == {}
+    # a solution found by a model is preferred to the returned ones of the same value
+    ingest_entry(db, 1, "MIP", "base", entry(14, False, 8), data=INST01)
+    known = best_known(db)[1]
+    assert (known["method"], known["source"]) == ("MIP", None)
+    assert [row["source"] for row in gaps(db)] == ["heuristic", None, "registry"]
+
+
+def test_connect_adds_the_source_column(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    db = connect(path)
+    db.execute("ALTER TABLE results DROP COLUMN source")
+    db.commit()
+    db.close()
+    db = connect(path)
+    ingest_entry(db, 1, "CP", "base", {**entry(14, False, 8), "source": "heuristic"}, data=INST01)
+    assert best_known(db)[1]["source"] == "heuristic"
@@ -0,0 +1,72 @@
+import os
+import json
+import glob
+
+import pytest
+
+from common.results import format_result, write_atomic, ResultStore
+
+
+def test_format_result():
+    result = {"base": {"time": 3, "optimal": True, "obj": 14, "sol": [[4, 3, 1], [2, 5, 6]], "stats": {}}}
+    text = format_result(result)
+    assert json.loads(text) == result
+    assert text == ('{\n'
+                    '    "base": {\n'
+                    '        "time": 3,\n'
+                    '        "optimal": true,\n'
+                    '        "obj": 14,\n'
+                    '        "sol": [[4, 3, 1], [2, 5, 6]],\n'
+                    '        "stats": {}\n'
+                    '    }\n'
+                    '}')
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob("res/*/*.json")))
+def test_format_result_matches_the_res_files(path):
+    with open(path) as f:
+        text = f.read()
+    assert format_result(json.loads(text)) == text.rstrip("\n")
+
+
+def test_write_atomic(tmp_path):
+    path = tmp_path / "1.json"
+    write_atomic(str(path), "first")
+    write_atomic(str(path), "second")
+    assert path.read_text() == "second"
+    # no temporary file is left behind
+    assert os.listdir(tmp_path) == ["1.json"]
+
+
+def test_write_atomic_keeps_the_old_file_on_failure(tmp_path, monkeypatch):
+    path = tmp_path / "1.json"
+    write_atomic(str(path), "first")
+
+    def failing_replace(source, destination):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        write_atomic(str(path), "second")
+    assert path.read_text() == "first"
+    assert os.listdir(tmp_path) == ["1.json"]
+
+
+def test_result_store(tmp_path):
+    path = tmp_path / "1.json"
+    store = ResultStore(str(path))
+    store.add("base", {"time": 1, "optimal": True, "obj": 14, "sol": []})
+    assert list(json.loads(path.read_text())) == ["base"]
+    store.add("base_linear", {"time": 300, "optimal": False, "obj": "N/A", "sol": []})
+    assert list(json.loads(path.read_text())) == ["base", "base_linear"]
+
+
+def test_result_store_keeps_the_previous_entries(tmp_path):
+    path = tmp_path / "1.json"
+    ResultStore(str(path)).add("base", {"time": 1, "optimal": True, "obj": 14, "sol": []})
+    ResultStore(str(path)).add("base_linear", {"time": 300, "optimal": False, "obj": 16, "sol": []})
+    store = ResultStore(str(path))
+    store.add("base", {"time": 2, "optimal": True, "obj": 14, "sol": [[1]]})
+    results = json.loads(path.read_text())
+    assert list(results) == ["base", "base_linear"]
+    assert results["base"]["time"] == 2 and results["base_linear"]["obj"] == 16
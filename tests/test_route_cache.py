@@ -0,0 +1,59 @@
+from common.route_cache import RouteCache
+from common.tsp import solve_routes
+
+D = [[0, 3, 4, 2],
+     [3, 0, 5, 6],
+     [4, 5, 0, 1],
+     [2, 6, 1, 0]]
+
+
+def test_put_keeps_the_best_route():
+    cache = RouteCache(D)
+    assert cache.get([0, 1]) is None
+    cache.put([1, 0], 12, [1, 0], False)
+    assert cache.get([0, 1]) == (12, [1, 0], False)
+    # a longer route doesn't replace it, a shorter or optimal one does
+    cache.put([0, 1], 13, [0, 1], False)
+    assert cache.get([0, 1])[0] == 12
+    cache.put([0, 1], 11, [0, 1], True)
+    assert cache.get([0, 1]) == (11, [0, 1], True)
+    # nothing replaces an optimal route
+    cache.put([0, 1], 10, [1, 0], False)
+    assert cache.get([0, 1]) == (11, [0, 1], True)
+
+
+def test_lru_eviction():
+    cache = RouteCache(D, capacity=2)
+    cache.put([0], 5, [0], True)
+    cache.put([1], 12, [1], True)
+    cache.get([0])
+    cache.put([2], 5, [2], True)
+    assert [0] in cache and [2] in cache and [1] not in cache
+
+
+def test_lower_bound():
+    cache = RouteCache(D)
+    # longest round trip origin -> j -> origin
+    assert cache.lower_bound([0, 1]) == 12
+    cache.put([0, 1], 11, [0, 1], False)
+    assert cache.lower_bound([0, 1]) == 12
+    cache.put([0, 1], 13, [0, 1], True)
+    assert cache.lower_bound([0, 1]) == 13
+    assert cache.lower_bound([]) == 0
+
+
+def test_persistence(tmp_path):
+    path = str(tmp_path / "routes.sqlite")
+    RouteCache(D, path=path).put([2, 0], 9, [0, 2], True)
+    assert RouteCache(D, path=path).get([0, 2]) == (9, [0, 2], True)
+    # the routes of another instance are not shared
+    other = [row[:] for row in D]
+    other[3][0] = 7
+    assert RouteCache(other, path=path).get([0, 2]) is None
+
+
+def test_memo_of_solve_routes():
+    cache = RouteCache(D)
+    results = solve_routes([[0, 1], [2]], D, None, timeout=0, memo=cache)
+    assert cache[frozenset([0, 1])] == results[0]
+    assert cache.get([2]) == (2, [2], True)
@@ -0,0 +1,75 @@
+import numpy as np
+
+from common.routes import (unpermute, successors_from_routes, successors_from_arcs, successors_from_times,
+                           successors_from_positions, successors_from_minizinc, routes_from_successors, hamiltonian,
+                           check_solution)
+
+N = 6
+ROUTES = [[4, 3, 1], [], [2, 6, 5]]
+
+
+def arcs(routes, n):
+    R = np.zeros((len(routes), n + 1, n + 1), dtype=int)
+    for i, route in enumerate(routes):
+        nodes = [n] + [j - 1 for j in route] + [n]
+        if route:
+            for a, b in zip(nodes, nodes[1:]):
+                R[i, a, b] = 1
+    return R
+
+
+def test_round_trip():
+    succ = successors_from_routes(ROUTES, N)
+    assert succ.shape == (3, N + 1)
+    # the courier without items stays at the origin
+    assert (succ[1] == np.arange(N + 1)).all()
+    assert routes_from_successors(succ) == ROUTES
+    assert check_solution(succ, N)
+
+
+def test_conversions_agree():
+    expected = successors_from_routes(ROUTES, N)
+    assert (successors_from_arcs(arcs(ROUTES, N)) == expected).all()
+
+    T = np.zeros((N, N), dtype=int)
+    A = np.zeros((len(ROUTES), N), dtype=int)
+    O = np.zeros((len(ROUTES), N), dtype=int)
+    for i, route in enumerate(ROUTES):
+        for k, j in enumerate(route):
+            T[j - 1, k] = 1
+            A[i, j - 1] = 1
+            O[i, j - 1] = k + 1
+    assert (successors_from_times(T, A) == expected).all()
+    assert (successors_from_positions(O) == expected).all()
+    assert (successors_from_minizinc(expected + 1) == expected).all()
+
+
+def test_unpermute():
+    permutation = [2, 0, 1]
+    values = np.array([[10], [20], [30]])
+    assert unpermute(values, permutation).tolist() == [[20], [30], [10]]
+
+
+def test_subtours_are_detected():
+    succ = successors_from_routes(ROUTES, N)
+    # courier 0: origin -> 4 -> origin, and a subtour 3 -> 1 -> 3 not containing the origin
+    succ[0] = np.arange(N + 1)
+    succ[0, [6, 3]] = [3, 6]
+    succ[0, [2, 0]] = [0, 2]
+    assert hamiltonian(succ).tolist() == [False, True, True]
+    assert not check_solution(succ, N)
+    # following the successors from the origin doesn't loop
+    assert routes_from_successors(succ)[0] == [4]
+
+
+def test_not_a_permutation():
+    succ = successors_from_routes(ROUTES, N)
+    succ[2, 5] = 1
+    assert hamiltonian(succ).tolist() == [True, True, False]
+
+
+def test_items_delivered_once():
+    succ = successors_from_routes([[4, 3, 1], [1], [2, 6, 5]], N)
+    assert hamiltonian(succ).all()
+    assert not check_solution(succ, N)
+    assert not check_solution(successors_from_routes([[4, 3], [], [2, 6, 5]], N), N)
@@ -0,0 +1,28 @@
+import z3
+
+from common.sandbox import run_sandboxed, run_model
+
+
+def test_status():
+    assert run_sandboxed(lambda: 42) == ("ok", 42)
+    assert run_sandboxed(lambda: bytearray(1 << 32), memory_limit_mb=1024)[0] == "oom"
+
+
+def test_z3_out_of_memory():
+    def out_of_memory():
+        raise z3.Z3Exception("out of memory")
+    assert run_sandboxed(out_of_memory)[0] == "oom"
+
+
+def test_errors_mentioning_memory():
+    def error():
+        raise ValueError("not enough memory for the route cache")
+    status, value = run_sandboxed(error)
+    assert status == "error" and "ValueError" in value
+    entry = run_model(error, 10)
+    assert entry["status"] == "error" and entry["obj"] == "N/A"
+
+
+def test_timeout():
+    import time
+    assert run_sandboxed(lambda: time.sleep(10), wall_limit=0.5)[0] == "timeout"
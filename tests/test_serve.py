@@ -0,0 +1,96 @@
+import os
+import time
+import asyncio
+import multiprocessing
+
+import pytest
+
+import serve
+from common import instrumentation
+from common.sandbox import run_model
+from serve import Worker, ModelPipe, parse_job
+
+
+def test_instance_file_within_the_instance_directories(tmp_path):
+    job = parse_job({"method": "SAT", "instance_file": "instances_dat/inst01.dat"})
+    assert job.instance_file == os.path.join(serve.INSTANCE_DIRS["SAT"], "inst01.dat")
+    assert parse_job({"method": "CP", "instance_file": "CP/instances_dzn/inst01.dzn"}).directory is None
+
+    link = tmp_path / "inst01.dat"
+    link.symlink_to("/etc/passwd")
+    for path in ["/etc/passwd", "instances_dat/../serve.py", "CP/instances_dzn/inst01.dzn", str(link),
+                 "instances_dat/inst99.dat"]:
+        with pytest.raises(ValueError, match="instance file"):
+            parse_job({"method": "SAT", "instance_file": path})
+
+
+def test_model_pipe():
+    messages = []
+    pipe = ModelPipe("job", messages.append)
+    # a model sending incumbents, then one killed while writing
+    process = multiprocessing.get_context("fork").Process(target=lambda: [pipe.send(obj) for obj in [7, 5]])
+    process.start()
+    process.join()
+    process = multiprocessing.get_context("fork").Process(target=lambda: pipe.writer.send_bytes(b"not a pickle"))
+    process.start()
+    process.join()
+    pipe.close()
+    assert not pipe.thread.is_alive()
+    assert [value[1] for kind, job_id, value in messages] == [7, 5]
+
+
+def run_worker(job, monkeypatch, target=None):
+    """Runs a worker (or target instead of it) until it sends a final message, returning all its messages"""
+    if target is not None:
+        monkeypatch.setattr(serve, "_worker", target)
+
+    async def main():
+        messages = []
+        finished = asyncio.Event()
+
+        def on_message(message):
+            messages.append(message)
+            if message[0] not in ["incumbent", "model"]:
+                finished.set()
+
+        worker = Worker(multiprocessing.get_context("fork"), on_message)
+        worker.connection.send(job)
+        await asyncio.wait_for(finished.wait(), 30)
+        worker.stop()
+        return messages
+
+    return asyncio.run(main())
+
+
+def fake_runner(instance_file, on_result=None, model_names=None, timeout=300):
+    def run():
+        with instrumentation.recording():
+            instrumentation.incumbent(7)
+            instrumentation.incumbent(5)
+        return {"obj": 5}
+    dictionary = {}
+    for model_name in model_names:
+        dictionary[model_name] = run_model(run, timeout)
+        on_result(model_name, dictionary[model_name])
+    return dictionary
+
+
+def test_worker_relays_the_incumbents_of_each_model(monkeypatch):
+    monkeypatch.setattr(serve, "load_runner", lambda method: fake_runner)
+    messages = run_worker(("job", "SAT", "inst01.dat", {"model_names": ["a", "b"]}), monkeypatch)
+    assert [(kind, value if kind != "incumbent" else value[1]) for kind, _, value in messages] == \
+           [("incumbent", 7), ("incumbent", 5), ("model", ("a", {"obj": 5})),
+            ("incumbent", 7), ("incumbent", 5), ("model", ("b", {"obj": 5})),
+            ("done", {"a": {"obj": 5}, "b": {"obj": 5}})]
+
+
+def corrupting_worker(connection):
+    connection.send_bytes(b"not a pickle")
+    time.sleep(60)
+
+
+def test_corrupted_message_kills_the_worker(monkeypatch):
+    messages = run_worker(("job", "SAT", "inst01.dat", {}), monkeypatch, corrupting_worker)
+    assert len(messages) == 1
+    kind, _, error = messages[0]
+    assert kind == "died" and "corrupted message" in error
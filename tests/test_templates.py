@@ -0,0 +1,65 @@
+import os
+import re
+
+import pytest
+
+from common.templates import render
+from CP.variants import model_text
+from MIP.models import mip_model
+
+# the model variants maintained as separate files before being generated from templates
+VARIANTS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "variants")
+
+LNS = {"restart": "luby", "restart_scale": 100, "lns_rate": 85}
+CP_VARIANTS = {"CP_model_no_LNS.mzn": {},
+               "CP_model_no_LNS_no_sym_break.mzn": {"sym_break": False},
+               "CP_model_no_LNS_no_implied.mzn": {"implied": False},
+               "CP_model_chuffed.mzn": {"search": None, "restart": "luby"},
+               "CP_model_LNS.mzn": LNS,
+               "CP_model_LNS_no_sym_break.mzn": {**LNS, "sym_break": False},
+               "CP_model_LNS_no_implied.mzn": {**LNS, "implied": False},
+               "CP_model_giant_tour_LNS.mzn": {**LNS, "template": "giant_tour"}}
+MIP_VARIANTS = {"MIP_model_complete.mod": (True, True),
+                "MIP_model_no_sym_break.mod": (False, True),
+                "MIP_model_no_implied.mod": (True, False)}
+
+
+def normalize(text, comment):
+    """Returns the text of a model without comments and whitespace"""
+    text = re.sub(f"{comment}[^\\n]*", "", text)
+    # the search of the generated variants flattens the successors explicitly, the same as MiniZinc does
+    text = text.replace("int_search(array1d(T),", "int_search(T,")
+    return re.sub(r"\s+", "", text)
+
+
+def read_variant(name):
+    with open(os.path.join(VARIANTS_DIR, name)) as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("name", sorted(CP_VARIANTS))
+def test_cp_variants(name):
+    assert normalize(model_text(**CP_VARIANTS[name]), "%") == normalize(read_variant(name), "%")
+
+
+@pytest.mark.parametrize("name", sorted(MIP_VARIANTS))
+def test_mip_variants(name):
+    assert normalize(mip_model(*MIP_VARIANTS[name]), "#") == normalize(read_variant(name), "#")
+
+
+def test_render():
+    template = "a\n@if x\nb\n  @if not y\nc\n  @else\nd\n  @endif\n@else\ne\n@endif\n$f"
+    assert render(template, {"x": True, "y": False}, {"f": 1}) == "a\nb\nc\n1"
+    assert render(template, {"x": True, "y": True}, {"f": 1}) == "a\nb\nd\n1"
+    assert render(template, {"x": False, "y": True}, {"f": "g"}) == "a\ne\ng"
+
+
+def test_render_errors():
+    with pytest.raises(ValueError, match="Flag \\[y\\]"):
+        render("@if y\na\n@endif", {"x": True})
+    with pytest.raises(ValueError, match="without @endif"):
+        render("@if x\na", {"x": True})
+    with pytest.raises(KeyError):
+        render("$missing", {})
+    with pytest.raises(ValueError, match="Unknown model features"):
+        model_text(lns=True)
@@ -0,0 +1,58 @@
+import random
+import itertools
+
+from common.tsp import route_length, held_karp, solve_routes
+
+
+def random_matrix(size, rng):
+    # asymmetric, not necessarily satisfying the triangle inequality
+    return [[0 if i == j else rng.randint(1, 50) for j in range(size)] for i in range(size)]
+
+
+def brute_force(items, D):
+    return min(route_length(list(route), D) for route in itertools.permutations(items))
+
+
+def test_held_karp_matches_brute_force():
+    rng = random.Random(0)
+    for _ in range(30):
+        n = rng.randint(1, 7)
+        D = random_matrix(n + 1, rng)
+        items = rng.sample(range(n), rng.randint(1, n))
+        length, route = held_karp(items, D)
+        assert sorted(route) == sorted(items)
+        assert length == route_length(route, D) == brute_force(items, D)
+
+
+def test_held_karp_empty_route():
+    assert held_karp([], random_matrix(3, random.Random(0))) == (0, [])
+
+
+def test_solve_routes():
+    rng = random.Random(1)
+    D = random_matrix(9, rng)
+    item_sets = [[0, 3, 5], [1, 2], [4, 6, 7], []]
+    memo = {}
+    results = solve_routes(item_sets, D, None, timeout=0, memo=memo)
+    for items, (length, route, optimal) in zip(item_sets, results):
+        assert optimal and sorted(route) == sorted(items)
+        assert length == brute_force(items, D) if items else length == 0
+    assert set(memo) == {frozenset(items) for items in item_sets}
+
+
+def test_solve_routes_uses_the_solver_for_long_routes(monkeypatch):
+    import common.tsp
+    monkeypatch.setattr(common.tsp, "HELD_KARP_MAX_ITEMS", 1)
+    D = random_matrix(5, random.Random(2))
+    calls = []
+
+    def tsp_solver(items, D, timeout):
+        calls.append(items)
+        length, route = held_karp(items, D)
+        return (length, route, True)
+
+    # the same set of items is solved once
+    results = solve_routes([[0, 1], [2], [1, 0]], D, tsp_solver, timeout=0)
+    assert calls == [[0, 1]]
+    assert results[0] == results[2]
+    assert solve_routes([[0, 1], [2]], D, lambda items, D, timeout: None, timeout=0) is None
@@ -0,0 +1,39 @@
+import z3
+
+import tune
+from common.config import z3_parameters
+
+
+def test_successive_halving(monkeypatch):
+    qualities = [3, 0, 2, 1, 4, 5]
+    candidates = [{"quality": q} for q in qualities]
+    calls = []
+
+    def evaluate(method, model, tasks, timeout, workers, instance_dir=None):
+        calls.extend((parameters["quality"], instance) for parameters, instance in tasks)
+        return [{"instance": instance, "obj": 100 + 10 * parameters["quality"] + instance, "optimal": False, "time": timeout}
+                for parameters, instance in tasks]
+
+    monkeypatch.setattr(tune, "evaluate", evaluate)
+    best, table = tune.successive_halving("SAT", "base", candidates, list(range(1, 9)), 10, seed=0)
+    assert best == 1
+    # the runs of the previous rounds are reused, and the worse candidates are run on fewer instances
+    assert len(calls) == len(set(calls))
+    runs = {q: sum(1 for quality, _ in calls if quality == q) for q in qualities}
+    assert runs[0] == 8 and runs[5] < runs[0]
+    assert table[-1]["round"] > 1 and table[-1]["instances"] == 8
+
+
+def test_score():
+    records = [{"instance": 1, "obj": 110, "optimal": False, "time": 10},
+               {"instance": 2, "obj": 50, "optimal": True, "time": 3},
+               {"instance": 3, "obj": "N/A", "optimal": False, "time": 10}]
+    assert tune.score(records, {1: 100, 2: 50}, 10) == (round((0.1 + 0 + 1) / 3, 4), round((20 + 3 + 20) / 3, 3))
+
+
+def test_z3_parameters_are_reset():
+    before = z3.get_param("smt.phase_selection")
+    value = "0" if before != "0" else "5"
+    with z3_parameters({"smt.phase_selection": value}):
+        assert z3.get_param("smt.phase_selection") == value
+    assert z3.get_param("smt.phase_selection") == before
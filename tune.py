@@ -0,0 +1,272 @@
+import os
+import csv
+import json
+import math
+import queue
+import random
+import argparse
+import itertools
+import statistics
+import tempfile
+import multiprocessing
+
+from benchmark import TIMEOUT, run_once, parse_instances, parse_config, print_table
+from common.config import SOLVER_PREFIX
+from common.results import write_atomic
+
+
+# values tried for each parameter of the models of each method: keyword arguments of the SAT/SMT models, features
+# of the CP models (see CP/variants.py), and solver parameters (SOLVER_PREFIX + name, z3 parameters for SAT/SMT and
+# AMPL solver options for MIP, whose names depend on the solver)
+SPACES = {"CP": {"restart": ["luby", "geometric", "constant"],
+                 "restart_scale": [50, 100, 200, 500],
+                 "lns_rate": [70, 80, 85, 90, 95],
+                 "search": [["dom_w_deg", "indomain_min"], ["first_fail", "indomain_min"], ["dom_w_deg", "indomain_split"]]},
+          "SAT": {"search": ["Binary", "Linear"],
+                  f"{SOLVER_PREFIX}smt.phase_selection": [0, 3, 5],
+                  f"{SOLVER_PREFIX}smt.restart_strategy": [0, 1, 2]},
+          "SMT": {f"{SOLVER_PREFIX}smt.phase_selection": [0, 3, 5],
+                  f"{SOLVER_PREFIX}smt.restart_strategy": [0, 1, 2],
+                  f"{SOLVER_PREFIX}smt.arith.solver": [2, 6]},
+          "MIP": {"gurobi": {f"{SOLVER_PREFIX}mipfocus": [0, 1, 2, 3]},
+                  "cplex": {f"{SOLVER_PREFIX}mipemphasis": [0, 1, 2, 3, 4]}}}
+
+FIELDS = ["round", "candidate", "parameters", "instance", "status", "obj", "optimal", "time", "wall"]
+
+
+def default_space(method, model):
+    """Returns the parameter space of a model among SPACES, by solver for MIP"""
+    space = SPACES.get(method, {})
+    if method == "MIP":
+        space = space.get(model.split("_")[0], {})
+    if not space:
+        raise ValueError(f"No parameter space for {method}:{model}, give one with --space")
+    return space
+
+
+def sample_candidates(space, count, rng):
+    """Returns the candidate configurations: the defaults of the runners ({}), and all the combinations of the values
+    of the space, or count - 1 random ones of them if there are more
+
+    Args:
+        space (dict[str, list]): values of each parameter
+        count (int): most candidates
+        rng (Random): random number generator
+
+    Returns:
+        list[dict]: the parameters of each candidate
+    """
+    combinations = [dict(zip(space, values)) for values in itertools.product(*space.values())]
+    if len(combinations) > count - 1:
+        combinations = rng.sample(combinations, count - 1)
+    return [{}] + combinations
+
+
+#------------------------------------------------------------------------------
+# Evaluation
+#------------------------------------------------------------------------------
+
+def _evaluate(method, model, parameters, instance, timeout, results, instance_dir=None):
+    """Runs a candidate on an instance, to be called in a fresh process, with the candidate as configuration profile.
+    The record of the run is put in the results queue"""
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({method: {model: parameters}}, f)
+    os.environ["MCP_PROFILE"] = f.name
+    try:
+        run_once(method, model, instance, None, timeout, results, instance_dir)
+    finally:
+        os.unlink(f.name)
+
+
+def evaluate(method, model, tasks, timeout, workers, instance_dir=None):
+    """Runs candidates on instances in parallel, each run in its own process (not a pool of daemonic workers, which
+    could not start the sandboxed processes of the models)
+
+    Args:
+        method (str): method of the model
+        model (str): name of the model
+        tasks (list[(dict, int)]): parameters of the candidate and instance of each run
+        timeout (int): timeout of each run in seconds
+        workers (int): runs at the same time
+        instance_dir (str, optional): directory of the instances generated by generate_instances.py (default=None)
+
+    Returns:
+        list[dict]: the records of the runs (see benchmark.run_once), in the order of the tasks
+    """
+    context = multiprocessing.get_context("spawn")
+    records = [None] * len(tasks)
+    waiting = list(enumerate(tasks))
+    running = {}
+    while waiting or running:
+        while waiting and len(running) < workers:
+            i, (parameters, instance) = waiting.pop(0)
+            results = context.Queue()
+            process = context.Process(target=_evaluate, args=(method, model, parameters, instance, timeout, results, instance_dir))
+            process.start()
+            running[i] = (process, results)
+        for i, (process, results) in list(running.items()):
+            try:
+                records[i] = results.get(timeout=0.1)
+            except queue.Empty:
+                if process.is_alive():
+                    continue
+                records[i] = {"method": method, "model": model, "instance": tasks[i][1],
+                              "status": f"crashed (exit code {process.exitcode})", "incumbents": []}
+            process.join()
+            del running[i]
+    return records
+
+
+def score(records, best, timeout):
+    """Returns the score of a candidate on some instances, the lower the better: its mean primal gap to the best
+    objective value found on each instance (1 without a solution), then its mean PAR2 time (the time of the runs
+    proving optimality, twice the timeout for the others)
+
+    Args:
+        records (list[dict]): records of the runs of the candidate
+        best (dict[int, int]): best objective value found on each instance
+        timeout (int): timeout of each run in seconds
+
+    Returns:
+        (float, float): the mean gap and mean PAR2 time
+    """
+    gaps = []
+    times = []
+    for record in records:
+        obj, target = record.get("obj"), best.get(record["instance"])
+        gaps.append((obj - target) / max(target, 1) if isinstance(obj, int) and target is not None else 1)
+        solved = record.get("optimal") and isinstance(obj, int)
+        times.append(record["time"] if solved else 2 * timeout)
+    return (round(statistics.mean(gaps), 4), round(statistics.mean(times), 3))
+
+
+#------------------------------------------------------------------------------
+# Successive halving
+#------------------------------------------------------------------------------
+
+def successive_halving(method, model, candidates, instances, timeout, eta=2, workers=None, seed=None,
+                       instance_dir=None, log=None):
+    """Races the candidates with successive halving: every round runs the surviving candidates on the first instances
+    (in a random order), keeps the best 1/eta of them by score, and multiplies by eta the instances of the next round,
+    so that most of the runs go to the most promising candidates. The runs of the previous rounds are reused
+
+    Args:
+        method (str): method of the model
+        model (str): name of the model
+        candidates (list[dict]): parameters of each candidate
+        instances (list[int]): instance numbers of the tuning set
+        timeout (int): timeout of each run in seconds
+        eta (int, optional): reduction factor of the candidates at each round (default=2)
+        workers (int, optional): runs at the same time (default=None, i.e. the number of CPUs)
+        seed (int, optional): random seed of the order of the instances (default=None)
+        instance_dir (str, optional): directory of the instances generated by generate_instances.py (default=None)
+        log (function, optional): function of (round, candidate index, record) called for each run (default=None)
+
+    Returns:
+        (int, list[dict]): the index of the best candidate, and the scores of the candidates at each round
+    """
+    order = random.Random(seed).sample(instances, len(instances))
+    rounds = max(math.ceil(math.log(len(candidates), eta)), 1)
+    k = max(len(order) // eta ** (rounds - 1), 1)
+    alive = list(range(len(candidates)))
+    runs = {}
+    table = []
+
+    for round_number in itertools.count(1):
+        tasks = [(c, instance) for c in alive for instance in order[:k] if (c, instance) not in runs]
+        records = evaluate(method, model, [(candidates[c], instance) for c, instance in tasks], timeout,
+                           workers or os.cpu_count(), instance_dir)
+        for (c, instance), record in zip(tasks, records):
+            runs[(c, instance)] = record
+            if log is not None:
+                log(round_number, c, record)
+
+        best = {}
+        for record in runs.values():
+            if isinstance(record.get("obj"), int):
+                best[record["instance"]] = min(best.get(record["instance"], record["obj"]), record["obj"])
+        scores = {c: score([runs[(c, instance)] for instance in order[:k]], best, timeout) for c in alive}
+        alive.sort(key=lambda c: scores[c])
+        table += [{"round": round_number, "instances": k, "candidate": c, "gap": scores[c][0], "par2": scores[c][1],
+                   "parameters": json.dumps(candidates[c])} for c in alive]
+
+        if len(alive) == 1 or (k == len(order) and len(alive) <= eta):
+            return (alive[0], table)
+        alive = alive[:max(math.ceil(len(alive) / eta), 1)]
+        k = min(k * eta, len(order))
+
+
+def write_profile(path, method, model, parameters):
+    """Stores the parameters of a model in the configuration profile at path (see common/config.py), keeping the
+    other models of the profile"""
+    profile = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            profile = json.load(f)
+    profile.setdefault(method, {})[model] = parameters
+    write_atomic(path, json.dumps(profile, indent=4) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune the parameters of a model by successive halving over an instance "
+                                                 "set, writing the best ones to a configuration profile (used with MCP_PROFILE)")
+    parser.add_argument("--config", type=parse_config, required=True, help="METHOD:model to tune, e.g. CP:Gecode_LNS")
+    parser.add_argument("--instances", type=parse_instances, required=True, help="tuning instances, e.g. 1-10")
+    parser.add_argument("--validate", type=parse_instances, default=None, help="held-out instances, on which the best "
+                        "candidate must do at least as well as the defaults to be stored")
+    parser.add_argument("--space", default=None, help="JSON file with the values of each parameter (default: SPACES)")
+    parser.add_argument("--candidates", type=int, default=16, help="most candidates, the defaults included")
+    parser.add_argument("--eta", type=int, default=2, help="reduction factor of the candidates at each round")
+    parser.add_argument("--timeout", type=int, default=TIMEOUT, help="timeout of each run in seconds")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="runs at the same time (they share the CPUs, "
+                        "so fewer workers give more faithful times)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the candidates and of the order of the instances")
+    parser.add_argument("--instance-dir", default=None, help="directory of instances generated by generate_instances.py")
+    parser.add_argument("--profile", default="profile.json", help="configuration profile to write the best parameters to")
+    parser.add_argument("--out", default="bench", help="output directory (the runs are appended to OUT/tuning.csv)")
+    args = parser.parse_args()
+
+    method, model = args.config
+    if args.space is not None:
+        with open(args.space) as f:
+            space = json.load(f)
+    else:
+        space = default_space(method, model)
+    candidates = sample_candidates(space, args.candidates, random.Random(args.seed))
+
+    os.makedirs(args.out, exist_ok=True)
+    outfile = os.path.join(args.out, "tuning.csv")
+    new_file = not os.path.exists(outfile)
+    with open(outfile, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+
+        def log(round_number, candidate, record):
+            writer.writerow({**record, "round": round_number, "candidate": candidate,
+                             "parameters": json.dumps(candidates[candidate])})
+            f.flush()
+
+        winner, table = successive_halving(method, model, candidates, args.instances, args.timeout, args.eta,
+                                           args.workers, args.seed, args.instance_dir, log)
+    print_table(table)
+    parameters = candidates[winner]
+    print(f"\nBest parameters of {method}:{model}: {parameters}")
+
+    if args.validate and parameters:
+        records = evaluate(method, model, [(p, instance) for p in [{}, parameters] for instance in args.validate],
+                           args.timeout, args.workers, args.instance_dir)
+        best = {}
+        for record in records:
+            if isinstance(record.get("obj"), int):
+                best[record["instance"]] = min(best.get(record["instance"], record["obj"]), record["obj"])
+        half = len(args.validate)
+        default_score, tuned_score = score(records[:half], best, args.timeout), score(records[half:], best, args.timeout)
+        print_table([{"candidate": "defaults", "gap": default_score[0], "par2": default_score[1]},
+                     {"candidate": "tuned", "gap": tuned_score[0], "par2": tuned_score[1]}])
+        if default_score < tuned_score:
+            print("The tuned parameters do worse than the defaults on the held-out instances, keeping the defaults")
+            parameters = {}
+
+    write_profile(args.profile, method, model, parameters)
+    print(f"Wrote the parameters of {method}:{model} to {args.profile}, use them with MCP_PROFILE={args.profile}")